@@ -0,0 +1,90 @@
+"""rio_glui.buffers: per-thread reusable arrays."""
+
+import threading
+from collections import OrderedDict
+
+import numpy
+
+
+class BufferArena(object):
+    """
+    Per-thread reusable array arena.
+
+    Each thread gets its own arrays, keyed on (name, shape, dtype), so the
+    tile pipeline (read, rescale, color operations, encoding) does not
+    allocate new arrays for each request. Least recently used arrays are
+    released when a thread retains more than `max_bytes`.
+
+    Attributes
+    ----------
+    max_bytes : int, optional (default: 64MB)
+        Maximum memory retained per thread.
+
+    Methods
+    -------
+    get(name, shape, dtype)
+        Get a reusable array.
+    nbytes()
+        Memory retained by the current thread.
+    clear()
+        Release the current thread arrays.
+
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """Initialize BufferArena object."""
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _buffers(self):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = OrderedDict()
+        return buffers
+
+    def get(self, name, shape, dtype):
+        """
+        Get a reusable array for the current thread.
+
+        The array content is undefined and it is only valid until the next
+        `get` with the same key from the same thread.
+
+        Attributes
+        ----------
+        name : str
+            Buffer name.
+        shape : tuple
+            Array shape.
+        dtype : numpy.dtype
+            Array data type.
+
+        Returns
+        -------
+        out : numpy ndarray
+
+        """
+        buffers = self._buffers()
+        key = (name, tuple(shape), numpy.dtype(dtype))
+        out = buffers.pop(key, None)
+        if out is None:
+            out = numpy.empty(shape, dtype=dtype)
+        buffers[key] = out
+
+        # NOTE: The requested array is always kept, even over the cap
+        nbytes = self.nbytes()
+        while nbytes > self.max_bytes and len(buffers) > 1:
+            _, old = buffers.popitem(last=False)
+            nbytes -= old.nbytes
+
+        return out
+
+    def nbytes(self):
+        """Get memory retained by the current thread."""
+        return sum(arr.nbytes for arr in self._buffers().values())
+
+    def clear(self):
+        """Release the current thread arrays."""
+        self._buffers().clear()
+
+
+arena = BufferArena()
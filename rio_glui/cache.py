@@ -0,0 +1,421 @@
+"""rio_glui.cache: persistent tile cache and raw array cache."""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy
+
+import mercantile
+
+
+# Number of cache hits whose access time is written at once
+ATIME_BATCH = 64
+
+
+def _is_locked(error):
+    """Check if a SQLite error is a lock held by another connection."""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def tile_key(source, z, x, y, **params):
+    """
+    Create a content-addressed tile key.
+
+    Attributes
+    ----------
+    source : str
+        Source identity (e.g. from `RasterTiles.get_source_id()`).
+    z, x, y : int
+        Mercator tile index.
+    params : dict, optional
+        Render parameters (format, scale, colormap, color operations...).
+
+    Returns
+    -------
+    key : str
+        sha1 hex digest.
+
+    """
+    params.update(dict(source=source, z=z, x=x, y=y))
+    return hashlib.sha1(
+        json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def tile_range(bounds, z):
+    """
+    Get the tiles of an extent at a zoom level.
+
+    The range has a one tile margin, for tiles resampled from pixels across
+    their edges.
+
+    Attributes
+    ----------
+    bounds : list
+        (west, south, east, north) WGS84 bounds.
+    z : int
+        Zoom level.
+
+    Returns
+    -------
+    minx, maxx, miny, maxy : int
+
+    """
+    ul = mercantile.tile(bounds[0], bounds[3], z)
+    lr = mercantile.tile(bounds[2], bounds[1], z)
+    return ul.x - 1, lr.x + 1, ul.y - 1, lr.y + 1
+
+
+class TileCache(object):
+    """
+    SQLite backed, size-bounded LRU tile cache.
+
+    The cache can be shared by multiple threads and processes (WAL journal,
+    one connection per thread and process) and persists across restarts.
+    Cache hits are read only: access times are written in batches (with the
+    next `set`, or every `ATIME_BATCH` hits), and the total size is kept up
+    to date by triggers. A cache locked by another writer for more than
+    `timeout` seconds is a miss (`get`) or a skipped write (`set`).
+
+    Attributes
+    ----------
+    path : str
+        SQLite database path.
+    max_size : int, optional (default: 512 MB)
+        Maximum size (in bytes) of cached tiles before LRU eviction.
+    timeout : float, optional (default: 30)
+        Seconds to wait for a lock held by another process.
+
+    Methods
+    -------
+    get(key)
+        Get a tile from the cache.
+    set(key, value, source=None, z=None, x=None, y=None)
+        Add a tile to the cache and evict least recently used tiles.
+    size()
+        Get total size of the cached tiles.
+    invalidate(source, bounds=None)
+        Remove the tiles of a source (intersecting `bounds` only).
+    clear()
+        Remove all tiles.
+
+    """
+
+    def __init__(self, path, max_size=512 * 1024 * 1024, timeout=30):
+        """Initialize TileCache object."""
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._local = threading.local()
+        self._atimes = {}
+        self._atimes_lock = threading.Lock()
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+        db = self._connect()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS tiles ("
+            "key TEXT PRIMARY KEY, source TEXT, z INTEGER, x INTEGER, y INTEGER, "
+            "data BLOB, size INTEGER, atime REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS tiles_atime ON tiles (atime)")
+        db.execute("CREATE INDEX IF NOT EXISTS tiles_zxy ON tiles (source, z, x, y)")
+
+        # NOTE: The total size is kept in a single row table, so `set` does
+        # not sum the size of all tiles (REPLACE deletes fire the delete
+        # trigger with recursive triggers on)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tiles_size (id INTEGER PRIMARY KEY, size INTEGER)"
+            )
+            db.execute(
+                "INSERT OR IGNORE INTO tiles_size "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM tiles"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS tiles_insert AFTER INSERT ON tiles "
+                "BEGIN UPDATE tiles_size SET size = size + NEW.size; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS tiles_delete AFTER DELETE ON tiles "
+                "BEGIN UPDATE tiles_size SET size = size - OLD.size; END"
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def _connect(self):
+        """Get a connection for the current thread and process."""
+        pid = os.getpid()
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != pid:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA recursive_triggers=ON")
+            self._local.db = db
+            self._local.pid = pid
+        return db
+
+    def get(self, key):
+        """Get a tile from the cache (None if missing or locked)."""
+        try:
+            db = self._connect()
+            row = db.execute("SELECT data FROM tiles WHERE key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e):
+                raise
+            return None
+
+        if row is None:
+            return None
+
+        with self._atimes_lock:
+            self._atimes[key] = time.time()
+            flush = len(self._atimes) >= ATIME_BATCH
+
+        if flush:
+            self._write(self._flush_atimes)
+
+        return bytes(row[0])
+
+    def _write(self, *operations):
+        """Run operations in a write transaction (skipped if locked)."""
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e):
+                raise
+            return False
+
+        try:
+            for operation in operations:
+                operation(db)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+        return True
+
+    def _flush_atimes(self, db):
+        # NOTE: Access times of a failed write are lost, the LRU order is
+        # approximate
+        with self._atimes_lock:
+            atimes, self._atimes = self._atimes, {}
+        db.executemany(
+            "UPDATE tiles SET atime = ? WHERE key = ?",
+            [(atime, key) for key, atime in atimes.items()],
+        )
+
+    def set(self, key, value, source=None, z=None, x=None, y=None):
+        """Add a tile to the cache and evict least recently used tiles."""
+        if len(value) > self.max_size:
+            return
+
+        def insert(db):
+            db.execute(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, source, z, x, y, sqlite3.Binary(value), len(value), time.time()),
+            )
+
+        self._write(self._flush_atimes, insert, self._evict)
+
+    def _evict(self, db):
+        excess = self._size(db) - self.max_size
+        if excess <= 0:
+            return
+
+        keys = []
+        for key, size in db.execute("SELECT key, size FROM tiles ORDER BY atime"):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+        db.executemany("DELETE FROM tiles WHERE key = ?", keys)
+
+    @staticmethod
+    def _size(db):
+        return db.execute("SELECT size FROM tiles_size").fetchone()[0]
+
+    def size(self):
+        """Get total size (in bytes) of the cached tiles."""
+        return self._size(self._connect())
+
+    def invalidate(self, source, bounds=None):
+        """
+        Remove the tiles of a source (intersecting `bounds` only).
+
+        Tiles without a z/x/y index (e.g. previews) are removed for any
+        extent.
+
+        Attributes
+        ----------
+        source : str
+            Source identity.
+        bounds : list, optional
+            (west, south, east, north) WGS84 extents.
+
+        """
+        db = self._connect()
+        if bounds is None:
+            db.execute("DELETE FROM tiles WHERE source = ?", (source,))
+            return
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM tiles WHERE source = ? AND z IS NULL", (source,))
+            zooms = [
+                row[0]
+                for row in db.execute(
+                    "SELECT DISTINCT z FROM tiles WHERE source = ? AND z IS NOT NULL",
+                    (source,),
+                )
+            ]
+            for extent in bounds:
+                for z in zooms:
+                    minx, maxx, miny, maxy = tile_range(extent, z)
+                    db.execute(
+                        "DELETE FROM tiles WHERE source = ? AND z = ? "
+                        "AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?",
+                        (source, z, minx, maxx, miny, maxy),
+                    )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        """Remove all tiles."""
+        self._connect().execute("DELETE FROM tiles")
+
+
+class ArrayCache(object):
+    """
+    In-memory, size-bounded LRU cache of raw tile arrays.
+
+    Tiles are cached per tile size, so smaller tile sizes can be derived from
+    a cached larger tile (see `get_larger`) instead of a new read. Cached
+    arrays are read-only.
+
+    Attributes
+    ----------
+    max_size : int, optional (default: 128 MB)
+        Maximum size (in bytes) of cached arrays before LRU eviction.
+
+    Methods
+    -------
+    get(z, x, y, tilesize)
+        Get tile data and mask from the cache.
+    get_larger(z, x, y, tilesize)
+        Get the smallest cached tile whose size is a multiple of `tilesize`.
+    set(z, x, y, data, mask)
+        Add tile data and mask to the cache.
+    size()
+        Get total size of the cached arrays.
+    invalidate(bounds=None)
+        Remove the tiles intersecting extents (all tiles by default).
+    clear()
+        Remove all tiles.
+
+    """
+
+    def __init__(self, max_size=128 * 1024 * 1024):
+        """Initialize ArrayCache object."""
+        self.max_size = max_size
+        self._tiles = OrderedDict()
+        self._sizes = set()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, z, x, y, tilesize):
+        """Get tile data and mask from the cache (None if missing)."""
+        key = (tilesize, z, x, y)
+        with self._lock:
+            tile = self._tiles.pop(key, None)
+            if tile is not None:
+                self._tiles[key] = tile
+            return tile
+
+    def get_larger(self, z, x, y, tilesize):
+        """Get the smallest larger cached tile (None if missing)."""
+        with self._lock:
+            sizes = sorted(self._sizes)
+
+        for size in sizes:
+            if size > tilesize and not size % tilesize:
+                tile = self.get(z, x, y, size)
+                if tile is not None:
+                    return tile
+
+        return None
+
+    def set(self, z, x, y, data, mask):
+        """Add tile data and mask (copied) to the cache."""
+        data = numpy.array(data)
+        mask = numpy.array(mask)
+        data.flags.writeable = False
+        mask.flags.writeable = False
+
+        nbytes = data.nbytes + mask.nbytes
+        if nbytes > self.max_size:
+            return
+
+        key = (data.shape[-1], z, x, y)
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[0].nbytes + old[1].nbytes
+
+            self._tiles[key] = (data, mask)
+            self._sizes.add(key[0])
+            self._nbytes += nbytes
+            while self._nbytes > self.max_size:
+                _, (old_data, old_mask) = self._tiles.popitem(last=False)
+                self._nbytes -= old_data.nbytes + old_mask.nbytes
+
+    def size(self):
+        """Get total size (in bytes) of the cached arrays."""
+        return self._nbytes
+
+    def clear(self):
+        """Remove all tiles."""
+        with self._lock:
+            self._tiles.clear()
+            self._nbytes = 0
+
+    def invalidate(self, bounds=None):
+        """
+        Remove the tiles intersecting extents (all tiles by default).
+
+        Attributes
+        ----------
+        bounds : list, optional
+            (west, south, east, north) WGS84 extents.
+
+        """
+        if bounds is None:
+            self.clear()
+            return
+
+        with self._lock:
+            for key in list(self._tiles):
+                _, z, x, y = key
+                for extent in bounds:
+                    minx, maxx, miny, maxy = tile_range(extent, z)
+                    if minx <= x <= maxx and miny <= y <= maxy:
+                        data, mask = self._tiles.pop(key)
+                        self._nbytes -= data.nbytes + mask.nbytes
+                        break
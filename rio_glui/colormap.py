@@ -0,0 +1,113 @@
+"""rio_glui.colormap: colormap lookup tables."""
+
+import os
+
+import numpy
+
+
+def list_colormaps():
+    """List rio-tiler colormap names."""
+    # NOTE: rio-tiler (and rasterio) are imported when first needed, they
+    # are not needed to apply a LUT
+    import rio_tiler
+
+    cmap_dir = os.path.join(os.path.dirname(rio_tiler.__file__), "cmap")
+    return sorted(
+        os.path.splitext(name)[0]
+        for name in os.listdir(cmap_dir)
+        if not name.startswith("_") and not name.endswith(".py")
+    )
+
+
+def _read_lut_file(path):
+    """
+    Read a user LUT file.
+
+    Supported formats are NumPy `.npy` (256x3 or 256x4 array) and text files
+    with one `value r g b [a]` entry per line (GDAL color table style, `#`
+    comments allowed). Missing text entries are transparent.
+
+    """
+    if path.endswith(".npy"):
+        lut = numpy.load(path)
+    else:
+        lut = numpy.zeros((256, 4), dtype=numpy.uint8)
+        with open(path) as f:
+            for line in f:
+                line = line.split("#")[0].replace(",", " ").split()
+                if not line:
+                    continue
+                values = [int(float(v)) for v in line]
+                if len(values) not in [4, 5]:
+                    raise ValueError("Invalid LUT entry: {}".format(" ".join(line)))
+                if len(values) == 4:
+                    values.append(255)
+                lut[values[0]] = values[1:]
+
+    lut = numpy.asarray(lut)
+    if lut.shape not in [(256, 3), (256, 4)]:
+        raise ValueError("LUT must have 256 RGB or RGBA entries")
+
+    return lut
+
+
+def get_lut(colormap):
+    """
+    Get a 256 entries RGBA lookup table.
+
+    Attributes
+    ----------
+    colormap : str
+        rio-tiler colormap name or path to a LUT file (.npy or text).
+
+    Returns
+    -------
+    lut : numpy ndarray
+        (256, 4) uint8 array.
+
+    """
+    if os.path.isfile(colormap):
+        lut = _read_lut_file(colormap)
+    else:
+        from rio_tiler.utils import get_colormap
+
+        lut = get_colormap(name=colormap, format="gdal")
+
+    lut = numpy.asarray(lut, dtype=numpy.uint8)
+    if lut.shape[1] == 3:
+        lut = numpy.hstack([lut, numpy.full((256, 1), 255, dtype=numpy.uint8)])
+
+    return numpy.ascontiguousarray(lut)
+
+
+def apply_lut(index, lut, mask=None, out=None):
+    """
+    Apply a RGBA lookup table with one fancy-index.
+
+    Attributes
+    ----------
+    index : numpy ndarray
+        2D uint8 array.
+    lut : numpy ndarray
+        (256, 4) RGBA lookup table.
+    mask : numpy ndarray, optional
+        2D mask (0: transparent), combined with the LUT alpha.
+    out : numpy ndarray, optional
+        (4, height, width) uint8 output array.
+
+    Returns
+    -------
+    rgba : numpy ndarray
+        (4, height, width) uint8 array.
+
+    """
+    if out is None:
+        out = numpy.empty((4,) + index.shape, dtype=numpy.uint8)
+
+    numpy.take(lut.T, index, axis=1, out=out)
+    if mask is not None:
+        if mask.dtype == numpy.bool_:
+            mask = mask.astype(numpy.uint8) * 255
+        numpy.minimum(out[3], mask, out=out[3], casting="unsafe")
+
+    return out
@@ -0,0 +1,316 @@
+"""rio_glui.diagnostics: Cloud Optimized GeoTIFF layout diagnostics."""
+
+import rasterio
+from rasterio.warp import calculate_default_transform
+
+from rio_glui.env import GDAL_ENV
+from rio_glui.raster import _block_index, _meters_per_pixel, _max_zoom, _min_zoom
+
+# Smallest internal block side read efficiently (one request per block)
+MIN_BLOCK_SIZE = 256
+
+# Compression codecs which are slow to decode or not compressed at all
+SLOW_COMPRESSIONS = ["NONE", "LZMA", "PACKBITS", "CCITTFAX4", "CCITTRLE"]
+
+# Estimated reads above which a tile is flagged as slow
+MAX_TILE_BLOCKS = 16
+MAX_TILE_BYTES = 4 * 1024 * 1024
+
+# Overview decimation above which a zoom reads too many pixels (missing level)
+MAX_OVERSAMPLING = 2.0
+
+
+def _compression(src):
+    return src.tags(ns="IMAGE_STRUCTURE").get("COMPRESSION", "NONE").upper()
+
+
+def _get_level(src, decimation):
+    """Get an overview level layout (blocks, compression, IFD and data offsets)."""
+    blocks = _block_index(src)
+    offsets, sizes = blocks[..., 0], blocks[..., 1]
+    present = sizes.sum(axis=0) > 0
+    data = offsets[:, present]
+    ifd_offset = src.get_tag_item("IFD_OFFSET", "TIFF", bidx=1)
+    block_height, block_width = src.block_shapes[0]
+    return dict(
+        decimation=decimation,
+        width=src.width,
+        height=src.height,
+        block_width=block_width,
+        block_height=block_height,
+        cols=blocks.shape[2],
+        rows=blocks.shape[1],
+        sparse_blocks=int((~present).sum()),
+        compression=_compression(src),
+        ifd_offset=int(ifd_offset) if ifd_offset else None,
+        data_start=int(data[data > 0].min()) if (data > 0).any() else None,
+        data_end=int((offsets + sizes).max()),
+        # NOTE: A tile reads the block of each band (band interleaved)
+        block_bytes=float(sizes.sum(axis=0)[present].mean()) if present.any() else 0.0,
+    )
+
+
+def _check_layout(levels):
+    """Get the IFD and data ordering and its warnings."""
+    warnings = []
+    ifds = [level["ifd_offset"] for level in levels]
+    starts = [level["data_start"] for level in levels if level["data_start"]]
+    layout = dict(
+        ifds_first=None not in ifds and bool(starts) and max(ifds) < min(starts),
+        ifds_ordered=None not in ifds and ifds == sorted(ifds),
+        # NOTE: COGs store the coarsest overview data first and full
+        # resolution data last, so low zoom reads are grouped
+        data_ordered=starts == sorted(starts, reverse=True),
+    )
+    if not layout["ifds_first"]:
+        warnings.append(
+            "IFDs are not all before the image data: opening the file needs "
+            "extra requests"
+        )
+    if not layout["ifds_ordered"]:
+        warnings.append(
+            "IFDs are not ordered from full resolution to coarsest overview"
+        )
+    if not layout["data_ordered"]:
+        warnings.append(
+            "Image data is not ordered from the coarsest overview to full resolution"
+        )
+    return layout, warnings
+
+
+def _estimate_zoom(zoom, levels, resolution, tiles_size):
+    """Estimate the overview level, blocks and bytes read for a tile at zoom."""
+    tile_resolution = _meters_per_pixel(zoom, 0) * 256.0 / tiles_size
+    decimation = tile_resolution / resolution
+    level = 0
+    for idx, info in enumerate(levels):
+        if info["decimation"] <= decimation:
+            level = idx
+
+    info = levels[level]
+    # NOTE: Tiles are not aligned with blocks, a tile spanning n blocks
+    # reads n + 1 of them along each axis on average
+    extent = tiles_size * decimation / info["decimation"]
+    cols = min(extent / info["block_width"] + 1, info["cols"])
+    rows = min(extent / info["block_height"] + 1, info["rows"])
+    return dict(
+        zoom=zoom,
+        level=level,
+        oversampling=decimation / info["decimation"],
+        blocks=cols * rows,
+        bytes=cols * rows * info["block_bytes"],
+    )
+
+
+def inspect_cog(path, tiles_size=512, env=None):
+    """
+    Inspect a raster layout and estimate the cost of serving its tiles.
+
+    Attributes
+    ----------
+    path : str
+        Raster path or URL.
+    tiles_size : int, optional (default: 512)
+        Served tile size.
+    env : dict, optional
+        GDAL configuration options (default: `rio_glui.env.GDAL_ENV`).
+
+    Returns
+    -------
+    report : dict
+        Raster info, `levels` (full resolution then overviews: decimation,
+        size, blocks, compression, IFD and data offsets, mean block bytes),
+        IFD and data `layout`, `minzoom`/`maxzoom` and per-zoom estimates
+        (`zooms`: overview level, oversampling, blocks and bytes per tile),
+        `errors` (files RasterTiles refuses) and `warnings` (slow files).
+
+    """
+    env = env if env is not None else dict(GDAL_ENV)
+    errors = []
+    warnings = []
+    with rasterio.Env(**env):
+        with rasterio.open(path) as src:
+            report = dict(
+                path=path,
+                driver=src.driver,
+                width=src.width,
+                height=src.height,
+                count=src.count,
+                dtype=src.dtypes[0],
+                tiled=src.is_tiled,
+                interleave=src.interleaving.name if src.interleaving else None,
+                overviews=src.overviews(1),
+            )
+            levels = [_get_level(src, 1)]
+            dst_affine, _, _ = calculate_default_transform(
+                src.crs, "epsg:3857", src.width, src.height, *src.bounds
+            )
+            resolution = max(abs(dst_affine[0]), abs(dst_affine[4]))
+
+        for idx, decimation in enumerate(report["overviews"]):
+            with rasterio.open(path, OVERVIEW_LEVEL=idx) as src:
+                levels.append(_get_level(src, decimation))
+
+    if report["driver"] != "GTiff":
+        errors.append("Driver is {}, not GTiff".format(report["driver"]))
+    if not report["tiled"]:
+        errors.append("Raster is not tiled (strips)")
+    if not report["overviews"]:
+        errors.append("Raster has no overviews")
+
+    # NOTE: The served zoom range is the one of the tile server (see
+    # `RasterTiles.get_min_zoom` and `get_max_zoom`), for the files it serves
+    if errors:
+        report.update(minzoom=None, maxzoom=None)
+    else:
+        report.update(
+            minzoom=_min_zoom(resolution, report["overviews"][-1]),
+            maxzoom=_max_zoom(resolution),
+        )
+
+    small = [
+        str(level["decimation"])
+        for level in levels
+        if min(level["block_width"], level["block_height"]) < MIN_BLOCK_SIZE
+        and min(level["width"], level["height"]) > MIN_BLOCK_SIZE
+    ]
+    if small:
+        warnings.append(
+            "Blocks smaller than {0}x{0} (decimation {1}): one request per "
+            "small block".format(MIN_BLOCK_SIZE, ", ".join(small))
+        )
+
+    compressions = sorted(set(level["compression"] for level in levels))
+    slow = [c for c in compressions if c in SLOW_COMPRESSIONS]
+    if slow:
+        warnings.append("Slow or no compression: {}".format(", ".join(slow)))
+    if len(compressions) > 1:
+        warnings.append(
+            "Overviews and full resolution use different compressions: {}".format(
+                ", ".join(compressions)
+            )
+        )
+
+    layout, layout_warnings = _check_layout(levels)
+    warnings += layout_warnings
+
+    zooms = []
+    if report["minzoom"] is not None:
+        for zoom in range(report["minzoom"], report["maxzoom"] + 1):
+            estimate = _estimate_zoom(zoom, levels, resolution, tiles_size)
+            zooms.append(estimate)
+            issues = []
+            if estimate["oversampling"] > MAX_OVERSAMPLING:
+                issues.append(
+                    "reads {:.1f}x the needed resolution (missing overview)".format(
+                        estimate["oversampling"]
+                    )
+                )
+            if estimate["blocks"] > MAX_TILE_BLOCKS:
+                issues.append("~{:.0f} blocks per tile".format(estimate["blocks"]))
+            if estimate["bytes"] > MAX_TILE_BYTES:
+                issues.append(
+                    "~{:.1f} MB per tile".format(estimate["bytes"] / 1024.0 / 1024)
+                )
+            if issues:
+                warnings.append("Zoom {}: {}".format(zoom, ", ".join(issues)))
+
+    report.update(
+        tiles_size=tiles_size,
+        levels=levels,
+        layout=layout,
+        zooms=zooms,
+        errors=errors,
+        warnings=warnings,
+    )
+    return report
+
+
+def _format_bytes(value):
+    for unit in ["B", "KB", "MB"]:
+        if value < 1024:
+            return "{:.1f} {}".format(value, unit)
+        value /= 1024.0
+    return "{:.1f} GB".format(value)
+
+
+def format_report(report):
+    """Format an `inspect_cog` report as text."""
+    lines = [
+        report["path"],
+        "  {} {} band(s) {}, {}x{}, tiled: {}, interleave: {}".format(
+            report["driver"],
+            report["count"],
+            report["dtype"],
+            report["width"],
+            report["height"],
+            report["tiled"],
+            report["interleave"],
+        ),
+        "",
+        "  {:<6} {:>10} {:>8} {:>8} {:>12} {:>12} {:>12} {:>10}".format(
+            "level",
+            "size",
+            "blocks",
+            "block",
+            "compression",
+            "ifd offset",
+            "data offset",
+            "block size",
+        ),
+    ]
+    for level in report["levels"]:
+        lines.append(
+            "  {:<6} {:>10} {:>8} {:>8} {:>12} {:>12} {:>12} {:>10}".format(
+                "x{}".format(level["decimation"]),
+                "{}x{}".format(level["width"], level["height"]),
+                "{}x{}".format(level["cols"], level["rows"]),
+                "{}x{}".format(level["block_width"], level["block_height"]),
+                level["compression"],
+                level["ifd_offset"],
+                level["data_start"],
+                _format_bytes(level["block_bytes"]),
+            )
+        )
+
+    layout = report["layout"]
+    lines += [
+        "",
+        "  IFDs before data: {}, IFDs ordered: {}, data ordered: {}".format(
+            layout["ifds_first"], layout["ifds_ordered"], layout["data_ordered"]
+        ),
+    ]
+
+    if report["zooms"]:
+        lines += [
+            "",
+            "  Zooms {}-{} ({} px tiles)".format(
+                report["minzoom"], report["maxzoom"], report["tiles_size"]
+            ),
+            "  {:<6} {:>6} {:>13} {:>12} {:>11}".format(
+                "zoom", "level", "oversampling", "blocks/tile", "bytes/tile"
+            ),
+        ]
+        for zoom in report["zooms"]:
+            lines.append(
+                "  {:<6} {:>6} {:>13.2f} {:>12.1f} {:>11}".format(
+                    zoom["zoom"],
+                    "x{}".format(report["levels"][zoom["level"]]["decimation"]),
+                    zoom["oversampling"],
+                    zoom["blocks"],
+                    _format_bytes(zoom["bytes"]),
+                )
+            )
+
+    for title, messages in [
+        ("Errors", report["errors"]),
+        ("Warnings", report["warnings"]),
+    ]:
+        if messages:
+            lines += ["", "  {}:".format(title)]
+            lines += ["  - {}".format(message) for message in messages]
+
+    if not report["errors"] and not report["warnings"]:
+        lines += ["", "  No issues found"]
+
+    return "\n".join(lines)
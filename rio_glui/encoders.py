@@ -0,0 +1,335 @@
+"""rio_glui.encoders: tile encoders."""
+
+import zlib
+import struct
+from io import BytesIO
+
+import numpy
+
+
+def encode_image(data, mask, tileformat, **options):
+    """
+    Encode an image with rio-tiler and its default format profile.
+
+    rio-tiler (and rasterio) are only imported when the first image is
+    encoded, so importing the tile server stays fast.
+
+    Attributes
+    ----------
+    data : numpy ndarray
+        uint8 image bands.
+    mask : numpy ndarray
+        uint8 mask (0: transparent).
+    tileformat : str
+        Image format (png, jpeg, webp).
+    options : dict, optional
+        GDAL creation options overriding the format profile (e.g. `zlevel`).
+
+    Returns
+    -------
+    bytes
+
+    """
+    from rio_tiler.utils import array_to_image
+    from rio_tiler.profiles import img_profiles
+
+    options = dict(img_profiles.get(tileformat, {}), **options)
+    return array_to_image(data, mask=mask, img_format=tileformat, **options)
+
+
+def encode_npy(data, mask, level=6):
+    """
+    Encode tile data and mask as deflate compressed NPY arrays.
+
+    The output is the zlib compressed concatenation of two NPY (v1.0)
+    arrays: data (bands, height, width) then mask (height, width) as uint8.
+
+    Attributes
+    ----------
+    data : numpy ndarray
+        Tile data.
+    mask : numpy ndarray
+        Tile mask.
+    level : int, optional (default: 6)
+        zlib compression level.
+
+    Returns
+    -------
+    bytes
+
+    """
+    buf = BytesIO()
+    numpy.save(buf, numpy.ascontiguousarray(data))
+    numpy.save(buf, numpy.ascontiguousarray(mask, dtype=numpy.uint8))
+    return zlib.compress(buf.getvalue(), level)
+
+
+def npy_info(tile):
+    """
+    Get data dtype and shape from an `encode_npy` tile.
+
+    Only the NPY header is decompressed.
+
+    Returns
+    -------
+    dtype : numpy.dtype
+    shape : tuple
+
+    """
+    header = BytesIO(zlib.decompressobj().decompress(tile, 4096))
+    version = numpy.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, _, dtype = numpy.lib.format.read_array_header_1_0(header)
+    else:
+        shape, _, dtype = numpy.lib.format.read_array_header_2_0(header)
+    return dtype, shape
+
+
+def decode_npy(tile):
+    """
+    Decode an `encode_npy` tile.
+
+    Returns
+    -------
+    data : numpy ndarray
+    mask : numpy ndarray
+
+    """
+    buf = BytesIO(zlib.decompress(tile))
+    return numpy.load(buf), numpy.load(buf)
+
+
+class PNGEncoder(object):
+    """
+    Streaming PNG encoder.
+
+    Image rows are filtered ("up" filter) and deflate compressed as they are
+    written, so large images are encoded strip by strip without holding the
+    whole image in memory.
+
+    Attributes
+    ----------
+    width, height : int
+        Image size.
+    bands : int
+        Number of uint8 bands (1: gray, 2: gray and alpha, 3: RGB, 4: RGBA).
+    level : int, optional (default: 6)
+        zlib compression level.
+    palette : numpy ndarray, optional
+        (n <= 256, 4) RGBA palette of an indexed (1 band) image, written as
+        PLTE and tRNS chunks.
+
+    Methods
+    -------
+    start()
+        Get the PNG signature and header.
+    write(data)
+        Encode image rows.
+    finish()
+        Get the remaining compressed data and PNG end.
+
+    """
+
+    COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+    def __init__(self, width, height, bands, level=6, palette=None):
+        """Initialize PNGEncoder object."""
+        if bands not in self.COLOR_TYPES:
+            raise ValueError("PNG images must have 1 to 4 bands")
+
+        if palette is not None:
+            palette = numpy.asarray(palette, dtype=numpy.uint8)
+            if bands != 1 or palette.ndim != 2 or not 0 < len(palette) <= 256:
+                raise ValueError("Indexed PNG images must have 1 band and 1-256 colors")
+
+        self.width = width
+        self.height = height
+        self.bands = bands
+        self.palette = palette
+        self.rows = 0
+        self._compress = zlib.compressobj(level)
+        self._previous = numpy.zeros(width * bands, dtype=numpy.uint8)
+
+    @staticmethod
+    def _chunk(tag, data):
+        crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+    def start(self):
+        """Get the PNG signature and header."""
+        header = struct.pack(
+            ">IIBBBBB",
+            self.width,
+            self.height,
+            8,
+            3 if self.palette is not None else self.COLOR_TYPES[self.bands],
+            0,
+            0,
+            0,
+        )
+        start = b"\x89PNG\r\n\x1a\n" + self._chunk(b"IHDR", header)
+        if self.palette is None:
+            return start
+
+        start += self._chunk(b"PLTE", self.palette[:, :3].tobytes())
+        if self.palette.shape[1] == 4:
+            # NOTE: tRNS stops at the last transparent entry, the following
+            # entries are opaque
+            alpha = self.palette[:, 3]
+            transparent = numpy.flatnonzero(alpha != 255)
+            if len(transparent):
+                start += self._chunk(b"tRNS", alpha[: transparent[-1] + 1].tobytes())
+        return start
+
+    def write(self, data):
+        """
+        Encode image rows.
+
+        Attributes
+        ----------
+        data : numpy ndarray
+            (bands, rows, width) uint8 array.
+
+        Returns
+        -------
+        bytes
+            IDAT chunk (empty until zlib outputs data).
+
+        """
+        nrows = data.shape[1]
+        if self.rows + nrows > self.height:
+            raise ValueError(
+                "Too many rows for a {} pixels high image".format(self.height)
+            )
+
+        pixels = numpy.ascontiguousarray(
+            data.transpose(1, 2, 0), dtype=numpy.uint8
+        ).reshape(nrows, -1)
+        rows = numpy.empty((nrows, pixels.shape[1] + 1), dtype=numpy.uint8)
+        if self.palette is not None:
+            # NOTE: Indexes are not continuous values, unfiltered rows
+            # compress better (PNG specification recommendation)
+            rows[:, 0] = 0
+            rows[:, 1:] = pixels
+        else:
+            rows[:, 0] = 2  # "up" filter
+            numpy.subtract(pixels[:1], self._previous, out=rows[:1, 1:])
+            numpy.subtract(pixels[1:], pixels[:-1], out=rows[1:, 1:])
+        self._previous = pixels[-1].copy()
+        self.rows += nrows
+
+        compressed = self._compress.compress(rows.tobytes())
+        return self._chunk(b"IDAT", compressed) if compressed else b""
+
+    def finish(self):
+        """Get the remaining compressed data and PNG end."""
+        if self.rows != self.height:
+            raise ValueError(
+                "Image has {} rows out of {}".format(self.rows, self.height)
+            )
+
+        return self._chunk(b"IDAT", self._compress.flush()) + self._chunk(b"IEND", b"")
+
+
+def encode_indexed_png(index, mask, lut, level=6):
+    """
+    Encode a colormapped tile as an indexed (8-bit palette) PNG.
+
+    The lookup table is written as the image palette (PLTE and tRNS chunks)
+    and masked pixels are set to a transparent palette entry: the first
+    entry with a null alpha, or else the first entry not used by valid
+    pixels.
+
+    Attributes
+    ----------
+    index : numpy ndarray
+        (height, width) uint8 lookup table indexes.
+    mask : numpy ndarray
+        (height, width) mask (0: transparent).
+    lut : numpy ndarray
+        (256, 4) RGBA lookup table.
+    level : int, optional (default: 6)
+        zlib compression level.
+
+    Returns
+    -------
+    bytes or None
+        None when valid pixels use all 256 entries (no transparent entry).
+
+    """
+    valid = mask != 0
+    palette = numpy.array(lut, dtype=numpy.uint8)
+    if palette.shape[1] == 3:
+        palette = numpy.hstack(
+            [palette, numpy.full((len(palette), 1), 255, numpy.uint8)]
+        )
+
+    if not valid.all():
+        free = numpy.flatnonzero(palette[:, 3] == 0)
+        if not len(free):
+            used = numpy.bincount(index[valid], minlength=256)
+            free = numpy.flatnonzero(used == 0)
+            if not len(free):
+                return None
+        palette[free[0], 3] = 0
+        index = numpy.where(valid, index, free[0]).astype(numpy.uint8)
+
+    height, width = index.shape
+    encoder = PNGEncoder(width, height, 1, level=level, palette=palette)
+    return encoder.start() + encoder.write(index[numpy.newaxis]) + encoder.finish()
+
+
+def pack_terrain_rgb(data, mask):
+    """
+    Pack elevations as Mapbox Terrain-RGB pixel values.
+
+    Elevations are encoded with a 0.1 meter precision from -10000 meters
+    (`height = -10000 + (R * 256 * 256 + G * 256 + B) * 0.1`) and clipped to
+    the encoding range. Terrain-RGB images have no transparency: masked
+    pixels are set to 0 meter.
+
+    Attributes
+    ----------
+    data : numpy ndarray
+        (height, width) elevations in meters.
+    mask : numpy ndarray
+        (height, width) mask (0: no data).
+
+    Returns
+    -------
+    numpy ndarray
+        (3, height, width) uint8 RGB array.
+
+    """
+    value = numpy.rint((numpy.asarray(data, dtype=numpy.float64) + 10000) * 10)
+    value = numpy.clip(value, 0, 0xFFFFFF).astype(numpy.uint32)
+    value[mask == 0] = 100000
+
+    rgb = numpy.empty((3,) + value.shape, dtype=numpy.uint8)
+    rgb[0] = value >> 16
+    rgb[1] = (value >> 8) & 0xFF
+    rgb[2] = value & 0xFF
+    return rgb
+
+
+def encode_terrain_rgb(data, mask, level=6):
+    """
+    Encode elevations as a Mapbox Terrain-RGB PNG.
+
+    Attributes
+    ----------
+    data : numpy ndarray
+        (height, width) elevations in meters.
+    mask : numpy ndarray
+        (height, width) mask (0: no data).
+    level : int, optional (default: 6)
+        zlib compression level.
+
+    Returns
+    -------
+    bytes
+
+    """
+    rgb = pack_terrain_rgb(data, mask)
+    encoder = PNGEncoder(rgb.shape[2], rgb.shape[1], 3, level=level)
+    return encoder.start() + encoder.write(rgb) + encoder.finish()
@@ -0,0 +1,143 @@
+"""rio_glui.env: GDAL configuration for (remote) raster reads."""
+
+import os
+import logging
+import threading
+
+GDAL_ENV = dict(
+    GDAL_DISABLE_READDIR_ON_OPEN="EMPTY_DIR",
+    GDAL_HTTP_MERGE_CONSECUTIVE_RANGES="YES",
+    GDAL_HTTP_MULTIPLEX="YES",
+    VSI_CACHE="TRUE",
+    VSI_CACHE_SIZE=64 * 1024 * 1024,
+    CPL_VSIL_CURL_ALLOWED_EXTENSIONS=".tif,.TIF,.tiff",
+    GDAL_INGESTED_BYTES_AT_OPEN=32768,
+)
+
+
+def set_cachemax(cachemax):
+    """
+    Set the GDAL block cache size (GDAL_CACHEMAX, in MB).
+
+    The block cache is process wide and GDAL reads its size once, when it is
+    first used: it must be set before reading any data and is inherited by
+    forked worker processes.
+
+    """
+    # NOTE: Changing GDAL_CACHEMAX as a config option (rasterio.Env) once
+    # GDAL is initialized can deadlock block reads
+    os.environ["GDAL_CACHEMAX"] = str(cachemax)
+
+
+def gdal_env(
+    merge_ranges=None,
+    multiplex=None,
+    vsi_cache_size=None,
+    allowed_extensions=None,
+    ingested_bytes=None,
+):
+    """
+    Create GDAL configuration options from `GDAL_ENV` defaults.
+
+    Attributes
+    ----------
+    merge_ranges : bool, optional
+        Merge consecutive HTTP range requests
+        (GDAL_HTTP_MERGE_CONSECUTIVE_RANGES).
+    multiplex : bool, optional
+        Multiplex HTTP/2 requests (GDAL_HTTP_MULTIPLEX).
+    vsi_cache_size : int, optional
+        Per-file remote data cache size in bytes (VSI_CACHE_SIZE, 0 disables
+        VSI_CACHE).
+    allowed_extensions : str, optional
+        Comma-separated extensions GDAL may request
+        (CPL_VSIL_CURL_ALLOWED_EXTENSIONS, empty to allow all).
+    ingested_bytes : int, optional
+        Bytes read with the first request at dataset opening (header
+        prefetch, GDAL_INGESTED_BYTES_AT_OPEN).
+
+    Returns
+    -------
+    env : dict
+
+    """
+    env = dict(GDAL_ENV)
+    if merge_ranges is not None:
+        env["GDAL_HTTP_MERGE_CONSECUTIVE_RANGES"] = "YES" if merge_ranges else "NO"
+    if multiplex is not None:
+        env["GDAL_HTTP_MULTIPLEX"] = "YES" if multiplex else "NO"
+    if vsi_cache_size is not None:
+        env["VSI_CACHE"] = "TRUE" if vsi_cache_size else "FALSE"
+        env["VSI_CACHE_SIZE"] = vsi_cache_size
+    if allowed_extensions is not None:
+        env["CPL_VSIL_CURL_ALLOWED_EXTENSIONS"] = allowed_extensions
+        if not allowed_extensions:
+            del env["CPL_VSIL_CURL_ALLOWED_EXTENSIONS"]
+    if ingested_bytes is not None:
+        env["GDAL_INGESTED_BYTES_AT_OPEN"] = ingested_bytes
+
+    return env
+
+
+# Loggers of GDAL debug messages (rasterio < 1.4 and >= 1.4)
+GDAL_LOGGERS = ["rasterio._env", "rasterio._err"]
+
+
+class HTTPRequestCounter(logging.Handler):
+    """
+    Count GDAL HTTP (vsicurl) requests per thread.
+
+    GDAL only reports HTTP requests in debug messages, which rasterio forwards
+    to the `GDAL_LOGGERS` loggers: the GDAL environment must enable them
+    (`CPL_DEBUG=VSICURL`).
+
+    Methods
+    -------
+    install()
+        Attach the counter to the GDAL messages loggers.
+    uninstall()
+        Detach the counter from the GDAL messages loggers.
+    reset()
+        Reset the current thread counter.
+    count()
+        Get the current thread counter.
+
+    """
+
+    def __init__(self):
+        """Initialize HTTPRequestCounter object."""
+        logging.Handler.__init__(self, level=logging.DEBUG)
+        self._local = threading.local()
+        self._levels = {}
+
+    def emit(self, record):
+        """Count vsicurl responses."""
+        if "VSICURL: Got response_code" in record.getMessage():
+            self._local.count = self.count() + 1
+
+    def install(self):
+        """Attach the counter to the GDAL messages loggers."""
+        # NOTE: Only these loggers are set to DEBUG, the level of the other
+        # rasterio loggers is unchanged
+        for name in GDAL_LOGGERS:
+            logger = logging.getLogger(name)
+            logger.addHandler(self)
+            if logger.getEffectiveLevel() > logging.DEBUG:
+                self._levels[name] = logger.level
+                logger.setLevel(logging.DEBUG)
+
+    def uninstall(self):
+        """Detach the counter from the GDAL messages loggers."""
+        for name in GDAL_LOGGERS:
+            logger = logging.getLogger(name)
+            logger.removeHandler(self)
+            if name in self._levels:
+                logger.setLevel(self._levels.pop(name))
+
+    def reset(self):
+        """Reset the current thread counter."""
+        self._local.count = 0
+
+    def count(self):
+        """Get the current thread counter."""
+        return getattr(self._local, "count", 0)
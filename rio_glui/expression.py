@@ -0,0 +1,446 @@
+"""rio_glui.expression: band math expressions."""
+
+import re
+import ast
+import threading
+from collections import OrderedDict
+
+import numpy
+
+try:
+    import numexpr
+except ImportError:  # pragma: no cover
+    numexpr = None
+
+# Supported functions and their number of arguments
+FUNCTIONS = {
+    "where": 3,
+    "arctan2": 2,
+    "sin": 1,
+    "cos": 1,
+    "tan": 1,
+    "arcsin": 1,
+    "arccos": 1,
+    "arctan": 1,
+    "sinh": 1,
+    "cosh": 1,
+    "tanh": 1,
+    "log": 1,
+    "log10": 1,
+    "log1p": 1,
+    "exp": 1,
+    "expm1": 1,
+    "sqrt": 1,
+    "abs": 1,
+}
+
+OPERATORS = (
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.Mod,
+    ast.USub,
+    ast.UAdd,
+    ast.BitAnd,
+    ast.BitOr,
+    ast.Invert,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+)
+
+CONSTANTS = tuple(
+    getattr(ast, name) for name in ("Num", "Constant") if hasattr(ast, name)
+)
+
+NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Compare,
+    ast.Call,
+    ast.Name,
+    ast.Load,
+) + CONSTANTS
+
+BAND_NAME = re.compile(r"^b([1-9][0-9]*)$")
+
+# Maximum expression length (characters) and syntax tree depth
+MAX_LENGTH = 1024
+MAX_DEPTH = 64
+
+# NOTE: numexpr raises NotImplementedError for operand types it has no opcode
+# for and deeply nested input raises RecursionError, both RuntimeError
+# subclasses (RecursionError does not exist in Python 2)
+EXPRESSION_ERRORS = (ValueError, ArithmeticError, TypeError, RuntimeError)
+
+_numexpr_lock = threading.Lock()
+
+
+def _check(node):
+    """Check an expression syntax tree only uses band math nodes."""
+    functions = set(
+        id(child.func) for child in ast.walk(node) if isinstance(child, ast.Call)
+    )
+    for child in ast.walk(node):
+        if isinstance(child, OPERATORS):
+            continue
+
+        if not isinstance(child, NODES):
+            raise ValueError(
+                "Unsupported syntax in expression: {}".format(type(child).__name__)
+            )
+
+        if hasattr(child, "value") or hasattr(child, "n"):
+            value = getattr(child, "value", getattr(child, "n", None))
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(
+                    "Unsupported constant in expression: {!r}".format(value)
+                )
+
+        if isinstance(child, ast.Compare) and len(child.ops) > 1:
+            raise ValueError("Chained comparisons are not supported")
+
+        if isinstance(child, ast.Call):
+            if (
+                not isinstance(child.func, ast.Name)
+                or child.func.id not in FUNCTIONS
+                or len(child.args) != FUNCTIONS[child.func.id]
+                or child.keywords
+                or getattr(child, "starargs", None)
+                or getattr(child, "kwargs", None)
+            ):
+                raise ValueError("Unsupported function in expression")
+
+        if isinstance(child, ast.Name):
+            if id(child) not in functions and not BAND_NAME.match(child.id):
+                raise ValueError(
+                    "Invalid name in expression: {} (bands are b1, b2...)".format(
+                        child.id
+                    )
+                )
+
+
+def _depth(node):
+    """Get the depth of a syntax tree (without recursion)."""
+    depth = 0
+    stack = [(node, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in ast.iter_child_nodes(node))
+    return depth
+
+
+def _float_constants(node):
+    """Write integer constants as floats (no arbitrary precision integer math)."""
+    # NOTE: Python and numexpr fold integer constants with arbitrary
+    # precision, so `9 ** 9 ** 9` would never finish compiling
+    for child in ast.walk(node):
+        if isinstance(child, CONSTANTS):
+            if hasattr(child, "value"):
+                child.value = float(child.value)
+            else:
+                child.n = float(child.n)
+
+
+def _constant(value):
+    if hasattr(ast, "Constant"):
+        return ast.Constant(value=value)
+    return ast.Num(n=value)  # pragma: no cover (Python 2)
+
+
+def _typed(node):
+    """
+    Convert the operands of a (checked) expression node to supported types.
+
+    numexpr has no arithmetic on booleans (comparisons) and no bitwise
+    operators on floats: booleans are used as 0/1 numbers by arithmetic,
+    comparisons and functions, numbers as non-zero booleans by `where`
+    conditions, and bitwise operators only combine booleans.
+
+    Returns
+    -------
+    node : ast node
+        Converted node.
+    boolean : bool
+        Whether the node evaluates to booleans.
+
+    """
+    if isinstance(node, ast.Compare):
+        node.left = _as_number(node.left)
+        node.comparators = [_as_number(child) for child in node.comparators]
+        return node, True
+
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        node.left = _as_boolean(node.left)
+        node.right = _as_boolean(node.right)
+        return node, True
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        node.operand = _as_boolean(node.operand)
+        return node, True
+
+    if isinstance(node, ast.BinOp):
+        node.left = _as_number(node.left)
+        node.right = _as_number(node.right)
+    elif isinstance(node, ast.UnaryOp):
+        node.operand = _as_number(node.operand)
+    elif isinstance(node, ast.Call):
+        args = [_as_number(child) for child in node.args[1:]]
+        if node.func.id == "where":
+            args.insert(0, _as_condition(node.args[0]))
+        else:
+            args.insert(0, _as_number(node.args[0]))
+        node.args = args
+
+    return node, False
+
+
+def _as_number(node):
+    node, boolean = _typed(node)
+    if boolean:
+        return ast.Call(
+            func=ast.Name(id="where", ctx=ast.Load()),
+            args=[node, _constant(1.0), _constant(0.0)],
+            keywords=[],
+        )
+    return node
+
+
+def _as_boolean(node):
+    node, boolean = _typed(node)
+    if not boolean:
+        raise ValueError(
+            "Bitwise operators (&, |, ~) combine comparisons "
+            "(e.g. (b1 > 0) & (b2 < 10))"
+        )
+    return node
+
+
+def _as_condition(node):
+    node, boolean = _typed(node)
+    if not boolean:
+        return ast.Compare(left=node, ops=[ast.NotEq()], comparators=[_constant(0.0)])
+    return node
+
+
+def _band_names(node):
+    names = set(
+        child.id
+        for child in ast.walk(node)
+        if isinstance(child, ast.Name) and BAND_NAME.match(child.id)
+    )
+    return sorted(names, key=lambda name: int(name[1:]))
+
+
+class Expression(object):
+    """
+    Compiled band math expression.
+
+    Expressions use band names (`b1`, `b2`...), numbers, arithmetic,
+    comparison and bitwise (`&`, `|`, `~`) operators and `FUNCTIONS`
+    (e.g. `(b4 - b3) / (b4 + b3)` or `where(b1 > 0, sqrt(b1), 0)`).
+    Bitwise operators combine comparisons (e.g. `(b1 > 0) & ~(b2 > 2)`),
+    comparisons are 0/1 numbers in arithmetic and numbers are true when
+    non-zero as `where` conditions. Comma-separated expressions create one
+    output band each. Expressions are validated against a whitelist of syntax
+    nodes (of up to `MAX_LENGTH` characters and `MAX_DEPTH` levels) and
+    compiled once, with numexpr when available (NumPy otherwise).
+
+    Attributes
+    ----------
+    expr : str
+        Band math expression.
+
+    Methods
+    -------
+    evaluate(data)
+        Evaluate the expression on the referenced bands data.
+
+    """
+
+    def __init__(self, expr):
+        """Initialize Expression object."""
+        self.expr = expr
+        if len(expr) > MAX_LENGTH:
+            raise ValueError(
+                "Expression is longer than {} characters".format(MAX_LENGTH)
+            )
+
+        try:
+            tree = ast.parse(expr.strip(), mode="eval")
+        except (SyntaxError, RuntimeError, MemoryError):
+            raise ValueError("Invalid expression: {}".format(expr))
+
+        if _depth(tree) > MAX_DEPTH:
+            raise ValueError(
+                "Expression is nested deeper than {} levels".format(MAX_DEPTH)
+            )
+
+        parts = tree.body.elts if isinstance(tree.body, ast.Tuple) else [tree.body]
+        if not parts:
+            raise ValueError("Empty expression")
+
+        self._parts = []
+        for part in parts:
+            part = ast.Expression(body=part)
+            _check(part)
+            _float_constants(part)
+            part.body = _typed(part.body)[0]
+            names = _band_names(part)
+            if not names:
+                raise ValueError("Expression must reference at least one band")
+            try:
+                self._parts.append((names, self._compile(part, names)))
+            except EXPRESSION_ERRORS as e:
+                raise ValueError("Invalid expression: {} ({})".format(expr, e))
+
+        self.bands = sorted(
+            set(int(name[1:]) for names, _ in self._parts for name in names)
+        )
+        self.count = len(self._parts)
+
+        # NOTE: Constant sub-expressions (e.g. `10.0 ** 400`) raise when they
+        # are evaluated, whatever the data
+        try:
+            with numpy.errstate(all="ignore"):
+                self.evaluate(numpy.ones((len(self.bands), 1, 1), dtype=numpy.float32))
+        except EXPRESSION_ERRORS as e:
+            raise ValueError("Invalid expression: {} ({})".format(expr, e))
+
+    @staticmethod
+    def _compile(part, names):
+        if numexpr is not None:
+            source = _unparse(part.body)
+            func = numexpr.NumExpr(source, signature=[(name, float) for name in names])
+
+            # NOTE: numexpr runs expressions on a shared pool of threads
+            def evaluate(*arrays):
+                with _numexpr_lock:
+                    return func(*arrays)
+
+            return evaluate
+
+        code = compile(ast.fix_missing_locations(part), "<expression>", "eval")
+        namespace = dict((name, getattr(numpy, name)) for name in FUNCTIONS)
+        namespace["__builtins__"] = {}
+
+        def evaluate(*arrays):
+            local = dict(zip(names, arrays))
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                return eval(code, namespace, local)
+
+        return evaluate
+
+    def evaluate(self, data):
+        """
+        Evaluate the expression on the referenced bands data.
+
+        Attributes
+        ----------
+        data : numpy ndarray
+            (len(bands), height, width) data of the `bands` indexes (in
+            `bands` order).
+
+        Returns
+        -------
+        result : numpy ndarray
+            (count, height, width) float32 array.
+
+        """
+        arrays = dict(
+            ("b{}".format(band), numpy.asarray(data[bdx], dtype=numpy.float32))
+            for bdx, band in enumerate(self.bands)
+        )
+        result = numpy.empty((self.count,) + data.shape[1:], dtype=numpy.float32)
+        for bdx, (names, func) in enumerate(self._parts):
+            result[bdx] = func(*[arrays[name] for name in names])
+
+        return result
+
+
+_OPERATOR_SYMBOLS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+    ast.Pow: "**",
+    ast.Mod: "%",
+    ast.BitAnd: "&",
+    ast.BitOr: "|",
+    ast.USub: "-",
+    ast.UAdd: "+",
+    ast.Invert: "~",
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+}
+
+
+def _unparse(node):
+    """Write a (checked) expression node back as a numexpr string."""
+    if isinstance(node, ast.BinOp):
+        return "({} {} {})".format(
+            _unparse(node.left), _OPERATOR_SYMBOLS[type(node.op)], _unparse(node.right)
+        )
+    if isinstance(node, ast.UnaryOp):
+        return "({}{})".format(_OPERATOR_SYMBOLS[type(node.op)], _unparse(node.operand))
+    if isinstance(node, ast.Compare):
+        terms = [_unparse(node.left)]
+        for op, right in zip(node.ops, node.comparators):
+            terms.extend([_OPERATOR_SYMBOLS[type(op)], _unparse(right)])
+        return "({})".format(" ".join(terms))
+    if isinstance(node, ast.Call):
+        return "{}({})".format(node.func.id, ", ".join(_unparse(a) for a in node.args))
+    if isinstance(node, ast.Name):
+        return node.id
+    return repr(getattr(node, "value", getattr(node, "n", None)))
+
+
+_expressions = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_expression(expr, max_size=256, cached=False):
+    """
+    Get a compiled expression (cached per expression string).
+
+    Attributes
+    ----------
+    expr : str
+        Band math expression.
+    max_size : int, optional (default: 256)
+        Maximum number of cached expressions.
+    cached : bool, optional (default: False)
+        Only get an already compiled expression (None otherwise).
+
+    Returns
+    -------
+    expression : Expression or None
+
+    """
+    with _lock:
+        expression = _expressions.pop(expr, None)
+        if expression is not None:
+            _expressions[expr] = expression
+            return expression
+
+    if cached:
+        return None
+
+    expression = Expression(expr)
+    with _lock:
+        _expressions[expr] = expression
+        while len(_expressions) > max_size:
+            _expressions.popitem(last=False)
+
+    return expression
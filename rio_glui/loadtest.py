@@ -0,0 +1,243 @@
+"""rio_glui.loadtest: replay synthetic map sessions against a tile server."""
+
+import math
+import time
+import random
+
+import numpy
+import mercantile
+
+from tornado import gen
+from tornado.queues import Queue
+from tornado.httpclient import AsyncHTTPClient
+from tornado.escape import url_escape
+
+WORLD_SIZE = 2 * 20037508.342789244
+
+COLOR_OPS = [
+    "gamma rgb 1.5",
+    "gamma b 1.8, gamma rg 1.4",
+    "sigmoidal rgb 10 0.15",
+    "sigmoidal rgb 20 0.25, saturation 1.2",
+    "saturation 1.3",
+]
+
+
+def _lnglat_to_tile(lng, lat, zoom):
+    """Get fractional mercator tile coordinates."""
+    mx, my = mercantile.xy(lng, max(min(lat, 85.0511), -85.0511))
+    n = 2.0 ** zoom
+    return (0.5 + mx / WORLD_SIZE) * n, (0.5 - my / WORLD_SIZE) * n
+
+
+def viewport_tiles(x, y, zoom, width=1024, height=768, tilesize=512, bounds=None):
+    """
+    Get the tiles covering a map viewport.
+
+    Attributes
+    ----------
+    x, y : float
+        Fractional mercator tile coordinates of the viewport center.
+    zoom : int
+        Tile zoom level.
+    width, height : int, optional (default: 1024x768)
+        Viewport size in pixels.
+    tilesize : int, optional (default: 512)
+        Tile size in pixels.
+    bounds : list, optional
+        Source bounds (WGS84); like Mapbox GL, tiles outside are not requested.
+
+    Returns
+    -------
+    tiles : list
+        List of (z, x, y) tuples, closest to the center first.
+
+    """
+    n = 2 ** zoom
+    half_w = width / 2.0 / tilesize
+    half_h = height / 2.0 / tilesize
+    minx, miny, maxx, maxy = 0, 0, n - 1, n - 1
+    if bounds is not None:
+        minx, miny = mercantile.tile(bounds[0], bounds[3], zoom)[:2]
+        maxx, maxy = mercantile.tile(bounds[2], bounds[1], zoom)[:2]
+
+    tiles = []
+    for ty in range(int(math.floor(y - half_h)), int(math.floor(y + half_h)) + 1):
+        for tx in range(int(math.floor(x - half_w)), int(math.floor(x + half_w)) + 1):
+            if minx <= tx % n <= maxx and miny <= ty <= maxy:
+                tiles.append((zoom, tx % n, ty))
+
+    return sorted(tiles, key=lambda t: (t[1] + 0.5 - x) ** 2 + (t[2] + 0.5 - y) ** 2)
+
+
+def generate_sessions(
+    bounds,
+    minzoom,
+    maxzoom,
+    sessions=10,
+    steps=10,
+    width=1024,
+    height=768,
+    tilesize=512,
+    color_ops=COLOR_OPS,
+    seed=None,
+):
+    """
+    Generate synthetic Mapbox-GL style map sessions over a raster bounds.
+
+    Each session starts at a random location and zoom inside the bounds, then
+    each step pans, zooms in/out or edits the color formula (playground), and
+    requests every tile of the new viewport.
+
+    Attributes
+    ----------
+    bounds : list
+        Raster bounds (WGS84).
+    minzoom, maxzoom : int
+        Zoom range to explore.
+    sessions : int, optional (default: 10)
+        Number of sessions.
+    steps : int, optional (default: 10)
+        Number of viewport changes per session.
+    width, height : int, optional (default: 1024x768)
+        Viewport size in pixels.
+    tilesize : int, optional (default: 512)
+        Tile size in pixels.
+    color_ops : list, optional
+        rio-color formulas used for playground color edits.
+    seed : int, optional
+        Random seed.
+
+    Returns
+    -------
+    sessions : list
+        For each session, a list of steps; each step is a list of
+        (z, x, y, color) requests.
+
+    """
+    rand = random.Random(seed)
+    out = []
+    for _ in range(sessions):
+        zoom = rand.randint(minzoom, maxzoom)
+        x, y = _lnglat_to_tile(
+            rand.uniform(bounds[0], bounds[2]), rand.uniform(bounds[1], bounds[3]), zoom
+        )
+        color = None
+        session = []
+        for step in range(steps):
+            if step:
+                action = rand.choice(["pan", "pan", "zoom", "color"])
+                if action == "pan":
+                    x += rand.choice([-1, 1]) * width / 2.0 / tilesize
+                    y += rand.choice([-1, 1]) * height / 2.0 / tilesize
+                elif action == "zoom":
+                    new_zoom = min(max(zoom + rand.choice([-1, 1]), minzoom), maxzoom)
+                    x, y = x * 2.0 ** (new_zoom - zoom), y * 2.0 ** (new_zoom - zoom)
+                    zoom = new_zoom
+                elif color_ops:
+                    color = rand.choice(color_ops)
+
+                # Keep the viewport center over the raster
+                minx, maxy = _lnglat_to_tile(bounds[0], bounds[1], zoom)
+                maxx, miny = _lnglat_to_tile(bounds[2], bounds[3], zoom)
+                x = min(max(x, minx), maxx)
+                y = min(max(y, miny), maxy)
+
+            session.append(
+                [
+                    (z, tx, ty, color)
+                    for z, tx, ty in viewport_tiles(
+                        x, y, zoom, width, height, tilesize, bounds=bounds
+                    )
+                ]
+            )
+        out.append(session)
+
+    return out
+
+
+def summarize(results, duration):
+    """
+    Summarize request results.
+
+    Attributes
+    ----------
+    results : list
+        List of (status code, latency in seconds) tuples.
+    duration : float
+        Wall time of the test in seconds.
+
+    Returns
+    -------
+    report : dict
+        requests, errors, error_rate, duration, throughput (req/s) and
+        p50/p95/p99/max latencies (ms).
+
+    """
+    latencies = numpy.array([latency for _, latency in results]) * 1000
+    errors = sum(1 for code, _ in results if code >= 400 or code < 200)
+    report = dict(
+        requests=len(results),
+        errors=errors,
+        error_rate=errors / float(len(results)) if results else 0.0,
+        duration=duration,
+        throughput=len(results) / duration if duration else 0.0,
+    )
+    for name, pc in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]:
+        report[name] = float(numpy.percentile(latencies, pc)) if results else 0.0
+
+    return report
+
+
+@gen.coroutine
+def run_loadtest(tiles_url, sessions, concurrency=4):
+    """
+    Replay sessions against a tile endpoint.
+
+    Attributes
+    ----------
+    tiles_url : str
+        Tiles url template (e.g. http://127.0.0.1:8080/tiles/{z}/{x}/{y}.png).
+    sessions : list
+        Sessions from `generate_sessions`.
+    concurrency : int, optional (default: 4)
+        Number of simultaneous map sessions (users). Each user requests the
+        tiles of its viewport in parallel.
+
+    Returns
+    -------
+    report : dict
+        See `summarize`.
+
+    """
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency * 6)
+    queue = Queue()
+    for session in sessions:
+        queue.put_nowait(session)
+
+    results = []
+
+    @gen.coroutine
+    def fetch(z, x, y, color):
+        url = tiles_url.format(z=z, x=x, y=y)
+        if color:
+            url = "{}?color={}".format(url, url_escape(color, plus=False))
+
+        start = time.time()
+        response = yield client.fetch(url, raise_error=False)
+        results.append((response.code, time.time() - start))
+
+    @gen.coroutine
+    def user():
+        while queue.qsize():
+            session = queue.get_nowait()
+            for step in session:
+                yield [fetch(*request) for request in step]
+            queue.task_done()
+
+    start = time.time()
+    yield [user() for _ in range(concurrency)]
+    duration = time.time() - start
+    client.close()
+
+    raise gen.Return(summarize(results, duration))
@@ -0,0 +1,229 @@
+"""rio_glui.metrics: tile server metrics shared between worker processes."""
+
+import time
+import threading
+import multiprocessing
+from collections import deque, OrderedDict
+
+from tornado import process
+
+FIELDS = ("requests", "errors", "cache_hits", "bytes", "seconds", "http_requests")
+
+
+def worker_id():
+    """Get current worker index (0 when not running multiple processes)."""
+    return process.task_id() or 0
+
+
+class TileMetrics(object):
+    """
+    Tile requests counters.
+
+    Counters live in shared memory, one row per worker. The object must be
+    created before the worker processes are forked so every worker writes to
+    the same array and any of them can report the combined metrics.
+
+    Attributes
+    ----------
+    workers : int, optional (default: 1)
+        Number of worker processes.
+
+    Methods
+    -------
+    record(status, nbytes, seconds, cache_hit=False, http_requests=0)
+        Record a tile request for the current worker.
+    get_worker(worker)
+        Get counters for one worker.
+    summary()
+        Get combined and per-worker counters.
+
+    """
+
+    def __init__(self, workers=1):
+        """Initialize TileMetrics object."""
+        self.workers = workers
+        self._values = multiprocessing.Array("d", workers * len(FIELDS))
+
+    def record(self, status, nbytes, seconds, cache_hit=False, http_requests=0):
+        """Record a tile request for the current worker."""
+        offset = (worker_id() % self.workers) * len(FIELDS)
+        values = (1, status >= 400, cache_hit, nbytes, seconds, http_requests)
+        with self._values.get_lock():
+            for idx, value in enumerate(values):
+                self._values[offset + idx] += value
+
+    def get_worker(self, worker):
+        """Get counters for one worker."""
+        offset = worker * len(FIELDS)
+        with self._values.get_lock():
+            values = self._values[offset : offset + len(FIELDS)]
+        return _summarize(dict(zip(FIELDS, values)))
+
+    def summary(self):
+        """Get combined and per-worker counters."""
+        workers = [self.get_worker(worker) for worker in range(self.workers)]
+        total = _summarize(
+            {field: sum(worker[field] for worker in workers) for field in FIELDS}
+        )
+        return dict(total=total, workers=workers)
+
+
+def _summarize(counters):
+    counters = {
+        field: (value if field == "seconds" else int(value))
+        for field, value in counters.items()
+    }
+    counters["mean_seconds"] = (
+        counters["seconds"] / counters["requests"] if counters["requests"] else 0.0
+    )
+    return counters
+
+
+class StageTimer(object):
+    """
+    Tile stages timer.
+
+    Attributes
+    ----------
+    stages : OrderedDict
+        Seconds spent in each stage, in order.
+
+    Methods
+    -------
+    mark(stage)
+        End a stage (started at the previous mark or timer creation).
+
+    """
+
+    def __init__(self):
+        """Initialize StageTimer object."""
+        self.stages = OrderedDict()
+        self._last = time.time()
+
+    def mark(self, stage):
+        """End a stage (started at the previous mark or timer creation)."""
+        now = time.time()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+class SlowTiles(object):
+    """
+    Ring buffer of recent tile timings.
+
+    The last `size` tiles of the current process are kept, to find the
+    slowest recent tiles with their parameters and stage timings.
+
+    Attributes
+    ----------
+    size : int, optional (default: 1000)
+        Number of recent tiles kept.
+
+    Methods
+    -------
+    record(seconds, **info)
+        Record a tile.
+    slowest(limit=20)
+        Get the slowest recent tiles.
+
+    """
+
+    def __init__(self, size=1000):
+        """Initialize SlowTiles object."""
+        self.size = size
+        self._tiles = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, **info):
+        """Record a tile (request seconds, parameters, stages...)."""
+        info.update(seconds=seconds, time=time.time())
+        with self._lock:
+            self._tiles.append(info)
+
+    def slowest(self, limit=20):
+        """Get the slowest recent tiles."""
+        with self._lock:
+            tiles = list(self._tiles)
+        return sorted(tiles, key=lambda tile: tile["seconds"], reverse=True)[:limit]
+
+
+class LoadMonitor(object):
+    """
+    Tile load monitor switching to degraded rendering under load.
+
+    The monitor counts tiles in flight (submitted to the reader threads and
+    not finished) and keeps the latency of the last `window` tiles. Tiles are
+    degraded when the tiles in flight exceed `max_pending` or the median
+    latency exceeds `max_latency`, and get back to full quality once both are
+    below half their threshold (hysteresis, so the mode does not flap).
+
+    Attributes
+    ----------
+    max_pending : int, optional
+        Tiles in flight above which tiles are degraded.
+    max_latency : float, optional
+        Median tile latency (seconds) above which tiles are degraded.
+    modes : tuple, optional (default: ("overview", "encoder", "color"))
+        Degradations applied: "overview" (read a 2x coarser overview and
+        upsample it), "encoder" (fastest compression) and "color" (skip
+        color operations).
+    window : int, optional (default: 20)
+        Number of recent tiles of the median latency.
+
+    Methods
+    -------
+    submit()
+        Count a new tile in flight and get its degradation modes.
+    done(seconds)
+        Record a finished tile.
+    degraded
+        Whether tiles are currently degraded.
+
+    """
+
+    MODES = ("overview", "encoder", "color")
+
+    def __init__(self, max_pending=None, max_latency=None, modes=MODES, window=20):
+        """Initialize LoadMonitor object."""
+        if any(mode not in self.MODES for mode in modes):
+            raise ValueError("Degradation modes must be in {}".format(self.MODES))
+
+        self.max_pending = max_pending
+        self.max_latency = max_latency
+        self.modes = tuple(modes)
+        self.pending = 0
+        self.degraded = False
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def _latency(self):
+        if not self._latencies:
+            return 0.0
+        latencies = sorted(self._latencies)
+        return latencies[len(latencies) // 2]
+
+    def _update(self):
+        pending, latency = self.pending, self._latency()
+        if not self.degraded:
+            self.degraded = (
+                self.max_pending is not None and pending > self.max_pending
+            ) or (self.max_latency is not None and latency > self.max_latency)
+        else:
+            self.degraded = not (
+                (self.max_pending is None or pending <= self.max_pending / 2.0)
+                and (self.max_latency is None or latency <= self.max_latency / 2.0)
+            )
+
+    def submit(self):
+        """Count a new tile in flight and get its degradation modes."""
+        with self._lock:
+            self.pending += 1
+            self._update()
+            return self.modes if self.degraded else ()
+
+    def done(self, seconds):
+        """Record a finished tile."""
+        with self._lock:
+            self.pending -= 1
+            self._latencies.append(seconds)
+            self._update()
@@ -0,0 +1,494 @@
+"""rio_glui.mosaic: mosaic tiles object."""
+
+import json
+import hashlib
+import logging
+import threading
+from bisect import bisect_left
+from itertools import islice
+from collections import deque
+from concurrent import futures
+
+import numpy
+
+import mercantile
+from rasterio import windows
+
+from rio_glui.env import GDAL_ENV
+from rio_glui.raster import RasterTiles
+
+logger = logging.getLogger(__name__)
+
+
+def _intersects(bounds, other):
+    return (
+        bounds[0] < other[2]
+        and bounds[2] > other[0]
+        and bounds[1] < other[3]
+        and bounds[3] > other[1]
+    )
+
+
+class MosaicTiles(object):
+    """
+    Mosaic tiles object.
+
+    Serves many Cloud Optimized GeoTIFFs as one seamless tile layer, with the
+    `RasterTiles` interface. Source footprints are indexed by quadkey, so a
+    tile only reads the sources it intersects. Sources are read in parallel
+    and composited in priority order (first listed first): each pixel comes
+    from the first source with valid data, and no more sources are read once
+    the tile mask is full.
+
+    Attributes
+    ----------
+    src_paths : list
+        Dataset paths or URLs, by decreasing priority. All datasets must have
+        the same data type and band indexes.
+    indexes : tuple, int, optional
+        Raster band indexes to read.
+    tiles_size: int, optional (default: 512)
+        X/Y tile size to return.
+    nodata: int, optional
+        nodata value for mask creation.
+    env: dict, optional
+        GDAL configuration options (default: `rio_glui.env.GDAL_ENV`), shared
+        by all sources.
+    max_workers: int, optional (default: 4)
+        Number of sources read in parallel for a tile.
+    readers: int, optional (default: 16)
+        Number of tiles read at once (e.g. the tile server reader threads,
+        set by `TileServer`). Sources are read by `max_workers * readers`
+        threads, so concurrent tiles do not wait for each other's reads.
+    index_zoom: int, optional
+        Zoom level of the quadkey index (default: the lowest source min
+        zoom).
+
+    Methods
+    -------
+    get_bounds()
+        Get mosaic bounds (WGS84).
+    get_center()
+        Get mosaic lon/lat center coordinates.
+    tile_exists(z, x, y)
+        Check if a mercator tile intersects a source.
+    get_max_zoom(snap=0.5, max_z=23)
+        Calculate mosaic max zoom level.
+    get_min_zoom(snap=0.5, max_z=23)
+        Calculate mosaic min zoom level.
+    get_sources(z, x, y)
+        Get the sources intersecting a mercator tile, by priority.
+    read_tile(z, x, y, tilesize=None, out=None, indexes=None)
+        Read mosaic tile data and mask.
+    read_bbox(bounds, width, height, window=None, indexes=None)
+        Read a Web Mercator image of an extent.
+    sample(coords, coords_crs="epsg:4326")
+        Read mosaic values and mask at points.
+    get_stats(percentiles=(2, 98), bins=1000)
+        Get per-band statistics merged from all sources.
+    get_source_id()
+        Get mosaic identity (from the source identities).
+    add_listener(callback, blocks=True)
+        Call `callback(source, bounds)` when a source changes.
+    remove_listener(callback)
+        Stop calling `callback` on source changes.
+    close()
+        Close sources dataset handles and reader threads.
+
+    """
+
+    def __init__(
+        self,
+        src_paths,
+        indexes=None,
+        tiles_size=512,
+        nodata=None,
+        env=None,
+        max_workers=4,
+        index_zoom=None,
+        readers=16,
+    ):
+        """Initialize MosaicTiles object."""
+        if not src_paths:
+            raise Exception("Mosaic requires at least one dataset")
+
+        self.paths = list(src_paths)
+        self.tiles_size = tiles_size
+        self.env = env if env is not None else dict(GDAL_ENV)
+        self.max_workers = max_workers
+        self.readers = readers
+        self.sources = [
+            RasterTiles(
+                path,
+                indexes=indexes,
+                tiles_size=tiles_size,
+                nodata=nodata,
+                env=self.env,
+            )
+            for path in self.paths
+        ]
+
+        first = self.sources[0]
+        for src in self.sources[1:]:
+            if src.meta["dtype"] != first.meta["dtype"] or list(src.indexes) != list(
+                first.indexes
+            ):
+                raise Exception(
+                    "{} data type or band indexes differ from {}".format(
+                        src.path, first.path
+                    )
+                )
+
+        self.indexes = first.indexes
+        self.nodata = first.nodata
+        self.meta = first.meta
+        self.index_zoom = (
+            index_zoom
+            if index_zoom is not None
+            else min(src.get_min_zoom() for src in self.sources)
+        )
+        self._build_index()
+
+        # NOTE: The mosaic identity does not change with its sources, changes
+        # are reported to listeners by extent
+        ids = [src.get_source_id() for src in self.sources]
+        self._source_id = self._base_id = "mosaic:{}".format(
+            hashlib.sha1(json.dumps(ids).encode("utf-8")).hexdigest()
+        )
+        self._listeners = []
+        for src in self.sources:
+            src.add_listener(self._on_source_change, blocks=False)
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _build_index(self):
+        self.bounds = [
+            min(src.bounds[0] for src in self.sources),
+            min(src.bounds[1] for src in self.sources),
+            max(src.bounds[2] for src in self.sources),
+            max(src.bounds[3] for src in self.sources),
+        ]
+        index = {}
+        for idx, src in enumerate(self.sources):
+            for tile in mercantile.tiles(*src.bounds, zooms=self.index_zoom):
+                index.setdefault(mercantile.quadkey(tile), []).append(idx)
+        self._index = index
+        self._keys = sorted(index)
+
+    def _on_source_change(self, source, bounds):
+        self._build_index()
+        self._stats = {}
+        failed = False
+        for callback in list(self._listeners):
+            try:
+                callback(self._source_id, bounds)
+            except Exception:
+                logger.exception("Source change listener failed")
+                failed = True
+
+        # NOTE: Same as `RasterTiles.check_source`, cached tiles may not have
+        # been dropped
+        if failed:
+            self._source_id = "{}:{}".format(self._base_id, self.generation)
+
+    @property
+    def generation(self):
+        """Number of source changes detected."""
+        return sum(src.generation for src in self.sources)
+
+    def get_bounds(self):
+        """Get mosaic bounds (WGS84)."""
+        return self.bounds
+
+    def get_center(self):
+        """Get mosaic lon/lat center coordinates."""
+        lat = (self.bounds[3] - self.bounds[1]) / 2 + self.bounds[1]
+        lng = (self.bounds[2] - self.bounds[0]) / 2 + self.bounds[0]
+        return [lng, lat]
+
+    def get_sources(self, z, x, y):
+        """Get the sources intersecting a mercator tile, by priority."""
+        quadkey = mercantile.quadkey(mercantile.Tile(x=x, y=y, z=z))
+        if z >= self.index_zoom:
+            candidates = self._index.get(quadkey[: self.index_zoom], [])
+        else:
+            # NOTE: Child quadkeys sort between the tile quadkey and the
+            # quadkey followed by "4" (after the last "0"-"3" digit)
+            keys = self._keys[
+                bisect_left(self._keys, quadkey) : bisect_left(
+                    self._keys, quadkey + "4"
+                )
+            ]
+            candidates = sorted(set(idx for key in keys for idx in self._index[key]))
+
+        bounds = mercantile.bounds(x, y, z)
+        return [
+            self.sources[idx]
+            for idx in candidates
+            if _intersects(bounds, self.sources[idx].bounds)
+        ]
+
+    def tile_exists(self, z, x, y):
+        """Check if a mercator tile intersects a source."""
+        return bool(self.get_sources(z, x, y))
+
+    def get_max_zoom(self, snap=0.5, max_z=23):
+        """Calculate mosaic max zoom level."""
+        return max(src.get_max_zoom(snap=snap, max_z=max_z) for src in self.sources)
+
+    def get_min_zoom(self, snap=0.5, max_z=23):
+        """Calculate mosaic min zoom level."""
+        return min(src.get_min_zoom(snap=snap, max_z=max_z) for src in self.sources)
+
+    def get_source_id(self):
+        """Get mosaic identity (from the source identities)."""
+        for src in self.sources:
+            src.get_source_id()
+        return self._source_id
+
+    def add_listener(self, callback, blocks=True):
+        """
+        Call `callback(source, bounds)` when a source changes.
+
+        Changes are located to blocks (see `RasterTiles.add_listener`) unless
+        `blocks` is False.
+
+        """
+        if blocks:
+            for src in self.sources:
+                src._track_blocks()
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Stop calling `callback` on source changes."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers * self.readers
+                )
+            return self._executor
+
+    def read_tile(self, z, x, y, tilesize=None, out=None, indexes=None):
+        """
+        Read mosaic tile data and mask.
+
+        Intersecting sources are read (up to `max_workers` at a time) in
+        priority order and only fill pixels still masked by higher priority
+        sources. Remaining reads are skipped once every pixel is valid.
+
+        Attributes
+        ----------
+        z, x, y : int
+            Mercator tile index.
+        tilesize : int, optional
+            Output tile size (default: `tiles_size`).
+        out : numpy ndarray, optional
+            (bands, tilesize, tilesize) array of the mosaic data type to
+            composite data into.
+        indexes : list, optional
+            Band indexes to read instead of `indexes`.
+
+        Returns
+        -------
+        data : numpy ndarray
+        mask : numpy ndarray
+
+        """
+        tilesize = tilesize or self.tiles_size
+        indexes = indexes if indexes is not None else self.indexes
+        nbands = 1 if isinstance(indexes, int) else len(indexes)
+        if out is None:
+            out = numpy.zeros((nbands, tilesize, tilesize), dtype=self.meta["dtype"])
+        else:
+            out[...] = 0
+        mask = numpy.zeros((tilesize, tilesize), dtype=numpy.uint8)
+
+        sources = iter(self.get_sources(z, x, y))
+        executor = self._get_executor()
+        pending = deque(
+            executor.submit(src.read_tile, z, x, y, tilesize, indexes=indexes)
+            for src in islice(sources, self.max_workers)
+        )
+        try:
+            while pending:
+                data, src_mask = pending.popleft().result()
+                fill = (mask == 0) & (src_mask != 0)
+                numpy.copyto(out, data, where=fill)
+                mask[fill] = 255
+                if mask.all():
+                    break
+
+                for src in islice(sources, 1):
+                    pending.append(
+                        executor.submit(
+                            src.read_tile, z, x, y, tilesize, indexes=indexes
+                        )
+                    )
+        finally:
+            for future in pending:
+                future.cancel()
+
+        return out, mask
+
+    def read_bbox(self, bounds, width, height, window=None, indexes=None):
+        """
+        Read a Web Mercator image of an extent.
+
+        Intersecting sources are read (see `RasterTiles.read_bbox`) in
+        priority order until every pixel is valid.
+
+        Attributes
+        ----------
+        bounds : list
+            (west, south, east, north) WGS84 bounds.
+        width, height : int
+            Output image size.
+        window : rasterio.windows.Window, optional
+            Part of the output image to read (default: all).
+        indexes : list, optional
+            Band indexes to read instead of `indexes`.
+
+        Returns
+        -------
+        data : numpy ndarray
+        mask : numpy ndarray
+
+        """
+        window = window or windows.Window(0, 0, width, height)
+        indexes = indexes if indexes is not None else self.indexes
+        nbands = 1 if isinstance(indexes, int) else len(indexes)
+        shape = (int(window.height), int(window.width))
+        out = numpy.zeros((nbands,) + shape, dtype=self.meta["dtype"])
+        mask = numpy.zeros(shape, dtype=numpy.uint8)
+        for src in self.sources:
+            if not _intersects(bounds, src.bounds):
+                continue
+
+            data, src_mask = src.read_bbox(
+                bounds, width, height, window=window, indexes=indexes
+            )
+            fill = (mask == 0) & (src_mask != 0)
+            numpy.copyto(out, data, where=fill)
+            mask[fill] = 255
+            if mask.all():
+                break
+
+        return out, mask
+
+    def sample(self, coords, coords_crs="epsg:4326"):
+        """
+        Read mosaic values and mask at points.
+
+        Sources are sampled in priority order (see `RasterTiles.sample`),
+        each for the points still without a valid value.
+
+        Attributes
+        ----------
+        coords : sequence
+            (x, y) points (e.g. [(lon, lat), ...]).
+        coords_crs : str or CRS, optional (default: "epsg:4326")
+            Points coordinate reference system.
+
+        Returns
+        -------
+        data : numpy ndarray
+            (bands, points) array of the `indexes` values.
+        mask : numpy ndarray
+            (points,) boolean array, True for valid values.
+
+        """
+        coords = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 2)
+        data = numpy.zeros((len(self.indexes), len(coords)), dtype=self.meta["dtype"])
+        mask = numpy.zeros(len(coords), dtype=bool)
+        for src in self.sources:
+            points = numpy.flatnonzero(~mask)
+            if not points.size:
+                break
+
+            src_data, src_mask = src.sample(coords[points], coords_crs=coords_crs)
+            data[:, points[src_mask]] = src_data[:, src_mask]
+            mask[points[src_mask]] = True
+
+        return data, mask
+
+    def get_stats(self, percentiles=(2, 98), bins=1000):
+        """
+        Get per-band statistics merged from all sources.
+
+        Source histograms (see `RasterTiles.get_stats`) are re-binned on
+        common edges to estimate the mosaic percentiles.
+
+        Attributes
+        ----------
+        percentiles : tuple, optional (default: (2, 98))
+            Min/Max percentiles to compute.
+        bins : int, optional (default: 1000)
+            Maximum number of histogram bins used to estimate percentiles.
+
+        Returns
+        -------
+        stats : dict
+            Statistics per band index (pc, min, max, std, histogram).
+
+        """
+        cache_id = json.dumps([list(percentiles), bins])
+        if cache_id in self._stats:
+            return self._stats[cache_id]
+
+        sources = [
+            src.get_stats(percentiles=percentiles, bins=bins) for src in self.sources
+        ]
+
+        stats = {}
+        for band in self.indexes:
+            band_stats = [s[band] for s in sources if s[band]["histogram"]]
+            if not band_stats:
+                stats[band] = dict(
+                    pc=None, min=None, max=None, std=None, histogram=None
+                )
+                continue
+
+            vmin = min(s["min"] for s in band_stats)
+            vmax = max(s["max"] for s in band_stats)
+            edges = numpy.linspace(vmin, max(vmax, vmin + 1e-6), bins + 1)
+            hist = numpy.zeros(bins)
+            for s in band_stats:
+                counts, src_edges = map(numpy.asarray, s["histogram"])
+                centers = (src_edges[:-1] + src_edges[1:]) / 2
+                hist += numpy.histogram(centers, bins=edges, weights=counts)[0]
+
+            count = hist.sum()
+            cdf = numpy.cumsum(hist) / count
+            pc = [
+                float(numpy.interp(p / 100.0, numpy.insert(cdf, 0, 0), edges))
+                for p in percentiles
+            ]
+            centers = (edges[:-1] + edges[1:]) / 2
+            mean = (hist * centers).sum() / count
+            std = numpy.sqrt(max((hist * centers ** 2).sum() / count - mean ** 2, 0))
+            stats[band] = dict(
+                pc=pc,
+                min=float(vmin),
+                max=float(vmax),
+                std=float(std),
+                histogram=[hist.astype(int).tolist(), edges.tolist()],
+            )
+
+        self._stats[cache_id] = stats
+        return stats
+
+    def close(self):
+        """Close sources dataset handles and reader threads."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        for src in self.sources:
+            src.close()
@@ -0,0 +1,143 @@
+"""rio_glui.profiler: sampling profiler of running threads."""
+
+import os
+import sys
+import threading
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return "{} ({}:{})".format(
+        code.co_name, os.path.basename(code.co_filename), frame.f_lineno
+    )
+
+
+def _function_label(label):
+    """Remove the line number of a frame label."""
+    name, _, location = label.rpartition(" (")
+    return "{} ({})".format(name, location.rsplit(":", 1)[0])
+
+
+class SamplingProfiler(object):
+    """
+    Sampling profiler of running threads.
+
+    A background thread records the Python stacks of the profiled threads
+    (`sys._current_frames`) every `interval` seconds. The profiled code runs
+    unmodified (no tracing hooks), so a live server can be profiled with a
+    low overhead.
+
+    Attributes
+    ----------
+    threads : callable, optional
+        Get the idents of the threads to profile (default: all threads but
+        the profiler). Called for each sample, so new threads are included.
+    interval : float, optional (default: 0.005)
+        Seconds between samples.
+
+    Methods
+    -------
+    start()
+        Start sampling.
+    stop()
+        Stop sampling.
+    collapsed()
+        Get stacks in collapsed format.
+    top(limit=40)
+        Get the functions with the most samples.
+
+    """
+
+    def __init__(self, threads=None, interval=0.005):
+        """Initialize SamplingProfiler object."""
+        self.threads = threads
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling."""
+        self._thread = threading.Thread(target=self._run, name="rio-glui-profiler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.current_thread().ident
+        while not self._stop.wait(self.interval):
+            idents = self.threads() if self.threads else None
+            names = dict((t.ident, t.name) for t in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (idents is not None and ident not in idents):
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """
+        Get stacks in collapsed format.
+
+        One line per stack (`thread;outer (file:line);...;inner (file:line)
+        count`), the input of flame graph tools (e.g. flamegraph.pl or
+        speedscope).
+
+        """
+        return "".join(
+            "{} {}\n".format(stack, count)
+            for stack, count in sorted(self.stacks.items())
+        )
+
+    def top(self, limit=40):
+        """
+        Get the functions with the most samples.
+
+        Functions are listed by number of samples spent in the function itself
+        ("self") and in the function or its callees ("total"), like `pstats`
+        cumulative and internal times.
+
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = [_function_label(frame) for frame in stack.split(";")[1:]]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        nstacks = sum(self.stacks.values()) or 1
+        lines = [
+            "{} samples ({:g} ms interval), {} stacks".format(
+                self.samples, self.interval * 1000, nstacks
+            ),
+            "",
+            "{:>8} {:>7} {:>8} {:>7}  function".format(
+                "self", "self%", "total", "total%"
+            ),
+        ]
+        for frame, count in total.most_common(limit):
+            lines.append(
+                "{:>8} {:>6.1f}% {:>8} {:>6.1f}%  {}".format(
+                    own[frame],
+                    100.0 * own[frame] / nstacks,
+                    count,
+                    100.0 * count / nstacks,
+                    frame,
+                )
+            )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,90 @@
+"""rio_glui.pyramid: derive tiles from cached tiles."""
+
+import numpy
+
+
+def downsample(data, mask, factor):
+    """
+    Downsample tile data and mask by an integer factor.
+
+    Each output pixel is the mean of the valid pixels of its `factor` x
+    `factor` input block, and is valid when at least one of them is.
+
+    Attributes
+    ----------
+    data : numpy ndarray
+        Tile data (bands, height, width).
+    mask : numpy ndarray
+        Tile mask (0: nodata).
+    factor : int
+        Downsampling factor.
+
+    Returns
+    -------
+    data : numpy ndarray
+    mask : numpy ndarray
+
+    """
+    bands, height, width = data.shape
+    if height % factor or width % factor:
+        raise ValueError("Tile size must be a multiple of the factor")
+
+    height, width = height // factor, width // factor
+
+    valid = (mask != 0).reshape(height, factor, width, factor)
+    count = valid.sum(axis=(1, 3))
+    blocks = data.reshape(bands, height, factor, width, factor)
+    total = numpy.where(valid, blocks, 0).sum(axis=(2, 4), dtype=numpy.float64)
+    out = total / numpy.maximum(count, 1)
+
+    if numpy.issubdtype(data.dtype, numpy.integer):
+        numpy.rint(out, out=out)
+
+    out_mask = numpy.where(count > 0, 255, 0).astype(numpy.uint8)
+    return out.astype(data.dtype), out_mask
+
+
+def children(z, x, y):
+    """Get the four (z + 1) children of a tile (row major order)."""
+    return [
+        (z + 1, 2 * x + dx, 2 * y + dy) for dy, dx in [(0, 0), (0, 1), (1, 0), (1, 1)]
+    ]
+
+
+def merge_children(tiles):
+    """
+    Build a parent tile from its four children.
+
+    Each child is downsampled by 2 (see `downsample`) into its quadrant of
+    the parent tile, which has the same (even) size as the children.
+
+    Attributes
+    ----------
+    tiles : list
+        (data, mask) tuples of the children, in `children` order.
+
+    Returns
+    -------
+    data : numpy ndarray
+    mask : numpy ndarray
+
+    """
+    bands, height, width = tiles[0][0].shape
+    if height % 2 or width % 2:
+        raise ValueError("Children tile size must be even")
+
+    data = numpy.empty((bands, height, width), dtype=tiles[0][0].dtype)
+    mask = numpy.empty((height, width), dtype=numpy.uint8)
+
+    half_h, half_w = height // 2, width // 2
+    for idx, (child_data, child_mask) in enumerate(tiles):
+        row, col = divmod(idx, 2)
+        window = (
+            slice(row * half_h, (row + 1) * half_h),
+            slice(col * half_w, (col + 1) * half_w),
+        )
+        data[(slice(None),) + window], mask[window] = downsample(
+            child_data, child_mask, 2
+        )
+
+    return data, mask
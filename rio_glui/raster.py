@@ -1,18 +1,135 @@
 """rio_glui.raster: raster tiles object."""
 
+import os
+import json
 import math
+import logging
+import itertools
+import weakref
+import threading
+from collections import OrderedDict
+
+import numpy
 
 import mercantile
 import rasterio
-from rasterio.warp import transform_bounds, calculate_default_transform
+from affine import Affine
+from rasterio import windows
+from rasterio.crs import CRS
+from rasterio.vrt import WarpedVRT
+from rasterio.enums import Resampling, Interleaving
+from rasterio.transform import from_bounds
+from rasterio.env import hasenv, defenv
+from rasterio.warp import transform, transform_bounds, calculate_default_transform
+
+from rio_tiler.utils import (
+    tile_read,
+    get_vrt_transform,
+    has_alpha_band,
+    _requested_tile_aligned_with_internal_tile,
+)
+
+from rio_glui.env import GDAL_ENV
+
+logger = logging.getLogger(__name__)
+
+# Maximum open dataset handles of the process (of all threads and RasterTiles
+# objects). Threads opening a handle above it close their own least recently
+# used handles, so at most `MAX_DATASETS` + threads handles are open
+MAX_DATASETS = 256
+
+_handles = threading.local()
+_all_handles = weakref.WeakValueDictionary()
+_handles_lock = threading.Lock()
+_uids = itertools.count()
+
+
+class _Handles(OrderedDict):
+    """Dataset handles of a thread, in LRU order."""
+
+
+def _thread_handles():
+    """Get the dataset handles of the current thread (and process), in LRU order."""
+    pid = os.getpid()
+    if getattr(_handles, "pid", None) != pid:
+        _handles.datasets = _Handles()
+        _handles.datasets.pid = pid
+        _handles.pid = pid
+        with _handles_lock:
+            _all_handles[id(_handles.datasets)] = _handles.datasets
+    return _handles.datasets
 
-from rio_tiler.utils import tile_read
+
+def _open_handles():
+    """Get the number of dataset handles of all threads of the process."""
+    pid = os.getpid()
+    with _handles_lock:
+        return sum(len(h) for h in list(_all_handles.values()) if h.pid == pid)
 
 
 def _meters_per_pixel(zoom, lat):
     return (math.cos(lat * math.pi / 180.0) * 2 * math.pi * 6378137) / (256 * 2 ** zoom)
 
 
+def _max_zoom(resolution, snap=0.5, max_z=23):
+    """Get the zoom level of a (Web Mercator meters) resolution."""
+    tgt_z = max_z
+    mpp = 0.0
+
+    # loop through the pyramid to file the closest z level
+    for z in range(1, max_z):
+        mpp = _meters_per_pixel(z, 0)
+
+        if (mpp - ((mpp / 2) * snap)) < resolution:
+            tgt_z = z
+            break
+
+    return tgt_z
+
+
+def _min_zoom(resolution, max_decimation, snap=0.5):
+    """Get the zoom level of the coarsest overview of a resolution."""
+    resolution = max_decimation * resolution
+
+    tgt_z = 0
+    mpp = 0.0
+
+    # loop through the pyramid to file the closest z level
+    for z in list(range(0, 24))[::-1]:
+        mpp = _meters_per_pixel(z, 0)
+        tgt_z = z
+
+        if (mpp - ((mpp / 2) * snap)) > resolution:
+            break
+
+    return tgt_z
+
+
+def _block_index(src):
+    """
+    Get the offset and byte size of each internal block (TIFF tags).
+
+    Returns an int64 array (bands, rows, cols, 2), with a single band for
+    pixel interleaved blocks (holding all bands). Sparse blocks are zeros.
+
+    """
+    block_height, block_width = src.block_shapes[0]
+    rows = int(math.ceil(src.height / float(block_height)))
+    cols = int(math.ceil(src.width / float(block_width)))
+    # NOTE: Pixel interleaved blocks hold all bands
+    bands = [1] if src.interleaving == Interleaving.pixel else src.indexes
+    blocks = numpy.zeros((len(bands), rows, cols, 2), dtype=numpy.int64)
+    for bdx, band in enumerate(bands):
+        for row in range(rows):
+            for col in range(cols):
+                for idx, item in enumerate(["BLOCK_OFFSET", "BLOCK_SIZE"]):
+                    value = src.get_tag_item(
+                        "{}_{}_{}".format(item, col, row), "TIFF", bidx=band
+                    )
+                    blocks[bdx, row, col, idx] = int(value or 0)
+    return blocks
+
+
 class RasterTiles(object):
     """
     Raster tiles object.
@@ -27,6 +144,10 @@ class RasterTiles(object):
         X/Y tile size to return.
     nodata: int, optional
         nodata value for mask creation.
+    env: dict, optional
+        GDAL configuration options (default: `rio_glui.env.GDAL_ENV`).
+    generation: int
+        Number of source changes detected (see `check_source`).
 
     Methods
     -------
@@ -40,23 +161,55 @@ class RasterTiles(object):
         Calculate raster max zoom level.
     get_min_zoom(snap=0.5, max_z=23)
         Calculate raster min zoom level.
-    read_tile( z, x, y)
+    read_tile(z, x, y, tilesize=None, out=None, indexes=None)
         Read raster tile data and mask.
+    read_bbox(bounds, width, height, window=None, indexes=None)
+        Read a Web Mercator image of an extent.
+    sample(coords, coords_crs="epsg:4326")
+        Read raster values and mask at points.
+    get_stats(percentiles=(2, 98), bins=1000)
+        Get per-band statistics from the coarsest overview.
+    get_source_id()
+        Get source identity (path, mtime and size).
+    check_source()
+        Reload the source if the file changed.
+    add_listener(callback, blocks=True)
+        Call `callback(source, bounds)` when the source changes.
+    remove_listener(callback)
+        Stop calling `callback` on source changes.
+    close()
+        Close dataset handles.
 
     """
 
-    def __init__(self, src_path, indexes=None, tiles_size=512, nodata=None):
+    def __init__(self, src_path, indexes=None, tiles_size=512, nodata=None, env=None):
         """Initialize RasterTiles object."""
         self.path = src_path
         self.tiles_size = tiles_size
-        with rasterio.open(src_path) as src:
+        self.env = env if env is not None else dict(GDAL_ENV)
+        self._uid = next(_uids)
+        self._datasets = []
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._listeners = []
+        self._blocks = False
+        self._options = dict(indexes=indexes, nodata=nodata)
+        self.generation = 0
+        self._stat = self._get_stat()
+        self._fingerprint = self._load_metadata()
+        self._source_id = self._make_source_id()
+        self._stats = {}
+
+    def _load_metadata(self):
+        """Read the raster metadata and get its blocks fingerprint."""
+        with rasterio.Env(**self.env), rasterio.open(self.path) as src:
             try:
                 assert src.driver == "GTiff"
                 assert src.is_tiled
                 assert src.overviews(1)
             except (AttributeError, AssertionError, KeyError):
                 raise Exception(
-                    "{} is not a valid CloudOptimized Geotiff".format(src_path)
+                    "{} is not a valid CloudOptimized Geotiff".format(self.path)
                 )
 
             self.bounds = list(
@@ -64,12 +217,16 @@ class RasterTiles(object):
                     *[src.crs, "epsg:4326"] + list(src.bounds), densify_pts=21
                 )
             )
+            indexes, nodata = self._options["indexes"], self._options["nodata"]
             self.indexes = indexes if indexes is not None else src.indexes
             self.nodata = nodata if nodata is not None else src.nodata
             self.crs = src.crs
             self.crs_bounds = src.bounds
             self.meta = src.meta
             self.overiew_levels = src.overviews(1)
+            self._resolution = None
+
+            return self._get_fingerprint(src)
 
     def get_bounds(self):
         """Get raster bounds (WGS84)."""
@@ -103,19 +260,7 @@ class RasterTiles(object):
         )
 
         res_max = max(abs(dst_affine[0]), abs(dst_affine[4]))
-
-        tgt_z = max_z
-        mpp = 0.0
-
-        # loop through the pyramid to file the closest z level
-        for z in range(1, max_z):
-            mpp = _meters_per_pixel(z, 0)
-
-            if (mpp - ((mpp / 2) * snap)) < res_max:
-                tgt_z = z
-                break
-
-        return tgt_z
+        return _max_zoom(res_max, snap=snap, max_z=max_z)
 
     def get_min_zoom(self, snap=0.5, max_z=23):
         """Calculate raster min zoom level."""
@@ -128,30 +273,653 @@ class RasterTiles(object):
         )
 
         res_max = max(abs(dst_affine[0]), abs(dst_affine[4]))
-        max_decim = self.overiew_levels[-1]
-        resolution = max_decim * res_max
+        return _min_zoom(res_max, self.overiew_levels[-1], snap=snap)
 
-        tgt_z = 0
-        mpp = 0.0
+    def get_source_id(self):
+        """
+        Get source identity (path, mtime and size).
 
-        # loop through the pyramid to file the closest z level
-        for z in list(range(0, 24))[::-1]:
-            mpp = _meters_per_pixel(z, 0)
-            tgt_z = z
+        The identity only changes when a source change cannot be located to
+        blocks (see `check_source`), so cached tiles of unchanged blocks stay
+        valid.
+
+        """
+        self._watch()
+        return self._source_id
 
-            if (mpp - ((mpp / 2) * snap)) > resolution:
-                break
+    def _get_stat(self):
+        if not os.path.isfile(self.path):
+            return None
+        stat = os.stat(self.path)
+        return stat.st_mtime, stat.st_size, stat.st_ino
 
-        return tgt_z
+    def _make_source_id(self):
+        if self._stat is None:
+            return self.path
+        return "{}:{}:{}".format(os.path.abspath(self.path), *self._stat[:2])
 
-    def read_tile(self, z, x, y):
-        """Read raster tile data and mask."""
+    def _get_fingerprint(self, src):
+        """Get the raster grid and full resolution blocks (offset, size) for local files."""
+        # NOTE: Reading the block index reads the TIFF tags of every block, it
+        # is only done when a listener locates changes to blocks
+        if self._stat is None or not self._blocks:
+            return None
+
+        blocks = _block_index(src)
+        block_height, block_width = src.block_shapes[0]
+        grid = [src.width, src.height, block_width, block_height, src.count]
+        grid += [src.dtypes[0], src.crs.to_string() if src.crs else None]
+        grid += list(src.transform)[:6]
+        return dict(grid=grid, blocks=blocks)
+
+    def _get_changed_bounds(self, old, new):
+        """Get the WGS84 bounds of changed blocks (None if not comparable)."""
+        if old is None or new is None or old["grid"] != new["grid"]:
+            return None
+
+        changed = (old["blocks"] != new["blocks"]).any(axis=(0, 3))
+        if not changed.any():
+            return None
+
+        block_width, block_height = new["grid"][2:4]
+        bounds = []
+        for row in range(changed.shape[0]):
+            cols = numpy.flatnonzero(changed[row])
+            # NOTE: One extent per run of consecutive changed blocks
+            runs = numpy.split(cols, numpy.flatnonzero(numpy.diff(cols) > 1) + 1)
+            for run in runs:
+                if not run.size:
+                    continue
+                window = windows.Window(
+                    run[0] * block_width,
+                    row * block_height,
+                    (run[-1] - run[0] + 1) * block_width,
+                    block_height,
+                )
+                bounds.append(
+                    list(
+                        transform_bounds(
+                            self.crs,
+                            "epsg:4326",
+                            *windows.bounds(window, self.meta["transform"]),
+                            densify_pts=21
+                        )
+                    )
+                )
+        return bounds
+
+    def _watch(self):
+        if self._get_stat() != self._stat:
+            self.check_source()
+
+    def check_source(self):
+        """
+        Reload the source if the file changed.
+
+        Local files are checked by mtime, size and inode (remote datasets are
+        not watched). On change, metadata is reloaded, dataset handles are
+        reopened and the full resolution blocks (offset and size in the TIFF
+        headers) are compared to locate the change. When no block changed
+        (e.g. blocks rewritten in place) or the raster grid changed, the whole
+        raster is considered changed and the source identity is updated.
+        Listeners are called with the previous source identity and the changed
+        WGS84 bounds, and the source identity is updated if a listener fails.
+        Sources are checked on each read and `get_source_id`.
+
+        Returns
+        -------
+        changed : bool
+
+        """
+        with self._check_lock:
+            stat = self._get_stat()
+            if stat is None or stat == self._stat:
+                return False
+
+            source, old_bounds = self._source_id, self.bounds
+            try:
+                fingerprint = self._load_metadata()
+            except Exception:
+                # NOTE: e.g. a file being written, checked again on next read
+                logger.warning("Could not reload {}".format(self.path))
+                return False
+
+            self._stat = stat
+            bounds = self._get_changed_bounds(self._fingerprint, fingerprint)
+            if bounds is None:
+                bounds = [old_bounds, self.bounds]
+                self._source_id = self._make_source_id()
+            self._fingerprint = fingerprint
+            self.generation += 1
+
+        logger.info("{} changed ({} extents)".format(self.path, len(bounds)))
+        failed = False
+        for callback in list(self._listeners):
+            try:
+                callback(source, bounds)
+            except Exception:
+                logger.exception("Source change listener failed")
+                failed = True
+
+        # NOTE: Cached tiles of the change may not have been dropped (e.g. a
+        # locked tile cache), a new identity makes all of them unreachable
+        if failed:
+            with self._check_lock:
+                self._source_id = "{}:{}".format(
+                    self._make_source_id(), self.generation
+                )
+
+        return True
+
+    def add_listener(self, callback, blocks=True):
+        """
+        Call `callback(source, bounds)` when the source changes.
+
+        `source` is the source identity before the change and `bounds` a list
+        of changed (west, south, east, north) WGS84 extents.
+
+        Attributes
+        ----------
+        callback : callable
+        blocks : bool, optional (default: True)
+            Locate changes to blocks (the full resolution block index is read
+            when the first such listener is added). Otherwise `bounds` are the
+            raster extent before and after the change, unless another listener
+            locates blocks.
+
+        """
+        if blocks:
+            self._track_blocks()
+        self._listeners.append(callback)
+
+    def _track_blocks(self):
+        """Read the block index of local files, to locate source changes."""
+        with self._check_lock:
+            if self._blocks:
+                return
+
+            self._blocks = True
+            if self._stat is not None:
+                with rasterio.Env(**self.env), rasterio.open(self.path) as src:
+                    self._fingerprint = self._get_fingerprint(src)
+
+    def remove_listener(self, callback):
+        """Stop calling `callback` on source changes."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def read_tile(self, z, x, y, tilesize=None, out=None, indexes=None):
+        """
+        Read raster tile data and mask.
+
+        Attributes
+        ----------
+        z, x, y : int
+            Mercator tile index.
+        tilesize : int, optional
+            Output tile size (default: `tiles_size`).
+        out : numpy ndarray, optional
+            (bands, tilesize, tilesize) array of the raster data type to
+            read data into (e.g. a `rio_glui.buffers.arena` buffer). Custom
+            readers may ignore it and return a new array.
+        indexes : list, optional
+            Band indexes to read instead of `indexes` (e.g. the bands of a
+            band math expression).
+
+        Returns
+        -------
+        data : numpy ndarray
+        mask : numpy ndarray
+
+        """
         mercator_tile = mercantile.Tile(x=x, y=y, z=z)
         tile_bounds = mercantile.xy_bounds(mercator_tile)
-        return tile_read(
-            self.path,
-            tile_bounds,
-            self.tiles_size,
-            indexes=self.indexes,
-            nodata=self.nodata,
+        tilesize = tilesize or self.tiles_size
+        indexes = indexes if indexes is not None else self.indexes
+        # NOTE: Keep a default GDAL environment in reader threads, so entering
+        # the options context does not set up (and tear down) GDAL every tile
+        if not hasenv():
+            defenv()
+
+        with rasterio.Env(**self.env):
+            src_dst = self._get_dataset()
+            if out is None:
+                return tile_read(
+                    src_dst,
+                    tile_bounds,
+                    tilesize,
+                    indexes=indexes,
+                    nodata=self.nodata,
+                )
+
+            return self._read_into(src_dst, tile_bounds, tilesize, out, indexes)
+
+    def _get_overview_level(self, bounds, width):
+        """Get the coarsest overview level finer than the output resolution."""
+        if self._resolution is None:
+            dst_affine, _, _ = calculate_default_transform(
+                self.crs,
+                "epsg:3857",
+                self.meta["width"],
+                self.meta["height"],
+                *self.crs_bounds
+            )
+            self._resolution = max(abs(dst_affine[0]), abs(dst_affine[4]))
+
+        decimation = (bounds[2] - bounds[0]) / float(width) / self._resolution
+        level = None
+        for idx, factor in enumerate(self.overiew_levels):
+            if factor <= decimation:
+                level = idx
+        return level
+
+    def read_bbox(self, bounds, width, height, window=None, indexes=None):
+        """
+        Read a Web Mercator image of an extent.
+
+        Data is read from the coarsest overview with a resolution finer than
+        the output, and only for `window`, so large images can be read in
+        strips.
+
+        Attributes
+        ----------
+        bounds : list
+            (west, south, east, north) WGS84 bounds.
+        width, height : int
+            Output image size.
+        window : rasterio.windows.Window, optional
+            Part of the output image to read (default: all).
+        indexes : list, optional
+            Band indexes to read instead of `indexes`.
+
+        Returns
+        -------
+        data : numpy ndarray
+        mask : numpy ndarray
+
+        """
+        west, south = mercantile.xy(bounds[0], bounds[1])
+        east, north = mercantile.xy(bounds[2], bounds[3])
+        window = window or windows.Window(0, 0, width, height)
+        indexes = indexes if indexes is not None else self.indexes
+        if isinstance(indexes, int):
+            indexes = [indexes]
+
+        if not hasenv():
+            defenv()
+
+        with rasterio.Env(**self.env):
+            level = self._get_overview_level((west, south, east, north), width)
+            src_dst = self._get_dataset(level)
+            vrt_params = dict(
+                crs=CRS.from_epsg(3857),
+                transform=from_bounds(west, south, east, north, width, height),
+                width=width,
+                height=height,
+            )
+            vrt_params.update(self._warp_params(src_dst))
+            with WarpedVRT(src_dst, **vrt_params) as vrt:
+                data = vrt.read(indexes=list(indexes), window=window)
+                mask = vrt.dataset_mask(window=window)
+
+        return data, mask
+
+    def sample(self, coords, coords_crs="epsg:4326"):
+        """
+        Read raster values and mask at points.
+
+        Points are transformed to the raster CRS in one call and grouped by
+        internal block, so each block holding points is read only once.
+
+        Attributes
+        ----------
+        coords : sequence
+            (x, y) points (e.g. [(lon, lat), ...]).
+        coords_crs : str or CRS, optional (default: "epsg:4326")
+            Points coordinate reference system.
+
+        Returns
+        -------
+        data : numpy ndarray
+            (bands, points) array of the `indexes` values (0 outside the
+            raster).
+        mask : numpy ndarray
+            (points,) boolean array, True for valid values.
+
+        """
+        coords = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 2)
+        nbands = len(self.indexes)
+        data = numpy.zeros((nbands, len(coords)), dtype=self.meta["dtype"])
+        mask = numpy.zeros(len(coords), dtype=bool)
+        if not len(coords):
+            return data, mask
+
+        xs, ys = transform(coords_crs, self.crs, coords[:, 0], coords[:, 1])
+        cols, rows = ~self.meta["transform"] * (numpy.asarray(xs), numpy.asarray(ys))
+        with numpy.errstate(invalid="ignore"):
+            inside = (
+                (cols >= 0)
+                & (cols < self.meta["width"])
+                & (rows >= 0)
+                & (rows < self.meta["height"])
+            )
+        points = numpy.flatnonzero(inside)
+        if not points.size:
+            return data, mask
+
+        cols = numpy.floor(cols[points]).astype(numpy.int64)
+        rows = numpy.floor(rows[points]).astype(numpy.int64)
+
+        if not hasenv():
+            defenv()
+
+        with rasterio.Env(**self.env):
+            src_dst = self._get_dataset()
+            block_height, block_width = src_dst.block_shapes[0]
+            ncols = int(math.ceil(src_dst.width / float(block_width)))
+            blocks = (rows // block_height) * ncols + cols // block_width
+            order = numpy.argsort(blocks, kind="mergesort")
+            block_ids, starts = numpy.unique(blocks[order], return_index=True)
+            for block, group in zip(block_ids, numpy.split(order, starts[1:])):
+                row_off = rows[group[0]] // block_height * block_height
+                col_off = cols[group[0]] // block_width * block_width
+                window = windows.Window(
+                    col_off,
+                    row_off,
+                    min(block_width, src_dst.width - col_off),
+                    min(block_height, src_dst.height - row_off),
+                )
+                block_data = src_dst.read(indexes=list(self.indexes), window=window)
+                block_rows = rows[group] - row_off
+                block_cols = cols[group] - col_off
+                values = block_data[:, block_rows, block_cols]
+                if self.nodata is not None:
+                    if numpy.isnan(self.nodata):
+                        valid = ~numpy.isnan(values).all(axis=0)
+                    else:
+                        valid = ~(values == self.nodata).all(axis=0)
+                else:
+                    block_mask = src_dst.dataset_mask(window=window)
+                    valid = block_mask[block_rows, block_cols] > 0
+
+                if numpy.issubdtype(values.dtype, numpy.floating):
+                    valid &= numpy.isfinite(values).all(axis=0)
+
+                data[:, points[group]] = values
+                mask[points[group]] = valid
+
+        return data, mask
+
+    def _close_dataset(self, src_dst):
+        with self._lock:
+            self._datasets = [
+                (owner, dataset)
+                for owner, dataset in self._datasets
+                if dataset is not src_dst
+            ]
+        src_dst.close()
+
+    def _get_dataset(self, overview_level=None):
+        """Get the dataset (or overview) handle of the current thread (and process)."""
+        self._watch()
+        handles = _thread_handles()
+        key = (self._uid, overview_level)
+        entry = handles.pop(key, None)
+        if entry is not None:
+            _, generation, src_dst = entry
+            if generation == self.generation and not src_dst.closed:
+                handles[key] = entry
+                return src_dst
+
+            # NOTE: Handles are reopened after a source change, by their thread
+            for old in [k for k, v in handles.items() if k[0] == self._uid]:
+                self._close_dataset(handles.pop(old)[2])
+            self._close_dataset(src_dst)
+
+        options = {}
+        if overview_level is not None:
+            options["OVERVIEW_LEVEL"] = overview_level
+        src_dst = rasterio.open(self.path, **options)
+        with self._lock:
+            self._datasets.append((os.getpid(), src_dst))
+        handles[key] = (self, self.generation, src_dst)
+
+        # NOTE: Handles are bounded for the whole process, so mosaics of many
+        # sources read by many threads keep a bounded number of files open.
+        # Handles are not thread safe, threads only close their own handles
+        excess = min(_open_handles() - MAX_DATASETS, len(handles) - 1)
+        for _ in range(excess):
+            _, (raster, _, old) = handles.popitem(last=False)
+            raster._close_dataset(old)
+
+        return src_dst
+
+    def close(self):
+        """
+        Close dataset handles (opened by this process).
+
+        Handles of the other threads are closed too: they are reopened by
+        their thread if the raster is read again.
+
+        """
+        pid = os.getpid()
+        with self._lock:
+            datasets, self._datasets = self._datasets, []
+
+        for owner, src_dst in datasets:
+            if owner == pid:
+                src_dst.close()
+
+        handles = _thread_handles()
+        for key in [key for key in handles if key[0] == self._uid]:
+            del handles[key]
+
+    def _warp_params(self, src_dst):
+        """Get WarpedVRT resampling and mask options."""
+        params = dict(resampling=Resampling.bilinear, add_alpha=True)
+        if self.nodata is not None:
+            params.update(
+                dict(nodata=self.nodata, src_nodata=self.nodata, add_alpha=False)
+            )
+        if has_alpha_band(src_dst):
+            params.update(dict(add_alpha=False))
+        return params
+
+    def _read_into(self, src_dst, bounds, tilesize, out, indexes, padding=2):
+        # NOTE: Same warping as `rio_tiler.utils.tile_read` (bilinear, edge
+        # padding, alpha/nodata mask) but reading into a caller array
+        dst_crs = CRS.from_epsg(3857)
+        vrt_transform, vrt_width, vrt_height = get_vrt_transform(
+            src_dst, bounds, dst_crs=dst_crs
+        )
+        window = windows.Window(0, 0, vrt_width, vrt_height)
+        if not _requested_tile_aligned_with_internal_tile(src_dst, bounds, tilesize):
+            vrt_transform = vrt_transform * Affine.translation(-padding, -padding)
+            window = windows.Window(padding, padding, vrt_width, vrt_height)
+            vrt_width += 2 * padding
+            vrt_height += 2 * padding
+
+        vrt_params = dict(
+            crs=dst_crs, transform=vrt_transform, width=vrt_width, height=vrt_height
+        )
+        vrt_params.update(self._warp_params(src_dst))
+
+        if isinstance(indexes, int):
+            indexes = [indexes]
+
+        with WarpedVRT(src_dst, **vrt_params) as vrt:
+            data = vrt.read(
+                out=out,
+                indexes=list(indexes),
+                window=window,
+                resampling=Resampling.bilinear,
+            )
+            mask = vrt.dataset_mask(out_shape=(tilesize, tilesize), window=window)
+
+        return data, mask
+
+    def _iter_overview_blocks(self):
+        """Yield (data, mask) for each block of the coarsest overview."""
+        level = len(self.overiew_levels) - 1
+        with rasterio.Env(**self.env), rasterio.open(
+            self.path, OVERVIEW_LEVEL=level
+        ) as src:
+            for _, window in src.block_windows(1):
+                data = src.read(indexes=self.indexes, window=window)
+                if self.nodata is not None:
+                    if numpy.isnan(self.nodata):
+                        mask = ~numpy.isnan(data)
+                    else:
+                        mask = data != self.nodata
+                else:
+                    mask = numpy.repeat(
+                        src.dataset_mask(window=window)[numpy.newaxis] > 0,
+                        data.shape[0],
+                        axis=0,
+                    )
+
+                if numpy.issubdtype(data.dtype, numpy.floating):
+                    mask &= numpy.isfinite(data)
+
+                yield data, mask
+
+    def _stats_sidecar(self):
+        """Get statistics sidecar file path (None for remote datasets)."""
+        if not os.path.isfile(self.path):
+            return None
+        return "{}.stats.json".format(self.path)
+
+    def _stats_key(self, percentiles, bins):
+        stat = os.stat(self.path) if os.path.isfile(self.path) else None
+        return dict(
+            source=[stat.st_mtime, stat.st_size] if stat else None,
+            indexes=list(self.indexes),
+            nodata=None if self.nodata is None else str(self.nodata),
+            percentiles=list(percentiles),
+            bins=bins,
         )
+
+    def _load_stats(self, key):
+        sidecar = self._stats_sidecar()
+        if not sidecar or not os.path.exists(sidecar):
+            return None
+
+        try:
+            with open(sidecar) as f:
+                cached = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if cached.get("key") != key:
+            return None
+
+        return {int(b): v for b, v in cached["statistics"].items()}
+
+    def _save_stats(self, key, stats):
+        sidecar = self._stats_sidecar()
+        if not sidecar:
+            return
+
+        try:
+            with open(sidecar, "w") as f:
+                json.dump(dict(key=key, statistics=stats), f)
+        except (IOError, OSError):
+            logger.warning("Could not write statistics sidecar {}".format(sidecar))
+
+    def _compute_stats(self, percentiles, bins):
+        nbands = len(self.indexes)
+        vmin = numpy.full(nbands, numpy.inf)
+        vmax = numpy.full(nbands, -numpy.inf)
+        total = numpy.zeros(nbands)
+        total_sq = numpy.zeros(nbands)
+        count = numpy.zeros(nbands)
+
+        # First pass: min, max, mean and std
+        for data, mask in self._iter_overview_blocks():
+            for bdx in range(nbands):
+                values = data[bdx][mask[bdx]].astype(numpy.float64)
+                if not values.size:
+                    continue
+                vmin[bdx] = min(vmin[bdx], values.min())
+                vmax[bdx] = max(vmax[bdx], values.max())
+                total[bdx] += values.sum()
+                total_sq[bdx] += (values ** 2).sum()
+                count[bdx] += values.size
+
+        is_integer = numpy.issubdtype(numpy.dtype(self.meta["dtype"]), numpy.integer)
+        edges = []
+        for bdx in range(nbands):
+            if not count[bdx]:
+                edges.append(None)
+                continue
+            nbins = bins
+            if is_integer:
+                nbins = int(min(bins, vmax[bdx] - vmin[bdx] + 1))
+            edges.append(numpy.linspace(vmin[bdx], vmax[bdx], max(nbins, 1) + 1))
+
+        # Second pass: histograms
+        hists = [numpy.zeros(len(e) - 1) if e is not None else None for e in edges]
+        for data, mask in self._iter_overview_blocks():
+            for bdx in range(nbands):
+                if edges[bdx] is None:
+                    continue
+                hists[bdx] += numpy.histogram(data[bdx][mask[bdx]], bins=edges[bdx])[0]
+
+        stats = {}
+        for bdx, band in enumerate(self.indexes):
+            if edges[bdx] is None:
+                stats[band] = dict(
+                    pc=None, min=None, max=None, std=None, histogram=None
+                )
+                continue
+
+            cdf = numpy.cumsum(hists[bdx]) / count[bdx]
+            pc = [
+                float(numpy.interp(p / 100.0, numpy.insert(cdf, 0, 0), edges[bdx]))
+                for p in percentiles
+            ]
+            mean = total[bdx] / count[bdx]
+            std = numpy.sqrt(max(total_sq[bdx] / count[bdx] - mean ** 2, 0))
+            stats[band] = dict(
+                pc=pc,
+                min=float(vmin[bdx]),
+                max=float(vmax[bdx]),
+                std=float(std),
+                histogram=[hists[bdx].astype(int).tolist(), edges[bdx].tolist()],
+            )
+
+        return stats
+
+    def get_stats(self, percentiles=(2, 98), bins=1000):
+        """
+        Get per-band statistics from the coarsest overview.
+
+        Statistics are computed block by block over the lowest resolution
+        overview, in two streaming passes (min/max then histogram), and cached
+        in memory and in a `{src_path}.stats.json` sidecar for local files.
+
+        Attributes
+        ----------
+        percentiles : tuple, optional (default: (2, 98))
+            Min/Max percentiles to compute.
+        bins : int, optional (default: 1000)
+            Maximum number of histogram bins used to estimate percentiles.
+
+        Returns
+        -------
+        stats : dict
+            Statistics per band index (pc, min, max, std, histogram).
+
+        """
+        key = self._stats_key(percentiles, bins)
+        cache_id = json.dumps(key, sort_keys=True)
+        if cache_id in self._stats:
+            return self._stats[cache_id]
+
+        stats = self._load_stats(key)
+        if stats is None:
+            stats = self._compute_stats(percentiles, bins)
+            self._save_stats(key, stats)
+
+        self._stats[cache_id] = stats
+        return stats
@@ -0,0 +1,119 @@
+"""rio_glui.render: fused tile rendering kernel."""
+
+import numpy
+
+from rio_color.operations import parse_operations
+from rio_color.utils import math_type
+
+from rio_glui.buffers import arena
+from rio_glui.colormap import apply_lut
+
+
+def render_tile(data, mask, scale=None, color_ops=None, colormap=None):
+    """
+    Render tile data to uint8 RGB(A) in a single float work buffer.
+
+    Rescaling, rio-color operations and masking are applied in place on one
+    reused float buffer (float32, or float64 when color operations are
+    used) which is quantized once at the end. Color operations are applied in
+    the 0-1 float space, without intermediate uint8 round trips.
+
+    Attributes
+    ----------
+    data : numpy ndarray
+        Tile data (bands, height, width).
+    mask : numpy ndarray
+        Tile mask (0: nodata).
+    scale : list, optional
+        Min/Max data bounds for each band. Data is expected in the 0-255
+        range when not provided. Equal bounds map values below the bound to
+        0 and the others to 255.
+    color_ops : str, optional
+        rio-color formula.
+    colormap : numpy ndarray, optional
+        (256, 4) RGBA lookup table applied to the first band.
+
+    Returns
+    -------
+    rgba : numpy ndarray
+        (bands + 1, height, width) uint8 array, the last band being the
+        alpha band. The array is a `rio_glui.buffers.arena` buffer, only
+        valid until the next call from the same thread.
+
+    """
+    if colormap is not None:
+        index, valid = render_index(data, mask, scale=scale, color_ops=color_ops)
+        rgba = arena.get("rgba", (4,) + index.shape, numpy.uint8)
+        return apply_lut(index, colormap, mask=mask, out=rgba)
+
+    work, valid = _render_work(data, mask, scale=scale, color_ops=color_ops)
+    nbands, height, width = data.shape
+    rgba = arena.get("rgba", (nbands + 1, height, width), numpy.uint8)
+    rgba[:nbands] = work
+    rgba[nbands] = valid
+    rgba[nbands] *= 255
+
+    return rgba
+
+
+def render_index(data, mask, scale=None, color_ops=None):
+    """
+    Render the first band of tile data to 0-255 colormap indexes.
+
+    Attributes
+    ----------
+    data : numpy ndarray
+        Tile data (bands, height, width).
+    mask : numpy ndarray
+        Tile mask (0: nodata).
+    scale : list, optional
+        Min/Max data bounds of the first band.
+    color_ops : str, optional
+        rio-color formula.
+
+    Returns
+    -------
+    index : numpy ndarray
+        (height, width) uint8 array (0 where masked).
+    valid : numpy ndarray
+        (height, width) bool array.
+
+    Both arrays are `rio_glui.buffers.arena` buffers, only valid until the
+    next call from the same thread.
+
+    """
+    work, valid = _render_work(data[:1], mask, scale=scale, color_ops=color_ops)
+    index = arena.get("index", work.shape[1:], numpy.uint8)
+    index[...] = work[0]
+    return index, valid
+
+
+def _render_work(data, mask, scale=None, color_ops=None):
+    """Rescale, color and mask data in the 0-255 float work buffer."""
+    nbands = data.shape[0]
+    ops = parse_operations(color_ops) if color_ops else []
+    top = 1.0 if ops else 255.0
+
+    work = arena.get("work", data.shape, math_type if ops else numpy.float32)
+    if scale:
+        for bdx in range(nbands):
+            imin, imax = scale[bdx]
+            if imax == imin:
+                # Zero-width range: a step at imin.
+                numpy.greater_equal(data[bdx], imin, out=work[bdx], casting="unsafe")
+                work[bdx] *= top
+                continue
+            numpy.subtract(data[bdx], imin, out=work[bdx], casting="unsafe")
+            work[bdx] *= top / float(imax - imin)
+    else:
+        numpy.multiply(data, top / 255.0, out=work, casting="unsafe")
+    numpy.clip(work, 0, top, out=work)
+
+    for op in ops:
+        work = op(work)
+    if ops:
+        work *= 255.0
+
+    valid = mask != 0
+    work *= valid
+    return work, valid
@@ -1,11 +1,15 @@
 """rio_glui.cli."""
 
 import os
+import json
+
 import click
-import numpy
 
-from rio_glui.raster import RasterTiles
-from rio_glui import server
+from rio_glui.env import gdal_env, set_cachemax
+
+# NOTE: `rio` imports every plugin module to list its commands, so the
+# rasterio, rio-tiler, tornado and numpy stacks are only imported when a
+# command runs (see `test_cli_import`)
 
 
 class MbxTokenType(click.ParamType):
@@ -60,7 +64,7 @@ class NodataParamType(click.ParamType):
         """Validate and parse band index."""
         try:
             if value.lower() == "nan":
-                return numpy.nan
+                return float("nan")
             elif value.lower() in ["nil", "none", "nada"]:
                 return None
             else:
@@ -69,6 +73,25 @@ class NodataParamType(click.ParamType):
             raise click.ClickException("{} is not a valid nodata value.".format(value))
 
 
+class ColormapParamType(click.ParamType):
+    """Colormap type."""
+
+    name = "colormap"
+
+    def convert(self, value, param, ctx):
+        """Validate colormap name or LUT file."""
+        from rio_glui.colormap import list_colormaps
+
+        if os.path.isfile(value) or value in list_colormaps():
+            return value
+
+        raise click.ClickException(
+            "{} is not a rio-tiler colormap ({}) or a LUT file.".format(
+                value, ", ".join(list_colormaps())
+            )
+        )
+
+
 @click.command()
 @click.argument("path", type=str)
 @click.option("--bidx", "-b", type=BdxParamType(), help="Raster band index")
@@ -79,12 +102,13 @@ class NodataParamType(click.ParamType):
     nargs=2,
     help="Min and Max data bounds to rescale data from. "
     "Form multiband you can either provide use '--scale 0 1000' or "
-    "'--scale 0 1000 --scale 0 500 --scale 0 1500'",
+    "'--scale 0 1000 --scale 0 500 --scale 0 1500' "
+    "(default: 2-98 percentiles for non-uint8 datasets)",
 )
 @click.option(
     "--colormap",
-    type=click.Choice(["cfastie", "schwarzwald"]),
-    help=" Rio-tiler compatible colormap name",
+    type=ColormapParamType(),
+    help="Rio-tiler colormap name or LUT file (.npy or text 'value r g b [a]')",
 )
 @click.option(
     "--tiles-format",
@@ -104,13 +128,136 @@ class NodataParamType(click.ParamType):
     metavar="NUMBER|nan",
     help="Set nodata masking values for input dataset.",
 )
+@click.option(
+    "--mosaic",
+    is_flag=True,
+    help="PATH is a text file listing datasets (one per line, by decreasing "
+    "priority) served as one mosaic",
+)
 @click.option(
     "--gl-tile-size",
     type=int,
     help="mapbox-gl tileSize (default is the same as `tiles-dimensions`)",
 )
+@click.option(
+    "--cache",
+    type=click.Path(dir_okay=False),
+    help="Persistent tile cache file (SQLite), shared across restarts and servers",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    default=512,
+    help="Maximum tile cache size in MB (default: 512)",
+)
+@click.option(
+    "--array-cache-size",
+    type=click.IntRange(min=0),
+    default=128,
+    help="In-memory raw tile cache size in MB, used to derive tile size "
+    "variants (default: 128, 0: disabled)",
+)
+@click.option(
+    "--pyramid",
+    is_flag=True,
+    help="Build tiles from their cached higher zoom children when available",
+)
+@click.option(
+    "--gdal-cachemax",
+    type=click.IntRange(min=0),
+    help="GDAL block cache size in MB (default: GDAL default, 5% of RAM)",
+)
+@click.option(
+    "--http-merge-ranges/--no-http-merge-ranges",
+    default=None,
+    help="Merge consecutive HTTP range requests (default: merge)",
+)
+@click.option(
+    "--http-multiplex/--no-http-multiplex",
+    default=None,
+    help="Multiplex HTTP/2 requests (default: multiplex)",
+)
+@click.option(
+    "--vsi-cache-size",
+    type=click.IntRange(min=0),
+    help="Remote file data cache size in MB (default: 64, 0: disabled)",
+)
+@click.option(
+    "--allowed-extensions",
+    type=str,
+    help="Comma-separated file extensions GDAL may request on remote datasets "
+    "(default: .tif,.TIF,.tiff, '': all)",
+)
+@click.option(
+    "--ingested-bytes",
+    type=click.IntRange(min=0),
+    help="Bytes read with the first request when opening a remote dataset "
+    "(default: 32768)",
+)
+@click.option(
+    "--count-requests",
+    is_flag=True,
+    help="Report GDAL HTTP requests per tile (X-HTTP-Requests header, /metrics)",
+)
 @click.option("--port", type=int, default=8080, help="Webserver port (default: 8080)")
+@click.option(
+    "--processes",
+    type=click.IntRange(min=0),
+    default=1,
+    help="Number of worker processes serving on the same port "
+    "(default: 1, 0: one per CPU)",
+)
+@click.option(
+    "--keep-alive/--no-keep-alive",
+    default=True,
+    help="Keep HTTP connections open between requests (default: keep-alive)",
+)
+@click.option(
+    "--idle-timeout",
+    type=float,
+    default=3600,
+    help="Seconds before closing idle keep-alive connections (default: 3600)",
+)
+@click.option(
+    "--compress",
+    is_flag=True,
+    help="Gzip text and json responses (tiles are already compressed)",
+)
+@click.option(
+    "--degrade-pending",
+    type=click.IntRange(min=1),
+    help="Tiles in flight above which tiles are degraded (cheaper reads and encoding)",
+)
+@click.option(
+    "--degrade-latency",
+    type=float,
+    help="Median tile latency (seconds) above which tiles are degraded",
+)
+@click.option(
+    "--degrade-modes",
+    type=str,
+    default="overview,encoder,color",
+    help="Comma-separated degradations: overview (2x coarser overview, upsampled), "
+    "encoder (fastest compression), color (skip color operations) "
+    "(default: overview,encoder,color)",
+)
+@click.option(
+    "--debug",
+    is_flag=True,
+    help="Serve /debug/profile (sampling profiler) and /debug/slow (slowest recent tiles)",
+)
 @click.option("--playground", is_flag=True, help="Launch playground app")
+@click.option(
+    "--client",
+    is_flag=True,
+    help="Launch client-side rendering app (raw tiles rendered with WebGL)",
+)
+@click.option(
+    "--hillshade",
+    is_flag=True,
+    help="Add a hillshade layer of the first band elevations (Terrain-RGB tiles "
+    "shaded by the browser) to the simple app",
+)
 @click.option(
     "--mapbox-token",
     type=MbxTokenType(),
@@ -126,16 +273,83 @@ def glui(
     tiles_format,
     tiles_dimensions,
     nodata,
+    mosaic,
     gl_tile_size,
+    cache,
+    cache_size,
+    array_cache_size,
+    pyramid,
+    gdal_cachemax,
+    http_merge_ranges,
+    http_multiplex,
+    vsi_cache_size,
+    allowed_extensions,
+    ingested_bytes,
+    count_requests,
     port,
+    processes,
+    keep_alive,
+    idle_timeout,
+    compress,
+    degrade_pending,
+    degrade_latency,
+    degrade_modes,
+    debug,
     playground,
+    client,
+    hillshade,
     mapbox_token,
 ):
     """Rasterio glui cli."""
     if scale and len(scale) not in [1, 3]:
         raise click.ClickException("Invalid number of scale values")
 
-    raster = RasterTiles(path, indexes=bidx, tiles_size=tiles_dimensions, nodata=nodata)
+    from rio_glui import server
+    from rio_glui.raster import RasterTiles
+    from rio_glui.mosaic import MosaicTiles
+    from rio_glui.cache import TileCache, ArrayCache
+    from rio_glui.metrics import LoadMonitor
+
+    load = None
+    if degrade_pending or degrade_latency:
+        try:
+            load = LoadMonitor(
+                max_pending=degrade_pending,
+                max_latency=degrade_latency,
+                modes=[mode for mode in degrade_modes.split(",") if mode],
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    if gdal_cachemax is not None:
+        set_cachemax(gdal_cachemax)
+
+    env = gdal_env(
+        merge_ranges=http_merge_ranges,
+        multiplex=http_multiplex,
+        vsi_cache_size=vsi_cache_size * 1024 * 1024
+        if vsi_cache_size is not None
+        else None,
+        allowed_extensions=allowed_extensions,
+        ingested_bytes=ingested_bytes,
+    )
+    if mosaic:
+        with open(path) as f:
+            paths = [line.strip() for line in f if line.strip()]
+        raster = MosaicTiles(
+            paths, indexes=bidx, tiles_size=tiles_dimensions, nodata=nodata, env=env
+        )
+    else:
+        raster = RasterTiles(
+            path, indexes=bidx, tiles_size=tiles_dimensions, nodata=nodata, env=env
+        )
+
+    if cache:
+        cache = TileCache(cache, max_size=cache_size * 1024 * 1024)
+
+    arrays = None
+    if array_cache_size:
+        arrays = ArrayCache(max_size=array_cache_size * 1024 * 1024)
 
     app = server.TileServer(
         raster,
@@ -146,16 +360,198 @@ def glui(
         gl_tiles_minzoom=raster.get_min_zoom(),
         gl_tiles_maxzoom=raster.get_max_zoom(),
         port=port,
+        cache=cache,
+        processes=processes,
+        keep_alive=keep_alive,
+        idle_timeout=idle_timeout,
+        compress=compress,
+        arrays=arrays,
+        pyramid=pyramid,
+        count_requests=count_requests,
+        debug=debug,
+        load=load,
     )
 
     if playground:
         url = app.get_playground_url()
+    elif client:
+        url = app.get_client_url()
     else:
         url = app.get_template_url()
 
+    query = []
+    if hillshade and not (playground or client):
+        query.append("hillshade=1")
     if mapbox_token:
-        url = "{}?access_token={}".format(url, mapbox_token)
+        query.append("access_token={}".format(mapbox_token))
+    if query:
+        url = "{}?{}".format(url, "&".join(query))
 
     click.launch(url)
     click.echo("Inspecting {} at {}".format(path, url), err=True)
     app.start()
+
+
+@click.command()
+@click.argument("path", type=str, required=False)
+@click.option(
+    "--url",
+    type=str,
+    help="Running rio-glui server url (e.g. http://127.0.0.1:8080). "
+    "When not set, PATH is served in-process.",
+)
+@click.option("--bidx", "-b", type=BdxParamType(), help="Raster band index")
+@click.option(
+    "--scale",
+    type=int,
+    multiple=True,
+    nargs=2,
+    help="Min and Max data bounds to rescale data from.",
+)
+@click.option(
+    "--colormap",
+    type=ColormapParamType(),
+    help="Rio-tiler colormap name or LUT file (.npy or text 'value r g b [a]')",
+)
+@click.option(
+    "--tiles-format",
+    type=click.Choice(["png", "jpg", "webp"]),
+    default="png",
+    help="Tile image format (default: png)",
+)
+@click.option(
+    "--tiles-dimensions",
+    type=int,
+    default=512,
+    help="Dimension of images being served (default: 512)",
+)
+@click.option(
+    "--cache",
+    type=click.Path(dir_okay=False),
+    help="Persistent tile cache file (SQLite)",
+)
+@click.option(
+    "--sessions", type=int, default=20, help="Number of map sessions (default: 20)"
+)
+@click.option(
+    "--steps",
+    type=int,
+    default=10,
+    help="Number of pans, zooms and color edits per session (default: 10)",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    help="Number of simultaneous sessions (default: 4)",
+)
+@click.option(
+    "--viewport",
+    type=int,
+    nargs=2,
+    default=(1024, 768),
+    help="Viewport width and height in pixels (default: 1024 768)",
+)
+@click.option("--seed", type=int, help="Random seed")
+def loadtest(
+    path,
+    url,
+    bidx,
+    scale,
+    colormap,
+    tiles_format,
+    tiles_dimensions,
+    cache,
+    sessions,
+    steps,
+    concurrency,
+    viewport,
+    seed,
+):
+    """Replay synthetic map sessions against a rio-glui tile server."""
+    if not path and not url:
+        raise click.ClickException("PATH or --url must be provided")
+
+    if scale and len(scale) not in [1, 3]:
+        raise click.ClickException("Invalid number of scale values")
+
+    from tornado import netutil
+    from tornado.ioloop import IOLoop
+    from tornado.httpclient import HTTPClient
+    from tornado.httpserver import HTTPServer
+
+    from rio_glui import server
+    from rio_glui import loadtest as load
+    from rio_glui.raster import RasterTiles
+    from rio_glui.cache import TileCache
+
+    if url:
+        tilejson = json.loads(
+            HTTPClient().fetch("{}/tilejson.json".format(url.rstrip("/"))).body.decode()
+        )
+    else:
+        raster = RasterTiles(path, indexes=bidx, tiles_size=tiles_dimensions)
+        sockets = netutil.bind_sockets(0, "127.0.0.1")
+        app = server.TileServer(
+            raster,
+            scale=scale,
+            colormap=colormap,
+            tiles_format=tiles_format,
+            gl_tiles_minzoom=raster.get_min_zoom(),
+            gl_tiles_maxzoom=raster.get_max_zoom(),
+            port=sockets[0].getsockname()[1],
+            cache=TileCache(cache) if cache else None,
+        )
+        HTTPServer(app.app).add_sockets(sockets)
+        tilejson = dict(
+            tiles=[app.get_tiles_url()],
+            bounds=app.get_bounds(),
+            minzoom=app.gl_tiles_minzoom,
+            maxzoom=app.gl_tiles_maxzoom,
+            tileSize=app.gl_tiles_size,
+        )
+
+    map_sessions = load.generate_sessions(
+        tilejson["bounds"],
+        tilejson["minzoom"],
+        tilejson["maxzoom"],
+        sessions=sessions,
+        steps=steps,
+        width=viewport[0],
+        height=viewport[1],
+        tilesize=tilejson["tileSize"],
+        seed=seed,
+    )
+
+    report = IOLoop.current().run_sync(
+        lambda: load.run_loadtest(
+            tilejson["tiles"][0], map_sessions, concurrency=concurrency
+        )
+    )
+    click.echo(json.dumps(report, indent=2))
+
+
+@click.command()
+@click.argument("path", type=str)
+@click.option(
+    "--tiles-dimensions",
+    type=int,
+    default=512,
+    help="Dimension of images being served (default: 512)",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON")
+@click.option(
+    "--strict", is_flag=True, help="Exit with an error when the file is flagged"
+)
+def inspect(path, tiles_dimensions, as_json, strict):
+    """Report a COG layout and its estimated reads per tile and zoom."""
+    from rio_glui.diagnostics import inspect_cog, format_report
+
+    report = inspect_cog(path, tiles_size=tiles_dimensions)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        click.echo(format_report(report))
+
+    if report["errors"] or (strict and report["warnings"]):
+        raise click.ClickException("{} will not serve efficiently".format(path))
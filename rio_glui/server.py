@@ -1,26 +1,106 @@
 """rio_glui.server: tornado tile server and template renderer."""
 
 import os
+import json
+import struct
+import hashlib
+import inspect
 import logging
+import threading
 from io import BytesIO
 from concurrent import futures
+from collections import OrderedDict
 
 import numpy
 
-from rio_tiler.utils import array_to_image, linear_rescale, get_colormap
-from rio_tiler.profiles import img_profiles
-from rio_color.operations import parse_operations
-from rio_color.utils import scale_dtype, to_math_type
-
+import mercantile
 from tornado import web
 from tornado import gen
+from tornado import process
 from tornado.ioloop import IOLoop
 from tornado.httpserver import HTTPServer
 from tornado.concurrent import run_on_executor
-
+from tornado.web import GZipContentEncoding
+
+from rio_glui.cache import tile_key
+from rio_glui.env import HTTPRequestCounter
+from rio_glui.metrics import TileMetrics, StageTimer, SlowTiles
+from rio_glui.profiler import SamplingProfiler
+from rio_glui.encoders import (
+    encode_image,
+    encode_indexed_png,
+    encode_npy,
+    encode_terrain_rgb,
+    npy_info,
+    PNGEncoder,
+)
+from rio_glui.render import render_tile, render_index
+from rio_glui.expression import get_expression, EXPRESSION_ERRORS
+from rio_glui.buffers import arena
+from rio_glui.pyramid import downsample, children, merge_children
 
 logger = logging.getLogger(__name__)
 
+MIN_TILE_SIZE = 16
+MAX_TILE_SIZE = 4096
+MAX_BATCH_TILES = 256
+MAX_POINTS = 10000
+MAX_IMAGE_SIZE = 8192
+MAX_PREVIEWS = 16
+MAX_EXPRESSION_SCALES = 64
+
+# Longest side (pixels) of the raster extent read to get the default scale of
+# expressions
+EXPRESSION_SCALE_SIZE = 256
+
+MAX_LATITUDE = 85.0511287798066
+
+# Rows of extent images read and encoded at once
+STRIP_HEIGHT = 256
+
+# Batch response frame header: z, x, y, HTTP status and tile byte size
+BATCH_FRAME = struct.Struct(">BIIHI")
+
+# zlib level of PNG and NPY tiles with the "encoder" degradation
+FAST_ZLEVEL = 1
+
+
+def _read_options(read_tile):
+    """Get the `read_tile` keyword options a RasterTiles reader accepts."""
+    try:
+        parameters = inspect.signature(read_tile).parameters.values()
+    except AttributeError:  # pragma: no cover (Python 2)
+        spec = inspect.getargspec(read_tile)
+        names, kwargs = spec.args, spec.keywords is not None
+    else:
+        names = [p.name for p in parameters]
+        kwargs = any(p.kind == p.VAR_KEYWORD for p in parameters)
+    return frozenset(
+        option for option in ("tilesize", "out") if kwargs or option in names
+    )
+
+
+def _dtype_range(dtype):
+    """Get the default scale of a band without statistics (no valid data)."""
+    dtype = numpy.dtype(dtype)
+    if numpy.issubdtype(dtype, numpy.integer):
+        info = numpy.iinfo(dtype)
+        return (info.min, info.max)
+    return (0, 1)
+
+
+def _default_scale(stats, dtype):
+    """
+    Get the default scale of a band from its statistics.
+
+    The percentiles are used when they are a non empty range, then the band
+    min/max, then the data type range (constant or empty bands).
+    """
+    for bounds in (stats["pc"], (stats["min"], stats["max"])):
+        if bounds and bounds[0] is not None and bounds[0] < bounds[1]:
+            return tuple(bounds)
+    return _dtype_range(dtype)
+
 
 class TileServer(object):
     """
@@ -35,8 +115,10 @@ class TileServer(object):
     scale : tuple, optional
         Min and Max data bounds to rescale data from.
         Must be in the form of "((min, max), (min, max), (min, max))" or "((min, max),)"
+        Defaults to the 2-98 percentiles of each band for non-uint8 datasets.
     colormap: str, optional
-        rio-tiler compatible colormap name ('cfastie' or 'schwarzwald')
+        rio-tiler compatible colormap name (e.g. 'cfastie' or 'schwarzwald')
+        or path to a LUT file (.npy or text `value r g b [a]` entries).
     gl_tiles_size, int, optional
         Tile pixel size. (only for templates)
     gl_tiles_minzoom: int, optional (default: 0)
@@ -45,12 +127,44 @@ class TileServer(object):
         Raster tile maximun zoom. (only for  templates)
     port, int, optional (default: 8080)
         Tornado app default port.
-
+    cache: TileCache, optional
+        Persistent tile cache.
+    processes: int, optional (default: 1)
+        Number of worker processes sharing the port (0: one per CPU).
+    keep_alive: bool, optional (default: True)
+        Keep HTTP/1.1 connections open between requests.
+    idle_timeout: float, optional (default: 3600)
+        Seconds after which idle keep-alive connections are closed.
+    chunk_size: int, optional (default: 65536)
+        Tiles larger than `chunk_size` bytes are flushed in chunks.
+    compress: bool, optional (default: False)
+        Gzip text and json responses (tiles are already compressed).
+    arrays: ArrayCache, optional
+        In-memory raw tile arrays cache. Smaller tile sizes are downsampled
+        from cached larger tiles.
+    pyramid: bool, optional (default: False)
+        Build tiles from their four cached (z + 1) children when available
+        (requires `arrays`).
+    count_requests: bool, optional (default: False)
+        Count GDAL HTTP requests of each tile read (`X-HTTP-Requests` header
+        and `/metrics`). This enables GDAL vsicurl debug messages.
+    max_workers: int, optional (default: 16)
+        Number of threads reading and rendering tiles.
+    debug: bool, optional (default: False)
+        Serve the `/debug/profile` (sampling profiler of the IOLoop and
+        reader threads) and `/debug/slow` (slowest recent tiles with their
+        stage timings) endpoints.
+    load: LoadMonitor, optional
+        Degrade tiles (cheaper reads, encoding and rendering) while the
+        reader threads are saturated. Degraded tiles have a
+        `X-Tile-Degraded` header (203 status in batches) and are not cached.
 
     Methods
     -------
     get_tiles_url()
         Get tiles endpoint url.
+    get_terrain_url()
+        Get Terrain-RGB (elevation) tiles endpoint url.
     get_template_url()
         Get simple app template url.
     get_bounds()
@@ -59,10 +173,20 @@ class TileServer(object):
         Get raster center
     get_playground_url()
         Get playground app template url.
-    start()
+    get_client_url()
+        Get client-side rendering app template url.
+    get_stats_url()
+        Get raster statistics endpoint url.
+    get_metrics_url()
+        Get server metrics endpoint url.
+    get_tilejson_url()
+        Get TileJSON endpoint url.
+    get_preview_url()
+        Get raster preview image url.
+    start(background=False)
         Start tile server.
     stop()
-        Stop tile server.
+        Stop tile server, its reader threads and dataset handles.
 
     """
 
@@ -76,38 +200,175 @@ class TileServer(object):
         gl_tiles_minzoom=0,
         gl_tiles_maxzoom=22,
         port=8080,
+        cache=None,
+        processes=1,
+        keep_alive=True,
+        idle_timeout=3600,
+        chunk_size=64 * 1024,
+        compress=False,
+        arrays=None,
+        pyramid=False,
+        count_requests=False,
+        max_workers=16,
+        debug=False,
+        load=None,
     ):
         """Initialize Tornado app."""
         self.raster = raster
         self.port = port
         self.server = None
+        self.loop = None
+        self.thread = None
+        self.processes = processes
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
         self.tiles_format = tiles_format
         self.gl_tiles_size = gl_tiles_size if gl_tiles_size else self.raster.tiles_size
         self.gl_tiles_minzoom = gl_tiles_minzoom
         self.gl_tiles_maxzoom = gl_tiles_maxzoom
 
         settings = {"static_path": os.path.join(os.path.dirname(__file__), "static")}
+        if compress:
+            settings["transforms"] = [GZipContentEncoding]
 
         if colormap:
-            colormap = get_colormap(name=colormap, format="gdal")
+            from rio_glui.colormap import get_lut
+
+            colormap = get_lut(colormap)
+
+        if not scale and self.raster.meta["dtype"] != "uint8":
+            stats = self.raster.get_stats()
+            scale = tuple(
+                _default_scale(stats[bdx], self.raster.meta["dtype"])
+                for bdx in self.raster.indexes
+            )
 
-        tile_params = dict(raster=self.raster, scale=scale, colormap=colormap)
+        self.scale = scale
+
+        self.cache = cache
+        self.arrays = arrays
+        self.previews = OrderedDict()
+        self.expression_scales = OrderedDict()
+
+        # NOTE: Cached tiles of changed source blocks are dropped as soon as a
+        # change is detected (see `RasterTiles.check_source`). Changes are
+        # only located to blocks when tiles are cached
+        if hasattr(self.raster, "add_listener"):
+            self.raster.add_listener(self._invalidate, blocks=bool(cache or arrays))
+
+        self.counter = None
+        if count_requests:
+            self.raster.env["CPL_DEBUG"] = "VSICURL"
+            self.counter = HTTPRequestCounter()
+            self.counter.install()
+
+        # NOTE: Each server reads tiles in its own threads, so stopping one
+        # server does not affect other servers of the same process
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+
+        # NOTE: Mosaics read their sources in their own threads, sized for
+        # the number of tiles read at once
+        if hasattr(self.raster, "readers"):
+            self.raster.readers = max_workers
+
+        # NOTE: metrics live in shared memory and must be created before forking
+        self.metrics = TileMetrics(workers=processes or process.cpu_count())
+        self.slow = SlowTiles() if debug else None
+        self.load = load
+
+        tile_params = dict(
+            raster=self.raster,
+            scale=scale,
+            colormap=colormap,
+            cache=self.cache,
+            metrics=self.metrics,
+            chunk_size=chunk_size,
+            arrays=arrays,
+            pyramid=pyramid,
+            counter=self.counter,
+            executor=self.executor,
+            slow=self.slow,
+            load=self.load,
+            expression_scales=self.expression_scales,
+            read_options=_read_options(self.raster.read_tile),
+        )
 
         template_params = dict(
             tiles_url=self.get_tiles_url(),
+            stats_url=self.get_stats_url(),
             tiles_bounds=self.raster.get_bounds(),
             gl_tiles_size=self.gl_tiles_size,
             gl_tiles_minzoom=self.gl_tiles_minzoom,
             gl_tiles_maxzoom=self.gl_tiles_maxzoom,
+            terrain_url=self.get_terrain_url(),
         )
 
+        debug_handlers = []
+        if debug:
+            debug_handlers = [
+                (
+                    r"^/debug/profile",
+                    ProfileHandler,
+                    dict(executor=self.executor),
+                ),
+                (r"^/debug/slow", SlowTilesHandler, dict(slow=self.slow)),
+            ]
+
         self.app = web.Application(
             [
-                (r"^/tiles/(\d+)/(\d+)/(\d+)\.(\w+)", RasterTileHandler, tile_params),
+                (
+                    r"^/tiles/(\d+)/(\d+)/(\d+)(?:@(\d)x)?\.([\w-]+)",
+                    RasterTileHandler,
+                    tile_params,
+                ),
+                (r"^/tiles/batch", TileBatchHandler, tile_params),
+                (
+                    r"^/preview\.(\w+)",
+                    PreviewHandler,
+                    dict(
+                        tile_params,
+                        metrics=None,
+                        slow=None,
+                        load=None,
+                        previews=self.previews,
+                    ),
+                ),
+                (
+                    r"^/bbox/([^/,]+),([^/,]+),([^/,]+),([^/,]+?)\.(\w+)",
+                    BBoxHandler,
+                    dict(tile_params, metrics=None, slow=None, load=None),
+                ),
+                (
+                    r"^/stats",
+                    StatsHandler,
+                    dict(raster=self.raster, executor=self.executor),
+                ),
+                (
+                    r"^/point",
+                    PointHandler,
+                    dict(raster=self.raster, executor=self.executor),
+                ),
+                (
+                    r"^/points",
+                    PointsHandler,
+                    dict(raster=self.raster, executor=self.executor),
+                ),
+                (r"^/metrics", MetricsHandler, dict(metrics=self.metrics)),
+                (r"^/tilejson.json", TileJSONHandler, template_params),
                 (r"^/index.html", IndexTemplate, template_params),
                 (r"^/playground.html", PlaygroundTemplate, template_params),
-                (r"/.*", InvalidAddress),
-            ],
+                (
+                    r"^/client.html",
+                    ClientTemplate,
+                    dict(
+                        template_params,
+                        scale=scale,
+                        colormap=colormap.tolist() if colormap is not None else None,
+                    ),
+                ),
+            ]
+            + debug_handlers
+            + [(r"/.*", InvalidAddress)],
             **settings
         )
 
@@ -118,6 +379,12 @@ class TileServer(object):
             self.port, tileformat
         )
 
+    def get_terrain_url(self):
+        """Get Terrain-RGB (elevation) tiles endpoint url."""
+        return "http://127.0.0.1:{}/tiles/{{z}}/{{x}}/{{y}}.terrain-rgb".format(
+            self.port
+        )
+
     def get_template_url(self):
         """Get simple app template url."""
         return "http://127.0.0.1:{}/index.html".format(self.port)
@@ -126,6 +393,27 @@ class TileServer(object):
         """Get playground app template url."""
         return "http://127.0.0.1:{}/playground.html".format(self.port)
 
+    def get_client_url(self):
+        """Get client-side rendering app template url."""
+        return "http://127.0.0.1:{}/client.html".format(self.port)
+
+    def get_stats_url(self):
+        """Get raster statistics endpoint url."""
+        return "http://127.0.0.1:{}/stats".format(self.port)
+
+    def get_metrics_url(self):
+        """Get server metrics endpoint url."""
+        return "http://127.0.0.1:{}/metrics".format(self.port)
+
+    def get_tilejson_url(self):
+        """Get TileJSON endpoint url."""
+        return "http://127.0.0.1:{}/tilejson.json".format(self.port)
+
+    def get_preview_url(self):
+        """Get raster preview image url."""
+        tileformat = "jpg" if self.tiles_format == "jpeg" else self.tiles_format
+        return "http://127.0.0.1:{}/preview.{}".format(self.port, tileformat)
+
     def get_bounds(self):
         """Get RasterTiles bounds."""
         return self.raster.get_bounds()
@@ -134,10 +422,54 @@ class TileServer(object):
         """Get RasterTiles center."""
         return self.raster.get_center()
 
-    def start(self):
-        """Start tile server."""
+    def _invalidate(self, source, bounds):
+        """Remove cached tiles and previews of changed source extents."""
+        # NOTE: The tile cache can fail (e.g. locked), in-memory caches are
+        # cleared first. The raster identity changes if it fails
+        if self.arrays:
+            self.arrays.invalidate(bounds)
+        self.previews.clear()
+        self.expression_scales.clear()
+        if self.cache:
+            self.cache.invalidate(source, bounds)
+
+    def _create_server(self):
+        return HTTPServer(
+            self.app,
+            no_keep_alive=not self.keep_alive,
+            idle_connection_timeout=self.idle_timeout,
+        )
+
+    def start(self, background=False):
+        """
+        Start tile server.
+
+        Attributes
+        ----------
+        background : bool, optional (default: False)
+            Serve from a dedicated thread with its own IOLoop and return
+            immediately (e.g. in a Jupyter notebook, so tile requests do not
+            compete with the kernel event loop). Use `stop()` to shut it down.
+
+        """
+        if background:
+            return self._start_background()
+
         is_running = IOLoop.initialized()
-        self.server = HTTPServer(self.app)
+        self.server = self._create_server()
+
+        if self.processes != 1:
+            if is_running:
+                raise Exception("Cannot fork worker processes with a running IOLoop")
+
+            # NOTE: Workers are forked after binding and share the listening
+            # socket. Nothing has been read through the executor yet, so each
+            # worker opens its own dataset handles and cache connections.
+            self.server.bind(self.port)
+            self.server.start(self.processes)
+            IOLoop.current().start()
+            return
+
         self.server.listen(self.port)
 
         # NOTE: Check if there is already one server in place
@@ -147,11 +479,71 @@ class TileServer(object):
         if not is_running:
             IOLoop.current().start()
 
+    def _start_background(self):
+        if self.processes != 1:
+            raise Exception("Cannot fork worker processes in background mode")
+
+        if self.thread is not None and self.thread.is_alive():
+            raise Exception("Tile server is already running")
+
+        started = threading.Event()
+        errors = []
+
+        def serve():
+            loop = IOLoop(make_current=True)
+            try:
+                self.server = self._create_server()
+                self.server.listen(self.port)
+            except Exception as e:
+                errors.append(e)
+                loop.close(all_fds=True)
+                started.set()
+                return
+
+            self.loop = loop
+            started.set()
+            loop.start()
+            loop.close(all_fds=True)
+
+        self.thread = threading.Thread(
+            target=serve, name="rio-glui-{}".format(self.port)
+        )
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait()
+        if errors:
+            self.thread = None
+            raise errors[0]
+
     def stop(self):
-        """Stop tile server."""
-        if self.server:
+        """Stop tile server, its reader threads and dataset handles."""
+        if self.loop is not None:
+            loop, self.loop = self.loop, None
+
+            @gen.coroutine
+            def shutdown():
+                self.server.stop()
+                yield self.server.close_all_connections()
+                loop.stop()
+
+            loop.add_callback(shutdown)
+            self.thread.join()
+            self.thread = None
+        elif self.server:
             self.server.stop()
 
+        self.executor.shutdown(wait=True)
+
+        if self.counter:
+            self.counter.uninstall()
+
+        if hasattr(self.raster, "remove_listener"):
+            self.raster.remove_listener(self._invalidate)
+
+        close = getattr(self.raster, "close", None)
+        if close:
+            close()
+
 
 class InvalidAddress(web.RequestHandler):
     """Invalid web requests handler."""
@@ -169,6 +561,33 @@ class RasterTileHandler(web.RequestHandler):
     ----------
     raster : RasterTiles
         Rastertiles object.
+    scale : tuple, optional
+        Min and Max data bounds to rescale data from.
+    colormap : numpy.ndarray, optional
+        (256, 4) RGBA lookup table.
+    cache : TileCache, optional
+        Persistent tile cache.
+    metrics : TileMetrics, optional
+        Tile requests counters.
+    chunk_size : int, optional (default: 65536)
+        Tiles larger than `chunk_size` bytes are flushed in chunks.
+    arrays : ArrayCache, optional
+        In-memory raw tile arrays cache.
+    pyramid : bool, optional (default: False)
+        Build tiles from their four cached (z + 1) children when available.
+    counter : HTTPRequestCounter, optional
+        GDAL HTTP requests counter.
+    executor : concurrent.futures.Executor, optional
+        Tile reading and rendering threads (default: a shared pool).
+    slow : SlowTiles, optional
+        Recent tiles timings.
+    load : LoadMonitor, optional
+        Tiles in flight and latency monitor, degrading tiles under load.
+    expression_scales : OrderedDict, optional
+        In-memory default scales of expressions.
+    read_options : frozenset, optional
+        `raster.read_tile` keyword options (`tilesize`, `out`) the reader
+        accepts (default: read from its signature).
 
     Methods
     -------
@@ -181,74 +600,1159 @@ class RasterTileHandler(web.RequestHandler):
 
     executor = futures.ThreadPoolExecutor(max_workers=16)
 
-    def initialize(self, raster, scale=None, colormap=None):
+    def initialize(
+        self,
+        raster,
+        scale=None,
+        colormap=None,
+        cache=None,
+        metrics=None,
+        chunk_size=64 * 1024,
+        arrays=None,
+        pyramid=False,
+        counter=None,
+        executor=None,
+        slow=None,
+        load=None,
+        expression_scales=None,
+        read_options=None,
+    ):
         """Initialize tiles handler."""
+        if executor is not None:
+            self.executor = executor
         self.raster = raster
         self.scale = scale
         self.colormap = colormap
+        self.cache = cache
+        self.metrics = metrics
+        self.chunk_size = chunk_size
+        self.arrays = arrays
+        self.pyramid = pyramid
+        self.counter = counter
+        self.slow = slow
+        self.load = load
+        self.expression_scales = (
+            expression_scales if expression_scales is not None else OrderedDict()
+        )
+        self.read_options = (
+            read_options
+            if read_options is not None
+            else _read_options(raster.read_tile)
+        )
+        self.degraded = ()
+        self.http_requests = 0
+        self.cache_hit = False
+        self.tile_size = 0
+        self.timer = None
+        self.tile_params = None
+
+    def _get_cache_key(
+        self,
+        source,
+        z,
+        x,
+        y,
+        tileformat,
+        tilesize,
+        color_ops=None,
+        expression=None,
+        rescale=None,
+    ):
+        colormap = None
+        if self.colormap is not None:
+            colormap = hashlib.sha1(self.colormap.tobytes()).hexdigest()
+
+        return tile_key(
+            source,
+            z,
+            x,
+            y,
+            tileformat=tileformat,
+            color_ops=color_ops,
+            scale=self.scale,
+            colormap=colormap,
+            indexes=self.raster.indexes,
+            nodata=self.raster.nodata,
+            tiles_size=tilesize,
+            expr=expression.expr if expression else None,
+            rescale=rescale,
+        )
 
-    def _apply_color_operations(self, img, color_ops):
-        for ops in parse_operations(color_ops):
-            img = scale_dtype(ops(to_math_type(img)), numpy.uint8)
+    def _get_scale(self, nbands, scale=None):
+        scale = scale or self.scale
+        if scale and len(scale) != nbands:
+            scale = scale * nbands
+        return scale
+
+    def _render(self, data, mask, tileformat, color_ops=None, scale=None, level=None):
+        scale = scale or self.scale
+        options = dict(zlevel=level) if level and tileformat == "png" else {}
+        if (
+            not scale
+            and not color_ops
+            and self.colormap is None
+            and data.dtype == numpy.uint8
+        ):
+            return encode_image(data, mask, tileformat, **options)
+
+        # NOTE: Colormapped tiles have at most 256 colors, PNG tiles are
+        # written with the colormap as palette (8-bit indexes)
+        if self.colormap is not None and tileformat == "png":
+            index, valid = render_index(
+                data, mask, scale=self._get_scale(1, scale), color_ops=color_ops
+            )
+            tile = encode_indexed_png(index, valid, self.colormap, level=level or 6)
+            if tile is not None:
+                return tile
+
+        nbands = 1 if self.colormap is not None else data.shape[0]
+        rgba = render_tile(
+            data,
+            mask,
+            scale=self._get_scale(nbands, scale),
+            color_ops=color_ops,
+            colormap=self.colormap,
+        )
+        return encode_image(rgba[:-1], rgba[-1], tileformat, **options)
+
+    def _get_tilesize(self, scale=None):
+        try:
+            tilesize = int(self.get_argument("tilesize", self.raster.tiles_size))
+        except ValueError:
+            raise web.HTTPError(400, "Invalid tilesize")
+
+        if scale:
+            tilesize *= int(scale)
+
+        if not MIN_TILE_SIZE <= tilesize <= MAX_TILE_SIZE:
+            raise web.HTTPError(
+                400,
+                "Tile size must be between {} and {}".format(
+                    MIN_TILE_SIZE, MAX_TILE_SIZE
+                ),
+            )
 
-        return img
+        return tilesize
 
-    @run_on_executor
-    def _get_tile(self, z, x, y, tileformat, color_ops=None):
-        if tileformat == "jpg":
-            tileformat = "jpeg"
+    @gen.coroutine
+    def _get_expression(self):
+        expr = self.get_argument("expr", None)
+        if not expr:
+            raise gen.Return(None)
+
+        # NOTE: New expressions are compiled in a reader thread, so a slow
+        # compilation does not block the IOLoop
+        expression = get_expression(expr, cached=True)
+        if expression is None:
+            future = self.executor.submit(get_expression, expr)
+            try:
+                expression = yield future
+            except EXPRESSION_ERRORS as e:
+                raise web.HTTPError(400, str(e))
+
+        if expression.bands[-1] > self.raster.meta["count"]:
+            raise web.HTTPError(
+                400, "Invalid band index in expression: {}".format(expr)
+            )
 
-        if not self.raster.tile_exists(z, x, y):
-            raise web.HTTPError(404)
+        raise gen.Return(expression)
 
-        data, mask = self.raster.read_tile(z, x, y)
+    @gen.coroutine
+    def _get_expression_scale(self, expression):
+        """
+        Get the default scale of expression output bands.
+
+        Expression outputs do not have the raster bands range: they are
+        rescaled from the 2-98 percentiles of the expression evaluated over
+        a low resolution read of the whole raster, so all tiles and images
+        of an expression share one scale.
+        """
+        key = (expression.expr, getattr(self.raster, "generation", None))
+        scale = self.expression_scales.pop(key, None)
+        if scale is None:
+            scale = yield self.executor.submit(self._read_expression_scale, expression)
+
+        # NOTE: Scales are only cached from the IOLoop thread
+        self.expression_scales[key] = scale
+        while len(self.expression_scales) > MAX_EXPRESSION_SCALES:
+            self.expression_scales.popitem(last=False)
+
+        raise gen.Return(scale)
+
+    def _read_expression_scale(self, expression):
+        bounds = list(self.raster.get_bounds())
+        bounds[1] = max(bounds[1], -MAX_LATITUDE)
+        bounds[3] = min(bounds[3], MAX_LATITUDE)
+        width, height = self._get_shape(bounds, EXPRESSION_SCALE_SIZE)
+        data, mask = self.raster.read_bbox(
+            bounds, width, height, indexes=expression.bands
+        )
+        data, mask = self._evaluate(data, mask, expression)
+
+        scale = []
+        for band in data:
+            values = band[mask != 0]
+            stats = dict(pc=None, min=None, max=None)
+            if values.size:
+                stats = dict(
+                    pc=numpy.percentile(values, (2, 98)).tolist(),
+                    min=float(values.min()),
+                    max=float(values.max()),
+                )
+            scale.append(_default_scale(stats, numpy.float32))
+
+        return tuple(scale)
+
+    @staticmethod
+    def _get_shape(bounds, max_size):
+        west, south = mercantile.xy(bounds[0], bounds[1])
+        east, north = mercantile.xy(bounds[2], bounds[3])
+        ratio = (north - south) / (east - west)
+        if ratio <= 1:
+            return max_size, max(1, int(round(max_size * ratio)))
+        return max(1, int(round(max_size / ratio))), max_size
+
+    def _get_rescale(self):
+        rescale = self.get_argument("rescale", None)
+        if not rescale:
+            return None
+
+        try:
+            vmin, vmax = [float(v) for v in rescale.split(",")]
+            assert vmax > vmin
+        except (ValueError, AssertionError):
+            raise web.HTTPError(400, "Invalid rescale (expected 'min,max')")
+
+        return ((vmin, vmax),)
+
+    def _read_tile(self, z, x, y, tilesize):
+        if self.arrays:
+            tile = self.arrays.get(z, x, y, tilesize)
+            if tile is not None:
+                return tile
+
+            # NOTE: Derive the tile from a cached larger version (e.g. @2x)
+            tile = self.arrays.get_larger(z, x, y, tilesize)
+            if tile is not None:
+                data, mask = downsample(tile[0], tile[1], tile[0].shape[-1] // tilesize)
+                self.arrays.set(z, x, y, data, mask)
+                return data, mask
+
+            # NOTE: Derive the tile from its cached (z + 1) children (e.g.
+            # when zooming out), falling back to a read if one is missing.
+            # Children are downsampled by 2, odd tile sizes are always read
+            if self.pyramid and tilesize % 2 == 0:
+                tiles = [
+                    self.arrays.get(cz, cx, cy, tilesize)
+                    for cz, cx, cy in children(z, x, y)
+                ]
+                if all(tile is not None for tile in tiles):
+                    data, mask = merge_children(tiles)
+                    self.arrays.set(z, x, y, data, mask)
+                    return data, mask
+
+        generation = getattr(self.raster, "generation", None)
+        data, mask = self._read_raster(z, x, y, tilesize)
+
+        # NOTE: Do not cache tiles read while the source changed
+        if self.arrays and getattr(self.raster, "generation", None) == generation:
+            self.arrays.set(z, x, y, data, mask)
+
+        return data, mask
+
+    def _read_coarse(self, z, x, y, tilesize, expression=None):
+        """Read a tile from a 2x coarser overview, upsampled (nearest)."""
+        if not expression and self.arrays:
+            tile = self.arrays.get(z, x, y, tilesize)
+            if tile is not None:
+                return tile
+
+        # NOTE: Half size reads use the next coarser overview. Upsampled
+        # arrays are not cached, they are not full quality
+        if expression:
+            data, mask = self._read_expression(z, x, y, tilesize // 2, expression)
+        else:
+            data, mask = self._read_raster(z, x, y, tilesize // 2)
+        data = data.repeat(2, axis=1).repeat(2, axis=2)
+        mask = mask.repeat(2, axis=0).repeat(2, axis=1)
+        return data, mask
+
+    def _read_raster(self, z, x, y, tilesize, indexes=None):
+        # NOTE: Only band math tiles override the band indexes, and options
+        # are only passed to readers accepting them, so custom readers
+        # without these options keep working
+        options = dict(indexes=indexes) if indexes else {}
+        if "out" in self.read_options:
+            bands = indexes or self.raster.indexes
+            nbands = 1 if isinstance(bands, int) else len(bands)
+            options["out"] = arena.get(
+                "data", (nbands, tilesize, tilesize), self.raster.meta["dtype"]
+            )
+        if tilesize != self.raster.tiles_size:
+            if "tilesize" not in self.read_options:
+                raise web.HTTPError(
+                    400,
+                    "Raster tiles are {0}x{0} pixels only".format(
+                        self.raster.tiles_size
+                    ),
+                )
+            options["tilesize"] = tilesize
+        data, mask = self.raster.read_tile(z, x, y, **options)
 
         if len(data.shape) == 2:
             data = numpy.expand_dims(data, axis=0)
 
-        if self.scale:
-            nbands = data.shape[0]
-            scale = self.scale
-            if len(scale) != nbands:
-                scale = scale * nbands
-
-            for bdx in range(nbands):
-                data[bdx] = numpy.where(
-                    mask,
-                    linear_rescale(data[bdx], in_range=scale[bdx], out_range=[0, 255]),
-                    0,
-                )
+        return data, mask
 
-            data = data.astype(numpy.uint8)
+    def _read_expression(self, z, x, y, tilesize, expression):
+        data, mask = self._read_raster(z, x, y, tilesize, indexes=expression.bands)
+        return self._evaluate(data, mask, expression)
 
-        if color_ops:
-            data = self._apply_color_operations(data, color_ops)
+    def _evaluate(self, data, mask, expression):
+        data = expression.evaluate(data)
 
-        options = img_profiles.get(tileformat, {})
+        valid = numpy.isfinite(data).all(axis=0)
+        if not valid.all():
+            data[:, ~valid] = 0
+            mask = numpy.where(valid, mask, 0).astype(numpy.uint8)
 
-        return BytesIO(
-            array_to_image(
-                data,
-                mask=mask,
-                color_map=self.colormap,
-                img_format=tileformat,
-                **options
+        return data, mask
+
+    def _make_tile(
+        self,
+        z,
+        x,
+        y,
+        tileformat,
+        tilesize,
+        color_ops=None,
+        expression=None,
+        rescale=None,
+        timer=None,
+        degrade=(),
+    ):
+        """Get tile bytes, cache hit, GDAL HTTP requests and degradations applied."""
+        # NOTE: The timer is created when the tile is submitted, so the first
+        # stage is the time spent waiting for a reader thread
+        timer = timer or StageTimer()
+        timer.mark("queue")
+
+        if tileformat == "jpg":
+            tileformat = "jpeg"
+
+        if not self.raster.tile_exists(z, x, y):
+            raise web.HTTPError(404)
+
+        # NOTE: Counters are per thread, tiles are made in a single thread
+        if self.counter:
+            self.counter.reset()
+
+        # NOTE: Getting the source identity also checks for source changes
+        source = self.raster.get_source_id()
+        generation = getattr(self.raster, "generation", None)
+        if self.cache:
+            key = self._get_cache_key(
+                source,
+                z,
+                x,
+                y,
+                tileformat,
+                tilesize,
+                color_ops,
+                expression=expression,
+                rescale=rescale,
+            )
+            tile = self.cache.get(key)
+            timer.mark("cache")
+            if tile is not None:
+                return tile, True, 0, ()
+
+        # NOTE: Only applicable degradations are reported
+        degrade = tuple(
+            mode
+            for mode in degrade
+            if (
+                mode != "overview"
+                or (tilesize % 2 == 0 and "tilesize" in self.read_options)
+            )
+            and (mode != "color" or color_ops)
+            and (mode != "encoder" or tileformat in ["png", "npy", "terrain-rgb"])
+        )
+        if "color" in degrade:
+            color_ops = None
+
+        if "overview" in degrade:
+            data, mask = self._read_coarse(z, x, y, tilesize, expression=expression)
+        elif expression:
+            data, mask = self._read_expression(z, x, y, tilesize, expression)
+        else:
+            data, mask = self._read_tile(z, x, y, tilesize)
+        timer.mark("read")
+
+        level = FAST_ZLEVEL if "encoder" in degrade else None
+        if tileformat == "npy":
+            tile = encode_npy(data, mask, level=level or 6)
+        elif tileformat == "terrain-rgb":
+            # NOTE: Elevations are packed from the first band, hillshading is
+            # done by the client (Mapbox GL raster-dem source)
+            tile = encode_terrain_rgb(data[0], mask, level=level or 6)
+        else:
+            tile = self._render(
+                data, mask, tileformat, color_ops, scale=rescale, level=level
             )
+        timer.mark("render")
+
+        # NOTE: Only full quality tiles are cached
+        if (
+            self.cache
+            and not degrade
+            and getattr(self.raster, "generation", None) == generation
+        ):
+            self.cache.set(key, tile, source=source, z=z, x=x, y=y)
+            timer.mark("store")
+
+        return tile, False, self.counter.count() if self.counter else 0, degrade
+
+    @run_on_executor
+    def _get_tile(self, *args, **kwargs):
+        tile, self.cache_hit, self.http_requests, self.degraded = self._make_tile(
+            *args, **kwargs
         )
+        return BytesIO(tile)
 
     @gen.coroutine
-    def get(self, z, x, y, tileformat):
+    def get(self, z, x, y, scale, tileformat):
         """Retunrs tile data and header."""
         self.set_header("Access-Control-Allow-Origin", "*")
         self.set_header("Access-Control-Allow-Methods", "GET")
-        self.set_header("Content-Type", "image/{}".format(tileformat))
         self.set_header("Cache-Control", "no-store, no-cache, must-revalidate")
         color_ops = self.get_argument("color", None)
+        tilesize = self._get_tilesize(scale)
+        expression = yield self._get_expression()
+        rescale = self._get_rescale()
+
+        if tileformat == "npy":
+            color_ops = None
+            self.set_header("Content-Type", "application/octet-stream")
+            self.set_header("Content-Encoding", "deflate")
+            self.set_header(
+                "Access-Control-Expose-Headers",
+                "X-Tile-Dtype, X-Tile-Shape, X-HTTP-Requests, X-Tile-Degraded",
+            )
+        elif tileformat == "terrain-rgb":
+            color_ops = None
+            rescale = None
+            self.set_header("Content-Type", "image/png")
+        else:
+            self.set_header("Content-Type", "image/{}".format(tileformat))
+            if expression and not rescale:
+                rescale = yield self._get_expression_scale(expression)
+
+        if self.slow is not None:
+            self.timer = StageTimer()
+            self.tile_params = self._get_slow_params(
+                tileformat, tilesize, color_ops, expression, rescale
+            )
+
+        degrade = self.load.submit() if self.load else ()
+        try:
+            res = yield self._get_tile(
+                int(z),
+                int(x),
+                int(y),
+                tileformat,
+                tilesize,
+                color_ops=color_ops,
+                expression=expression,
+                rescale=rescale,
+                timer=self.timer,
+                degrade=degrade,
+            )
+        finally:
+            if self.load:
+                self.load.done(self.request.request_time())
+        tile = res.getvalue()
+        self.tile_size = len(tile)
+
+        if self.counter:
+            self.set_header("X-HTTP-Requests", str(self.http_requests))
+
+        if self.degraded:
+            self.set_header("X-Tile-Degraded", ",".join(self.degraded))
+
+        if tileformat == "npy":
+            dtype, shape = npy_info(tile)
+            self.set_header("X-Tile-Dtype", dtype.name)
+            self.set_header("X-Tile-Shape", ",".join(str(s) for s in shape))
+
+        # NOTE: Large tiles are sent in chunks (chunked transfer encoding) so
+        # the client starts receiving data before the whole body is written
+        if self.tile_size <= self.chunk_size:
+            self.write(tile)
+            return
+
+        for offset in range(0, self.tile_size, self.chunk_size):
+            self.write(tile[offset : offset + self.chunk_size])
+            yield self.flush()
+
+    def _get_slow_params(self, tileformat, tilesize, color_ops, expression, rescale):
+        return dict(
+            format=tileformat,
+            tilesize=tilesize,
+            color=color_ops,
+            expr=self.get_argument("expr", None) if expression else None,
+            rescale=rescale,
+        )
+
+    def _record_slow(self, tile, status, size, seconds, timer, **info):
+        info.update(self.tile_params or {})
+        self.slow.record(
+            seconds,
+            tile=list(tile),
+            status=status,
+            size=size,
+            stages=timer.stages if timer else {},
+            **info
+        )
+
+    def on_finish(self):
+        """Record tile request metrics."""
+        if self.metrics:
+            self.metrics.record(
+                self.get_status(),
+                self.tile_size,
+                self.request.request_time(),
+                cache_hit=self.cache_hit,
+                http_requests=self.http_requests,
+            )
+
+        if self.slow is not None:
+            self._record_slow(
+                [int(v) for v in self.path_args[:3]],
+                self.get_status(),
+                self.tile_size,
+                self.request.request_time(),
+                self.timer,
+                cache_hit=self.cache_hit,
+                http_requests=self.http_requests,
+                degraded=list(self.degraded),
+            )
+
+
+class TileBatchHandler(RasterTileHandler):
+    """
+    Multiple tiles requests handler.
+
+    Tiles listed in a JSON body (`{"tiles": [[z, x, y], ...], "format": "png",
+    "scale": 1}`) are made concurrently on the executor and streamed back in
+    the order they finish. Each tile is sent as a `BATCH_FRAME` header (z, x,
+    y, HTTP status and size, big-endian) followed by the tile bytes (the
+    single tile response body: image or deflate compressed NPY). Query
+    parameters (color, tilesize, expr, rescale) apply to all tiles. Degraded
+    tiles (see `LoadMonitor`) have a 203 status.
+
+    Methods
+    -------
+    post()
+        Stream tiles.
+
+    """
+
+    def _get_batch(self):
+        try:
+            body = json.loads(self.request.body.decode("utf-8"))
+            tiles = [tuple(int(v) for v in tile) for tile in body["tiles"]]
+            assert all(
+                len(tile) == 3
+                and 0 <= tile[0] <= 30
+                and 0 <= tile[1] < 2 ** tile[0]
+                and 0 <= tile[2] < 2 ** tile[0]
+                for tile in tiles
+            )
+            tileformat = body.get("format", "png")
+            assert tileformat in ["png", "jpg", "jpeg", "webp", "npy", "terrain-rgb"]
+            scale = int(body.get("scale", 1))
+        except (ValueError, KeyError, TypeError, AttributeError, AssertionError):
+            raise web.HTTPError(400, "Invalid batch request")
+
+        if not 0 < len(tiles) <= MAX_BATCH_TILES:
+            raise web.HTTPError(
+                400, "Batch must have 1 to {} tiles".format(MAX_BATCH_TILES)
+            )
+
+        return tiles, tileformat, scale
+
+    @gen.coroutine
+    def _get_batch_tile(self, *args, **kwargs):
+        degrade = self.load.submit() if self.load else ()
+        try:
+            # NOTE: Executor futures complete in the executor threads, yielding
+            # them resolves the batch tiles on the IOLoop thread
+            tile = yield self.executor.submit(
+                self._make_tile, *args, degrade=degrade, **kwargs
+            )
+        finally:
+            if self.load:
+                self.load.done(self.request.request_time())
+        raise gen.Return(tile)
+
+    def options(self):
+        """Allow cross-origin batch requests."""
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", "POST")
+        self.set_header("Access-Control-Allow-Headers", "Content-Type")
+        self.set_status(204)
+
+    @gen.coroutine
+    def post(self):
+        """Stream tiles in the order they finish."""
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", "POST")
+        self.set_header("Cache-Control", "no-store, no-cache, must-revalidate")
+        self.set_header("Content-Type", "application/octet-stream")
+        tiles, tileformat, scale = self._get_batch()
+        tilesize = self._get_tilesize(scale)
+        color_ops = (
+            self.get_argument("color", None)
+            if tileformat not in ["npy", "terrain-rgb"]
+            else None
+        )
+        expression = yield self._get_expression()
+        rescale = self._get_rescale() if tileformat != "terrain-rgb" else None
+        if expression and not rescale and tileformat not in ["npy", "terrain-rgb"]:
+            rescale = yield self._get_expression_scale(expression)
+
+        timers = [StageTimer() for _ in tiles] if self.slow is not None else None
+        if self.slow is not None:
+            self.tile_params = self._get_slow_params(
+                tileformat, tilesize, color_ops, expression, rescale
+            )
+
+        pending = [
+            self._get_batch_tile(
+                z,
+                x,
+                y,
+                tileformat,
+                tilesize,
+                color_ops=color_ops,
+                expression=expression,
+                rescale=rescale,
+                timer=timers[i] if timers else None,
+            )
+            for i, (z, x, y) in enumerate(tiles)
+        ]
+        wait = gen.WaitIterator(*pending)
+        while not wait.done():
+            cache_hit, http_requests, degraded = False, 0, ()
+            try:
+                tile, cache_hit, http_requests, degraded = yield wait.next()
+                status = 203 if degraded else 200
+            except web.HTTPError as e:
+                tile, status = b"", e.status_code
+            except Exception:
+                logger.exception("Could not make tile")
+                tile, status = b"", 500
+
+            z, x, y = tiles[wait.current_index]
+            self.write(BATCH_FRAME.pack(z, x, y, status, len(tile)))
+            self.write(tile)
+            self.tile_size += len(tile)
+            yield self.flush()
+
+            if self.metrics:
+                self.metrics.record(
+                    status,
+                    len(tile),
+                    self.request.request_time(),
+                    cache_hit=cache_hit,
+                    http_requests=http_requests,
+                )
+
+            if self.slow is not None:
+                self._record_slow(
+                    (z, x, y),
+                    status,
+                    len(tile),
+                    self.request.request_time(),
+                    timers[wait.current_index],
+                    cache_hit=cache_hit,
+                    http_requests=http_requests,
+                    degraded=list(degraded),
+                    batch=True,
+                )
+
+    def on_finish(self):
+        """Record batch errors (tiles are recorded when sent)."""
+        if self.metrics and self.get_status() != 200:
+            self.metrics.record(self.get_status(), 0, self.request.request_time())
+
+
+class BBoxHandler(RasterTileHandler):
+    """
+    Raster extent image handler.
+
+    Renders a (west, south, east, north) WGS84 extent as a Web Mercator image
+    with the tiles pipeline (scale, colormap, color, expr and rescale query
+    parameters). Images are `max_size` pixels (default: 1024) along their
+    longest side, read and rendered in strips of `STRIP_HEIGHT` rows: PNG
+    images are streamed as strips are encoded, other formats are encoded once
+    all strips are rendered.
+
+    Methods
+    -------
+    get()
+        Get extent image.
+
+    """
+
+    def _get_max_size(self):
+        try:
+            max_size = int(self.get_argument("max_size", 1024))
+        except ValueError:
+            raise web.HTTPError(400, "Invalid max_size")
+
+        if not MIN_TILE_SIZE <= max_size <= MAX_IMAGE_SIZE:
+            raise web.HTTPError(
+                400,
+                "Image size must be between {} and {}".format(
+                    MIN_TILE_SIZE, MAX_IMAGE_SIZE
+                ),
+            )
+
+        return max_size
+
+    @gen.coroutine
+    def _get_image_params(self, tileformat):
+        """Get image format, render parameters and number of bands (with alpha)."""
+        if tileformat not in ["png", "jpg", "jpeg", "webp"]:
+            raise web.HTTPError(400, "Invalid image format: {}".format(tileformat))
+
+        expression = yield self._get_expression()
+        if self.colormap is not None:
+            bands = 3
+        else:
+            bands = expression.count if expression else len(self.raster.indexes)
+        if bands not in [1, 3]:
+            raise web.HTTPError(400, "Images must have 1 or 3 bands")
+
+        rescale = self._get_rescale()
+        if expression and not rescale:
+            rescale = yield self._get_expression_scale(expression)
+
+        params = dict(
+            color_ops=self.get_argument("color", None),
+            expression=expression,
+            rescale=rescale,
+        )
+        tileformat = "jpeg" if tileformat == "jpg" else tileformat
+        raise gen.Return((tileformat, params, bands + 1))
+
+    def _render_strip(
+        self, bounds, width, height, row, color_ops=None, expression=None, rescale=None
+    ):
+        from rasterio.windows import Window
+
+        window = Window(0, row, width, min(STRIP_HEIGHT, height - row))
+        options = dict(indexes=expression.bands) if expression else {}
+        data, mask = self.raster.read_bbox(
+            bounds, width, height, window=window, **options
+        )
+        if expression:
+            data, mask = self._evaluate(data, mask, expression)
+
+        nbands = 1 if self.colormap is not None else data.shape[0]
+        return render_tile(
+            data,
+            mask,
+            scale=self._get_scale(nbands, rescale),
+            color_ops=color_ops,
+            colormap=self.colormap,
+        )
 
-        res = yield self._get_tile(
-            int(z), int(x), int(y), tileformat, color_ops=color_ops
+    def _encode_strip(self, encoder, *args, **kwargs):
+        return encoder.write(self._render_strip(*args, **kwargs))
+
+    def _make_image(self, bounds, width, height, tileformat, bands, **params):
+        """Get image bytes (rendered in strips)."""
+        rows = range(0, height, STRIP_HEIGHT)
+        if tileformat == "png":
+            encoder = PNGEncoder(width, height, bands)
+            parts = [encoder.start()]
+            for row in rows:
+                parts.append(
+                    self._encode_strip(encoder, bounds, width, height, row, **params)
+                )
+            parts.append(encoder.finish())
+            return b"".join(parts)
+
+        image = numpy.empty((bands, height, width), dtype=numpy.uint8)
+        for row in rows:
+            image[:, row : row + STRIP_HEIGHT] = self._render_strip(
+                bounds, width, height, row, **params
+            )
+        return encode_image(image[:-1], image[-1], tileformat)
+
+    def _write_headers(self, tileformat):
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", "GET")
+        self.set_header("Cache-Control", "no-store, no-cache, must-revalidate")
+        self.set_header(
+            "Content-Type",
+            "image/{}".format("jpeg" if tileformat == "jpg" else tileformat),
+        )
+
+    @gen.coroutine
+    def get(self, west, south, east, north, tileformat):
+        """Return extent image."""
+        self._write_headers(tileformat)
+        try:
+            bounds = [float(v) for v in (west, south, east, north)]
+            assert -180 <= bounds[0] < bounds[2] <= 180
+            assert -MAX_LATITUDE <= bounds[1] < bounds[3] <= MAX_LATITUDE
+        except (ValueError, AssertionError):
+            raise web.HTTPError(400, "Invalid bbox")
+
+        tileformat, params, bands = yield self._get_image_params(tileformat)
+        width, height = self._get_shape(bounds, self._get_max_size())
+
+        raster_bounds = self.raster.get_bounds()
+        if (
+            bounds[0] >= raster_bounds[2]
+            or bounds[2] <= raster_bounds[0]
+            or bounds[1] >= raster_bounds[3]
+            or bounds[3] <= raster_bounds[1]
+        ):
+            raise web.HTTPError(404)
+
+        if tileformat != "png":
+            image = yield self.executor.submit(
+                self._make_image, bounds, width, height, tileformat, bands, **params
+            )
+            self.write(image)
+            return
+
+        # NOTE: Strips are rendered one at a time and sent as soon as they are
+        # encoded, so memory use does not depend on the image size
+        encoder = PNGEncoder(width, height, bands)
+        self.write(encoder.start())
+        for row in range(0, height, STRIP_HEIGHT):
+            chunk = yield self.executor.submit(
+                self._encode_strip, encoder, bounds, width, height, row, **params
+            )
+            self.write(chunk)
+            yield self.flush()
+        self.write(encoder.finish())
+
+
+class PreviewHandler(BBoxHandler):
+    """
+    Raster preview image handler.
+
+    Renders the whole raster (see `BBoxHandler`), read from its coarsest
+    suitable overview. Previews are cached in memory (`MAX_PREVIEWS` latest)
+    and in the tile cache.
+
+    Attributes
+    ----------
+    previews : OrderedDict, optional
+        In-memory previews cache.
+
+    Methods
+    -------
+    get()
+        Get raster preview image.
+
+    """
+
+    def initialize(self, previews=None, **kwargs):
+        """Initialize preview handler."""
+        super(PreviewHandler, self).initialize(**kwargs)
+        self.previews = previews if previews is not None else OrderedDict()
+
+    def _get_preview(self, source, key, generation, *args, **kwargs):
+        if self.cache:
+            image = self.cache.get(key)
+            if image is not None:
+                return image
+
+        image = self._make_image(*args, **kwargs)
+        if self.cache and getattr(self.raster, "generation", None) == generation:
+            self.cache.set(key, image, source=source)
+
+        return image
+
+    @gen.coroutine
+    def get(self, tileformat):
+        """Return raster preview image."""
+        self._write_headers(tileformat)
+        tileformat, params, bands = yield self._get_image_params(tileformat)
+        max_size = self._get_max_size()
+        source = self.raster.get_source_id()
+        generation = getattr(self.raster, "generation", None)
+        bounds = list(self.raster.get_bounds())
+        bounds[1] = max(bounds[1], -MAX_LATITUDE)
+        bounds[3] = min(bounds[3], MAX_LATITUDE)
+        width, height = self._get_shape(bounds, max_size)
+
+        key = self._get_cache_key(
+            source, None, None, None, tileformat, max_size, **params
+        )
+        image = self.previews.pop(key, None)
+        if image is None:
+            image = yield self.executor.submit(
+                self._get_preview,
+                source,
+                key,
+                generation,
+                bounds,
+                width,
+                height,
+                tileformat,
+                bands,
+                **params
+            )
+
+        # NOTE: Previews are only cached from the IOLoop thread
+        if getattr(self.raster, "generation", None) == generation:
+            self.previews[key] = image
+            while len(self.previews) > MAX_PREVIEWS:
+                self.previews.popitem(last=False)
+
+        self.write(image)
+
+
+class StatsHandler(web.RequestHandler):
+    """
+    RasterTiles statistics handler.
+
+    Attributes
+    ----------
+    raster : RasterTiles
+        Rastertiles object.
+    executor : concurrent.futures.Executor, optional
+        Statistics threads (default: the shared tiles pool).
+
+    Methods
+    -------
+    initialize()
+        Initialize statistics handler.
+    get()
+        Get raster statistics.
+
+    """
+
+    executor = RasterTileHandler.executor
+
+    def initialize(self, raster, executor=None):
+        """Initialize statistics handler."""
+        self.raster = raster
+        if executor is not None:
+            self.executor = executor
+
+    @run_on_executor
+    def _get_stats(self):
+        stats = self.raster.get_stats()
+        return dict(
+            bounds=self.raster.get_bounds(),
+            statistics={str(bdx): value for bdx, value in stats.items()},
         )
-        self.write(res.getvalue())
+
+    @gen.coroutine
+    def get(self):
+        """Retunrs raster statistics."""
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", "GET")
+        res = yield self._get_stats()
+        self.write(res)
+
+
+class PointHandler(web.RequestHandler):
+    """
+    RasterTiles point values handler.
+
+    Attributes
+    ----------
+    raster : RasterTiles
+        Rastertiles object.
+    executor : concurrent.futures.Executor, optional
+        Reading threads (default: the shared tiles pool).
+
+    Methods
+    -------
+    initialize()
+        Initialize point handler.
+    get()
+        Get raster values at a lon/lat point.
+
+    """
+
+    executor = RasterTileHandler.executor
+
+    def initialize(self, raster, executor=None):
+        """Initialize point handler."""
+        self.raster = raster
+        if executor is not None:
+            self.executor = executor
+
+    @run_on_executor
+    def _sample(self, coords):
+        data, mask = self.raster.sample(coords)
+        values = data.T.tolist()
+        return dict(
+            bands=list(self.raster.indexes),
+            values=[v if valid else None for v, valid in zip(values, mask)],
+        )
+
+    def _write_cors(self, methods):
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", methods)
+
+    @gen.coroutine
+    def get(self):
+        """Return raster values (or null outside data) at a point."""
+        self._write_cors("GET")
+        try:
+            coords = [float(self.get_argument("lon")), float(self.get_argument("lat"))]
+        except ValueError:
+            raise web.HTTPError(400, "Invalid coordinates")
+
+        res = yield self._sample([coords])
+        self.write(
+            dict(coordinates=coords, bands=res["bands"], values=res["values"][0])
+        )
+
+
+class PointsHandler(PointHandler):
+    """
+    RasterTiles multiple points values handler.
+
+    Points are listed in a JSON body (`{"coordinates": [[lon, lat], ...]}`)
+    and values are returned in the same order (null outside data).
+
+    Methods
+    -------
+    post()
+        Get raster values at lon/lat points.
+
+    """
+
+    def _get_coordinates(self):
+        try:
+            body = json.loads(self.request.body.decode("utf-8"))
+            coords = [[float(v) for v in point] for point in body["coordinates"]]
+            assert all(len(point) == 2 for point in coords)
+        except (ValueError, KeyError, TypeError, AttributeError, AssertionError):
+            raise web.HTTPError(400, "Invalid points request")
+
+        if not 0 < len(coords) <= MAX_POINTS:
+            raise web.HTTPError(
+                400, "Request must have 1 to {} points".format(MAX_POINTS)
+            )
+
+        return coords
+
+    def options(self):
+        """Allow cross-origin points requests."""
+        self._write_cors("POST")
+        self.set_header("Access-Control-Allow-Headers", "Content-Type")
+        self.set_status(204)
+
+    @gen.coroutine
+    def post(self):
+        """Return raster values at points."""
+        self._write_cors("POST")
+        coords = self._get_coordinates()
+        res = yield self._sample(coords)
+        self.write(res)
+
+
+class MetricsHandler(web.RequestHandler):
+    """Tile server metrics handler (combined over all worker processes)."""
+
+    def initialize(self, metrics):
+        """Initialize metrics handler."""
+        self.metrics = metrics
+
+    def get(self):
+        """Retunrs server metrics."""
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", "GET")
+        self.write(self.metrics.summary())
+
+
+class ProfileHandler(web.RequestHandler):
+    """
+    Sampling profiler handler.
+
+    `/debug/profile?seconds=N` samples the stacks of the IOLoop thread and
+    of the tile reader threads for N seconds (1 to 60, default: 10) and
+    returns them in collapsed format (`format=collapsed`, for flame graphs)
+    or as a table of the functions with the most samples (`format=top`).
+    With several worker processes, only the process serving the request is
+    profiled.
+
+    """
+
+    # NOTE: Profiles are exclusive, overlapping profiles would share samples
+    active = threading.Lock()
+
+    def initialize(self, executor):
+        """Initialize profile handler."""
+        self.executor = executor
+
+    def _get_threads(self, loop_thread):
+        threads = set(t.ident for t in getattr(self.executor, "_threads", []))
+        threads.add(loop_thread)
+        return threads
+
+    @gen.coroutine
+    def get(self):
+        """Return a profile of the next N seconds."""
+        try:
+            seconds = float(self.get_argument("seconds", 10))
+            assert 1 <= seconds <= 60
+        except (ValueError, AssertionError):
+            raise web.HTTPError(400, "seconds must be between 1 and 60")
+
+        output = self.get_argument("format", "collapsed")
+        if output not in ["collapsed", "top"]:
+            raise web.HTTPError(400, "format must be 'collapsed' or 'top'")
+
+        if not self.active.acquire(False):
+            raise web.HTTPError(409, "A profile is already running")
+
+        loop_thread = threading.current_thread().ident
+        profiler = SamplingProfiler(threads=lambda: self._get_threads(loop_thread))
+        try:
+            profiler.start()
+            yield gen.sleep(seconds)
+        finally:
+            profiler.stop()
+            self.active.release()
+
+        self.set_header("Content-Type", "text/plain; charset=utf-8")
+        self.set_header("Cache-Control", "no-store")
+        self.write(profiler.top() if output == "top" else profiler.collapsed())
+
+
+class SlowTilesHandler(web.RequestHandler):
+    """Slowest recent tiles handler (`/debug/slow?limit=20`)."""
+
+    def initialize(self, slow):
+        """Initialize slow tiles handler."""
+        self.slow = slow
+
+    def get(self):
+        """Return the slowest recent tiles."""
+        try:
+            limit = int(self.get_argument("limit", 20))
+        except ValueError:
+            raise web.HTTPError(400, "Invalid limit")
+
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Cache-Control", "no-store")
+        self.write(json.dumps(self.slow.slowest(limit)))
 
 
 class Template(web.RequestHandler):
@@ -258,6 +1762,8 @@ class Template(web.RequestHandler):
     ----------
     tiles_url : str
         Tiles endpoint url.
+    stats_url : str
+        Statistics endpoint url.
     tiles_bounds : tuple, list
         Tiles source bounds [maxlng, maxlat, minlng, minlat].
     gl_tiles_size: int
@@ -266,6 +1772,8 @@ class Template(web.RequestHandler):
         Tiles source minimun zoom level.
     gl_tiles_maxzoom : int
         Tiles source maximum zoom level.
+    terrain_url : str, optional
+        Terrain-RGB (elevation) tiles endpoint url.
 
     Methods
     -------
@@ -275,14 +1783,42 @@ class Template(web.RequestHandler):
     """
 
     def initialize(
-        self, tiles_url, tiles_bounds, gl_tiles_size, gl_tiles_minzoom, gl_tiles_maxzoom
+        self,
+        tiles_url,
+        stats_url,
+        tiles_bounds,
+        gl_tiles_size,
+        gl_tiles_minzoom,
+        gl_tiles_maxzoom,
+        terrain_url=None,
     ):
         """Initialize template handler."""
         self.tiles_url = tiles_url
+        self.stats_url = stats_url
         self.tiles_bounds = tiles_bounds
         self.gl_tiles_size = gl_tiles_size
         self.gl_tiles_minzoom = gl_tiles_minzoom
         self.gl_tiles_maxzoom = gl_tiles_maxzoom
+        self.terrain_url = terrain_url
+
+
+class TileJSONHandler(Template):
+    """TileJSON handler."""
+
+    def get(self):
+        """Retunrs TileJSON document."""
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", "GET")
+        self.write(
+            dict(
+                tilejson="2.1.0",
+                tiles=[self.tiles_url],
+                bounds=self.tiles_bounds,
+                minzoom=self.gl_tiles_minzoom,
+                maxzoom=self.gl_tiles_maxzoom,
+                tileSize=self.gl_tiles_size,
+            )
+        )
 
 
 class IndexTemplate(Template):
@@ -292,10 +1828,12 @@ class IndexTemplate(Template):
         """Get template."""
         params = dict(
             tiles_url=self.tiles_url,
+            stats_url=self.stats_url,
             tiles_bounds=self.tiles_bounds,
             gl_tiles_size=self.gl_tiles_size,
             gl_tiles_minzoom=self.gl_tiles_minzoom,
             gl_tiles_maxzoom=self.gl_tiles_maxzoom,
+            terrain_url=self.terrain_url,
         )
 
         self.render("templates/index.html", **params)
@@ -308,6 +1846,7 @@ class PlaygroundTemplate(Template):
         """Get template."""
         params = dict(
             tiles_url=self.tiles_url,
+            stats_url=self.stats_url,
             tiles_bounds=self.tiles_bounds,
             gl_tiles_size=self.gl_tiles_size,
             gl_tiles_minzoom=self.gl_tiles_minzoom,
@@ -315,3 +1854,28 @@ class PlaygroundTemplate(Template):
         )
 
         self.render("templates/playground.html", **params)
+
+
+class ClientTemplate(Template):
+    """Client-side rendering template (raw NPY tiles rendered with WebGL)."""
+
+    def initialize(self, scale=None, colormap=None, **kwargs):
+        """Initialize template handler."""
+        super(ClientTemplate, self).initialize(**kwargs)
+        self.scale = scale
+        self.colormap = colormap
+
+    def get(self):
+        """Get template."""
+        params = dict(
+            tiles_url=self.tiles_url,
+            stats_url=self.stats_url,
+            tiles_bounds=self.tiles_bounds,
+            gl_tiles_size=self.gl_tiles_size,
+            gl_tiles_minzoom=self.gl_tiles_minzoom,
+            gl_tiles_maxzoom=self.gl_tiles_maxzoom,
+            scale=self.scale,
+            colormap=self.colormap,
+        )
+
+        self.render("templates/client.html", **params)
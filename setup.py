@@ -20,6 +20,7 @@ inst_reqs = ["tornado==4.5.3", "rio-tiler~=1.0", "click", "rio-color"]
 extra_reqs = {
     "test": ["mock", "pytest", "pytest-cov"],
     "dev": ["pytest", "pytest-cov", "pre-commit"],
+    "numexpr": ["numexpr"],
 }
 
 
@@ -49,5 +50,7 @@ setup(
     entry_points="""
       [rasterio.rio_plugins]
       glui=rio_glui.scripts.cli:glui
+      glui-loadtest=rio_glui.scripts.cli:loadtest
+      glui-inspect=rio_glui.scripts.cli:inspect
       """,
 )
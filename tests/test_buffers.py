@@ -0,0 +1,48 @@
+"""tests rio_glui.buffers."""
+
+import threading
+
+import numpy
+
+from rio_glui.buffers import BufferArena
+
+
+def test_arena_reuse():
+    """Should reuse arrays per key and thread."""
+    arena = BufferArena()
+    a = arena.get("data", (3, 8, 8), numpy.uint8)
+    assert a.shape == (3, 8, 8)
+    assert a.dtype == numpy.uint8
+    assert arena.get("data", (3, 8, 8), numpy.uint8) is a
+    assert arena.get("data", (3, 8, 8), numpy.uint16) is not a
+    assert arena.get("data", (1, 8, 8), numpy.uint8) is not a
+    assert arena.get("work", (3, 8, 8), numpy.uint8) is not a
+    assert arena.nbytes() == 3 * 64 + 3 * 128 + 64 + 3 * 64
+
+    out = []
+    t = threading.Thread(
+        target=lambda: out.append(arena.get("data", (3, 8, 8), numpy.uint8))
+    )
+    t.start()
+    t.join()
+    assert out[0] is not a
+
+    arena.clear()
+    assert arena.nbytes() == 0
+
+
+def test_arena_cap():
+    """Should release least recently used arrays over the cap."""
+    arena = BufferArena(max_bytes=1000)
+    a = arena.get("a", (400,), numpy.uint8)
+    b = arena.get("b", (400,), numpy.uint8)
+    assert arena.get("a", (400,), numpy.uint8) is a
+
+    arena.get("c", (400,), numpy.uint8)
+    assert arena.nbytes() == 800
+    assert arena.get("a", (400,), numpy.uint8) is a
+    assert arena.get("b", (400,), numpy.uint8) is not b
+
+    big = arena.get("big", (2000,), numpy.uint8)
+    assert arena.nbytes() == 2000
+    assert arena.get("big", (2000,), numpy.uint8) is big
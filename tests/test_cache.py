@@ -0,0 +1,221 @@
+"""tests rio_glui.cache."""
+
+import os
+import sqlite3
+import multiprocessing
+
+import numpy
+import mercantile
+from mock import patch
+
+from rio_glui.cache import TileCache, ArrayCache, tile_key, tile_range
+
+
+def test_tile_key():
+    """Should create stable keys depending on all parameters."""
+    key = tile_key("a.tif", 1, 2, 3, tileformat="png", scale=((0, 1),))
+    assert key == tile_key("a.tif", 1, 2, 3, scale=((0, 1),), tileformat="png")
+    assert key != tile_key("a.tif", 1, 2, 3, tileformat="jpg", scale=((0, 1),))
+    assert key != tile_key("b.tif", 1, 2, 3, tileformat="png", scale=((0, 1),))
+    assert key != tile_key("a.tif", 1, 2, 4, tileformat="png", scale=((0, 1),))
+
+
+def test_cache_get_set(tmpdir):
+    """Should store tiles and persist them across instances."""
+    path = str(tmpdir.join("cache", "tiles.db"))
+    cache = TileCache(path)
+    assert os.path.exists(path)
+    assert cache.get("a") is None
+
+    cache.set("a", b"tile", source="a.tif", z=1, x=0, y=0)
+    assert cache.get("a") == b"tile"
+    assert cache.size() == 4
+
+    assert TileCache(path).get("a") == b"tile"
+
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.size() == 0
+
+
+def test_cache_lru_eviction(tmpdir):
+    """Should evict least recently used tiles."""
+    cache = TileCache(str(tmpdir.join("tiles.db")), max_size=10)
+    cache.set("a", b"aaaa")
+    cache.set("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+
+    cache.set("c", b"cccc")
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"cccc"
+    assert cache.size() == 8
+
+    cache.set("d", b"d" * 11)
+    assert cache.get("d") is None
+
+
+def test_cache_size(tmpdir):
+    """Should keep the total size up to date."""
+    path = str(tmpdir.join("tiles.db"))
+    cache = TileCache(path)
+    cache.set("a", b"aaaa", source="a.tif", z=1, x=0, y=0)
+    cache.set("a", b"aa", source="a.tif", z=1, x=0, y=0)
+    cache.set("b", b"bbbb", source="b.tif", z=1, x=0, y=0)
+    assert cache.size() == 6
+
+    cache.invalidate("a.tif")
+    assert cache.size() == 4
+    assert TileCache(path).size() == 4
+
+
+@patch("rio_glui.cache.ATIME_BATCH", 2)
+def test_cache_atime_batch(tmpdir):
+    """Should write access times in batches."""
+    path = str(tmpdir.join("tiles.db"))
+    cache = TileCache(path)
+    cache.set("a", b"aaaa")
+    cache.set("b", b"bbbb")
+    db = sqlite3.connect(path)
+    atimes = dict(db.execute("SELECT key, atime FROM tiles"))
+
+    assert cache.get("a") == b"aaaa"
+    assert dict(db.execute("SELECT key, atime FROM tiles")) == atimes
+
+    assert cache.get("b") == b"bbbb"
+    new = dict(db.execute("SELECT key, atime FROM tiles"))
+    assert new["a"] > atimes["a"] and new["b"] > atimes["b"]
+
+
+def test_cache_locked(tmpdir):
+    """Should skip writes and miss reads while the cache is locked."""
+    path = str(tmpdir.join("tiles.db"))
+    cache = TileCache(path, timeout=0.1)
+    cache.set("a", b"aaaa")
+
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("BEGIN IMMEDIATE")
+    cache.set("b", b"bbbb")
+    db.execute("ROLLBACK")
+    assert cache.get("b") is None
+    assert cache.size() == 4
+
+    with patch.object(cache, "_connect") as connect:
+        connect.return_value.execute.side_effect = sqlite3.OperationalError(
+            "database is locked"
+        )
+        assert cache.get("a") is None
+
+
+def _fill(path, name):
+    cache = TileCache(path)
+    for i in range(50):
+        cache.set("{}-{}".format(name, i), name.encode() * 10)
+
+
+def test_cache_multiprocess(tmpdir):
+    """Should be safe to write from concurrent processes."""
+    path = str(tmpdir.join("tiles.db"))
+    TileCache(path)
+    procs = [
+        multiprocessing.Process(target=_fill, args=(path, name)) for name in "abcd"
+    ]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+
+    cache = TileCache(path)
+    assert cache.size() == 4 * 50 * 10
+    assert cache.get("c-49") == b"c" * 10
+
+
+def test_cache_invalidate(tmpdir):
+    """Should remove the tiles of a source intersecting extents."""
+    cache = TileCache(str(tmpdir.join("tiles.db")))
+    changed = mercantile.tile(10.5, 10.5, 12)
+    cache.set("changed", b"tile", source="a.tif", z=12, x=changed.x, y=changed.y)
+    cache.set("parent", b"tile", source="a.tif", z=0, x=0, y=0)
+    cache.set("far", b"tile", source="a.tif", z=12, x=0, y=0)
+    cache.set("other", b"tile", source="b.tif", z=12, x=changed.x, y=changed.y)
+    cache.set("preview", b"preview", source="a.tif")
+
+    cache.invalidate("a.tif", [[10.4, 10.4, 10.6, 10.6]])
+    for key in ["changed", "parent", "preview"]:
+        assert cache.get(key) is None
+    assert cache.get("far") == b"tile"
+    assert cache.get("other") == b"tile"
+
+    cache.invalidate("a.tif")
+    assert cache.get("far") is None
+    assert cache.get("other") == b"tile"
+
+
+def test_tile_range():
+    """Should include a one tile margin."""
+    tile = mercantile.tile(10.5, 10.5, 12)
+    assert tile_range([10.5, 10.5, 10.5, 10.5], 12) == (
+        tile.x - 1,
+        tile.x + 1,
+        tile.y - 1,
+        tile.y + 1,
+    )
+
+
+def test_array_cache():
+    """Should cache arrays per tile size."""
+    cache = ArrayCache()
+    data = numpy.ones((3, 4, 4), dtype=numpy.uint8)
+    mask = numpy.full((4, 4), 255, dtype=numpy.uint8)
+
+    assert cache.get(1, 2, 3, 4) is None
+    cache.set(1, 2, 3, data, mask)
+    cached_data, cached_mask = cache.get(1, 2, 3, 4)
+    numpy.testing.assert_array_equal(cached_data, data)
+    assert cached_data is not data
+    assert not cached_data.flags.writeable
+    assert cache.get(1, 2, 3, 8) is None
+    assert cache.size() == data.nbytes + mask.nbytes
+
+    assert cache.get_larger(1, 2, 3, 4) is None
+    assert cache.get_larger(1, 2, 3, 2)[0].shape == (3, 4, 4)
+    assert cache.get_larger(1, 2, 3, 3) is None
+
+    cache.clear()
+    assert cache.get(1, 2, 3, 4) is None
+    assert cache.size() == 0
+
+
+def test_array_cache_lru_eviction():
+    """Should evict least recently used arrays."""
+    data = numpy.ones((1, 10, 10), dtype=numpy.uint8)
+    mask = numpy.ones((10, 10), dtype=numpy.uint8)
+    cache = ArrayCache(max_size=450)
+
+    cache.set(0, 0, 0, data, mask)
+    cache.set(0, 0, 1, data, mask)
+    assert cache.get(0, 0, 0, 10) is not None
+
+    cache.set(0, 0, 2, data, mask)
+    assert cache.size() == 400
+    assert cache.get(0, 0, 1, 10) is None
+    assert cache.get(0, 0, 0, 10) is not None
+
+
+def test_array_cache_invalidate():
+    """Should remove the tiles intersecting extents."""
+    cache = ArrayCache()
+    data = numpy.zeros((3, 16, 16), dtype=numpy.uint8)
+    mask = numpy.zeros((16, 16), dtype=numpy.uint8)
+    changed = mercantile.tile(10.5, 10.5, 12)
+    cache.set(changed.z, changed.x, changed.y, data, mask)
+    cache.set(12, 0, 0, data, mask)
+
+    cache.invalidate([[10.4, 10.4, 10.6, 10.6]])
+    assert cache.get(changed.z, changed.x, changed.y, 16) is None
+    assert cache.get(12, 0, 0, 16) is not None
+    assert cache.size() == data.nbytes + mask.nbytes
+
+    cache.invalidate()
+    assert cache.size() == 0
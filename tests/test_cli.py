@@ -1,14 +1,17 @@
 """tests rio_glui.server."""
 
 import os
+import sys
+import json
 import pytest
+import subprocess
 
 import numpy
 from mock import patch
 
 from click.testing import CliRunner
 
-from rio_glui.scripts.cli import glui
+from rio_glui.scripts.cli import glui, loadtest, inspect
 
 raster_path = os.path.join(
     os.path.dirname(__file__), "fixtures", "16-21560-29773_small_ycbcr.tif"
@@ -80,6 +83,48 @@ def test_glui_valid_playground(launch, TileServer):
     assert result.exit_code == 0
 
 
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_valid_client(launch, TileServer):
+    """Should work as expected."""
+    TileServer.return_value.get_client_url.return_value = (
+        "http://127.0.0.1:8080/client.html"
+    )
+    TileServer.return_value.start.return_value = True
+
+    launch.return_value = True
+
+    runner = CliRunner()
+    result = runner.invoke(glui, [raster_path, "--client"])
+    TileServer.assert_called_once()
+    launch.assert_called_once_with("http://127.0.0.1:8080/client.html")
+    assert not result.exception
+    assert result.exit_code == 0
+
+
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_hillshade(launch, TileServer):
+    """Should launch the simple app with the hillshade layer."""
+    TileServer.return_value.get_template_url.return_value = (
+        "http://127.0.0.1:8080/index.html"
+    )
+    TileServer.return_value.start.return_value = True
+
+    launch.return_value = True
+
+    runner = CliRunner()
+    result = runner.invoke(
+        glui, [raster_path, "--hillshade", "--mapbox-token", "pk.afakemapboxtoken"]
+    )
+    TileServer.assert_called_once()
+    launch.assert_called_once_with(
+        "http://127.0.0.1:8080/index.html?hillshade=1&access_token=pk.afakemapboxtoken"
+    )
+    assert not result.exception
+    assert result.exit_code == 0
+
+
 @patch("rio_glui.server.TileServer")
 @patch("click.launch")
 def test_glui_validEnvToken(launch, TileServer, monkeypatch):
@@ -186,6 +231,54 @@ def test_glui_validScaleColorMap(launch, TileServer):
     assert result.exit_code == 0
 
 
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_colormapFile(launch, TileServer, tmpdir):
+    """Should accept LUT files and reject unknown colormaps."""
+    TileServer.return_value.get_template_url.return_value = (
+        "http://127.0.0.1:8080/index.html"
+    )
+    TileServer.return_value.start.return_value = True
+
+    launch.return_value = True
+
+    lut = str(tmpdir.join("lut.txt"))
+    with open(lut, "w") as f:
+        f.write("0 0 0 0\n255 255 255 255\n")
+
+    runner = CliRunner()
+    result = runner.invoke(glui, [raster_ndvi_path, "--colormap", lut])
+    assert not result.exception
+    assert TileServer.call_args[1]["colormap"] == lut
+
+    TileServer.reset_mock()
+    result = runner.invoke(glui, [raster_ndvi_path, "--colormap", "nocolormap"])
+    TileServer.assert_not_called()
+    assert result.exception
+    assert result.exit_code == 1
+
+
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_arrayCache(launch, TileServer):
+    """Should create the raw array cache unless disabled."""
+    TileServer.return_value.get_template_url.return_value = (
+        "http://127.0.0.1:8080/index.html"
+    )
+    TileServer.return_value.start.return_value = True
+
+    launch.return_value = True
+
+    runner = CliRunner()
+    result = runner.invoke(glui, [raster_path, "--array-cache-size", "16"])
+    assert not result.exception
+    assert TileServer.call_args[1]["arrays"].max_size == 16 * 1024 * 1024
+
+    result = runner.invoke(glui, [raster_path, "--array-cache-size", "0"])
+    assert not result.exception
+    assert TileServer.call_args[1]["arrays"] is None
+
+
 @patch("rio_glui.server.TileServer")
 @patch("click.launch")
 def test_glui_invalidScale(launch, TileServer):
@@ -300,3 +393,218 @@ def test_glui_validBadNodata(launch, TileServer):
     launch.assert_not_called()
     assert result.exception
     assert result.exit_code == 1
+
+
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_validCache(launch, TileServer, tmpdir):
+    """Should work as expected."""
+    TileServer.return_value.get_template_url.return_value = (
+        "http://127.0.0.1:8080/index.html"
+    )
+    TileServer.return_value.start.return_value = True
+
+    launch.return_value = True
+
+    cache_path = str(tmpdir.join("tiles.db"))
+    runner = CliRunner()
+    result = runner.invoke(
+        glui, [raster_path, "--cache", cache_path, "--cache-size", "1"]
+    )
+    TileServer.assert_called_once()
+    cache = TileServer.call_args[1]["cache"]
+    assert cache.path == cache_path
+    assert cache.max_size == 1024 * 1024
+    assert not result.exception
+    assert result.exit_code == 0
+
+
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_validProcesses(launch, TileServer):
+    """Should work as expected."""
+    TileServer.return_value.get_template_url.return_value = (
+        "http://127.0.0.1:8080/index.html"
+    )
+    TileServer.return_value.start.return_value = True
+
+    launch.return_value = True
+
+    runner = CliRunner()
+    result = runner.invoke(glui, [raster_path, "--processes", "4"])
+    TileServer.assert_called_once()
+    assert TileServer.call_args[1]["processes"] == 4
+    assert not result.exception
+    assert result.exit_code == 0
+
+    result = runner.invoke(glui, [raster_path, "--processes", "-1"])
+    assert result.exception
+    assert result.exit_code == 2
+
+
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_validGDALEnv(launch, TileServer, monkeypatch):
+    """Should work as expected."""
+    TileServer.return_value.get_template_url.return_value = (
+        "http://127.0.0.1:8080/index.html"
+    )
+    TileServer.return_value.start.return_value = True
+    monkeypatch.delenv("GDAL_CACHEMAX", raising=False)
+
+    launch.return_value = True
+
+    runner = CliRunner()
+    result = runner.invoke(
+        glui,
+        [
+            raster_path,
+            "--gdal-cachemax",
+            "256",
+            "--no-http-merge-ranges",
+            "--vsi-cache-size",
+            "0",
+            "--count-requests",
+        ],
+    )
+    TileServer.assert_called_once()
+    env = TileServer.call_args[0][0].env
+    assert env["GDAL_HTTP_MERGE_CONSECUTIVE_RANGES"] == "NO"
+    assert env["VSI_CACHE"] == "FALSE"
+    assert os.environ["GDAL_CACHEMAX"] == "256"
+    assert TileServer.call_args[1]["count_requests"]
+    assert not result.exception
+    assert result.exit_code == 0
+
+
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_degrade(launch, TileServer):
+    """Should create a load monitor from the degradation options."""
+    runner = CliRunner()
+    result = runner.invoke(
+        glui,
+        [raster_path, "--degrade-pending", "32", "--degrade-modes", "encoder,color"],
+    )
+    assert not result.exception
+    load = TileServer.call_args[1]["load"]
+    assert load.max_pending == 32
+    assert load.max_latency is None
+    assert load.modes == ("encoder", "color")
+
+    result = runner.invoke(glui, [raster_path])
+    assert TileServer.call_args[1]["load"] is None
+
+    result = runner.invoke(
+        glui, [raster_path, "--degrade-latency", "1", "--degrade-modes", "nearest"]
+    )
+    assert result.exit_code == 1
+
+
+@patch("rio_glui.server.TileServer")
+@patch("click.launch")
+def test_glui_validMosaic(launch, TileServer, tmpdir):
+    """Should work as expected."""
+    TileServer.return_value.get_template_url.return_value = (
+        "http://127.0.0.1:8080/index.html"
+    )
+    TileServer.return_value.start.return_value = True
+
+    launch.return_value = True
+
+    mosaic = str(tmpdir.join("mosaic.txt"))
+    with open(mosaic, "w") as f:
+        f.write("{}\n\n{}\n".format(raster_path, raster_path))
+
+    runner = CliRunner()
+    result = runner.invoke(glui, [mosaic, "--mosaic"])
+    TileServer.assert_called_once()
+    raster = TileServer.call_args[0][0]
+    assert raster.paths == [raster_path, raster_path]
+    assert not result.exception
+    assert result.exit_code == 0
+
+
+def test_loadtest_inprocess():
+    """Should run a load test against an in-process server."""
+    runner = CliRunner()
+    result = runner.invoke(
+        loadtest,
+        [raster_path, "--sessions", "2", "--steps", "2", "--viewport", "512", "512"],
+    )
+    assert not result.exception
+    assert result.exit_code == 0
+    report = json.loads(result.output[result.output.index("{\n") :])
+    assert report["requests"] > 0
+    assert report["errors"] == 0
+
+
+def test_loadtest_invalid():
+    """Should error without path or url."""
+    runner = CliRunner()
+    result = runner.invoke(loadtest, [])
+    assert result.exception
+    assert result.exit_code == 1
+
+
+def test_inspect():
+    """Should report the layout and flag slow files."""
+    runner = CliRunner()
+    result = runner.invoke(inspect, [raster_path])
+    assert result.exit_code == 0
+    assert "IFDs before data: False" in result.output
+    assert "Warnings:" in result.output
+
+    result = runner.invoke(inspect, [raster_path, "--strict"])
+    assert result.exit_code == 1
+
+    result = runner.invoke(
+        inspect, [raster_path, "--json", "--tiles-dimensions", "256"]
+    )
+    assert result.exit_code == 0
+    report = json.loads(result.output)
+    assert report["tiles_size"] == 256
+    assert len(report["levels"]) == 7
+
+    strips = os.path.join(
+        os.path.dirname(__file__), "fixtures", "16-21560-29773_small.tif"
+    )
+    result = runner.invoke(inspect, [strips])
+    assert result.exit_code == 1
+    assert "Raster is not tiled" in result.output
+
+
+IMPORT_BENCHMARK = """
+import sys, time
+start = time.time()
+import {module}
+print(time.time() - start)
+print(" ".join(sorted(m for m in {modules!r} if m in sys.modules)))
+"""
+
+
+def _import(module, modules):
+    """Import a module in a new interpreter, return seconds and heavy modules."""
+    out = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_BENCHMARK.format(module=module, modules=modules)]
+    )
+    seconds, imported = out.decode().split("\n")[:2]
+    return float(seconds), imported.split()
+
+
+def test_cli_import():
+    """Should import the rio plugin without the raster and server stacks."""
+    heavy = ("numpy", "rasterio", "rio_tiler", "rio_color", "tornado", "mercantile")
+    seconds, imported = _import("rio_glui.scripts.cli", heavy)
+    assert imported == []
+    assert seconds < 0.5
+
+    runner = CliRunner()
+    result = runner.invoke(glui, ["--help"])
+    assert result.exit_code == 0
+
+
+def test_server_import():
+    """Should import the tile server without rasterio and rio-tiler."""
+    _, imported = _import("rio_glui.server", ("rasterio", "rio_tiler"))
+    assert imported == []
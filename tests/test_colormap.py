@@ -0,0 +1,76 @@
+"""tests rio_glui.colormap."""
+
+import numpy
+import pytest
+
+from rio_tiler.utils import get_colormap
+
+from rio_glui.colormap import list_colormaps, get_lut, apply_lut
+
+
+def test_list_colormaps():
+    """Should list rio-tiler colormaps."""
+    names = list_colormaps()
+    assert "cfastie" in names
+    assert "schwarzwald" in names
+
+
+def test_get_lut_name():
+    """Should return a RGBA LUT from a rio-tiler colormap."""
+    lut = get_lut("cfastie")
+    assert lut.shape == (256, 4)
+    assert lut.dtype == numpy.uint8
+    numpy.testing.assert_array_equal(lut[:, :3], get_colormap("cfastie", format="gdal"))
+    assert (lut[:, 3] == 255).all()
+
+
+def test_get_lut_npy(tmpdir):
+    """Should read a .npy LUT file."""
+    path = str(tmpdir.join("lut.npy"))
+    cmap = numpy.zeros((256, 3), dtype=numpy.uint8)
+    cmap[:, 0] = numpy.arange(256)
+    numpy.save(path, cmap)
+
+    lut = get_lut(path)
+    assert lut.shape == (256, 4)
+    numpy.testing.assert_array_equal(lut[:, 0], numpy.arange(256))
+    assert (lut[:, 3] == 255).all()
+
+
+def test_get_lut_text(tmpdir):
+    """Should read a text LUT file."""
+    path = tmpdir.join("lut.txt")
+    path.write("# value r g b a\n0 255 0 0\n255 0 0 255 128\n")
+
+    lut = get_lut(str(path))
+    assert lut[0].tolist() == [255, 0, 0, 255]
+    assert lut[255].tolist() == [0, 0, 255, 128]
+    assert lut[1].tolist() == [0, 0, 0, 0]
+
+
+def test_get_lut_invalid(tmpdir):
+    """Should raise on invalid LUT files."""
+    path = tmpdir.join("lut.txt")
+    path.write("0 255 0\n")
+    with pytest.raises(ValueError):
+        get_lut(str(path))
+
+    path = str(tmpdir.join("lut.npy"))
+    numpy.save(path, numpy.zeros((10, 3), dtype=numpy.uint8))
+    with pytest.raises(ValueError):
+        get_lut(path)
+
+
+def test_apply_lut():
+    """Should map indexes to RGBA and combine alpha with the mask."""
+    lut = get_lut("cfastie")
+    index = numpy.array([[0, 100], [200, 255]], dtype=numpy.uint8)
+    mask = numpy.array([[True, False], [True, True]])
+
+    rgba = apply_lut(index, lut, mask=mask)
+    assert rgba.shape == (4, 2, 2)
+    numpy.testing.assert_array_equal(rgba[:3, 1, 0], lut[200, :3])
+    assert rgba[3].tolist() == [[255, 0], [255, 255]]
+
+    rgba = apply_lut(index, lut, mask=numpy.array([[255, 0], [0, 255]], numpy.uint8))
+    assert rgba[3].tolist() == [[255, 0], [0, 255]]
@@ -0,0 +1,130 @@
+"""tests rio_glui.diagnostics."""
+
+import os
+import json
+
+import pytest
+import rasterio
+from rasterio.shutil import copy
+
+from rio_glui.raster import RasterTiles
+from rio_glui.diagnostics import inspect_cog, format_report, _estimate_zoom
+
+fixtures = os.path.join(os.path.dirname(__file__), "fixtures")
+raster_path = os.path.join(fixtures, "16-21560-29773_small_ycbcr.tif")
+raster_ndvi_path = os.path.join(fixtures, "ndvi_cogeo.tif")
+raster_strips_path = os.path.join(fixtures, "16-21560-29773_small.tif")
+
+
+def _write_cog(path, **options):
+    """Write the fixture with the GDAL COG driver."""
+    with rasterio.open(raster_path) as src:
+        copy(src, path, driver="COG", **options)
+
+
+def test_inspect_cog(tmpdir):
+    """Should report levels, layout and tile estimates of a clean COG."""
+    path = str(tmpdir.join("cog.tif"))
+    _write_cog(path, blocksize=256, compress="deflate", overview_count=3)
+
+    report = inspect_cog(path)
+    assert report["errors"] == []
+    assert report["warnings"] == []
+    assert [level["decimation"] for level in report["levels"]] == [1, 2, 4, 8]
+    assert all(level["compression"] == "DEFLATE" for level in report["levels"])
+    assert report["levels"][0]["block_width"] == 256
+    assert report["levels"][0]["cols"] == 8
+    assert report["layout"] == dict(
+        ifds_first=True, ifds_ordered=True, data_ordered=True
+    )
+
+    raster = RasterTiles(path)
+    assert report["minzoom"] == raster.get_min_zoom()
+    assert report["maxzoom"] == raster.get_max_zoom()
+
+    zooms = report["zooms"]
+    assert [z["zoom"] for z in zooms] == list(
+        range(report["minzoom"], report["maxzoom"] + 1)
+    )
+    assert zooms[0]["level"] == 3
+    assert zooms[-1]["level"] == 0
+    assert all(z["blocks"] >= 1 and z["bytes"] > 0 for z in zooms)
+
+    json.dumps(report)
+    assert "No issues found" in format_report(report)
+
+
+def test_inspect_cog_layout():
+    """Should flag IFDs after the image data."""
+    report = inspect_cog(raster_path)
+    assert report["errors"] == []
+    assert not report["layout"]["ifds_first"]
+    assert any("IFDs are not all before" in w for w in report["warnings"])
+    assert report["levels"][0]["ifd_offset"] > report["levels"][0]["data_start"]
+
+
+def test_inspect_cog_small_blocks():
+    """Should flag zooms reading many small blocks."""
+    report = inspect_cog(raster_ndvi_path)
+    assert report["levels"][0]["block_width"] == 64
+    assert any(w.startswith("Zoom 6: ~20 blocks") for w in report["warnings"])
+
+
+def test_inspect_cog_missing_overviews(tmpdir):
+    """Should flag zooms without a matching overview and slow compressions."""
+    path = str(tmpdir.join("cog.tif"))
+    with rasterio.open(raster_path) as src:
+        profile = dict(
+            src.profile,
+            compress="packbits",
+            photometric="rgb",
+            blockxsize=256,
+            blockysize=256,
+        )
+        data = src.read()
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+        dst.build_overviews([16])
+
+    report = inspect_cog(path)
+    assert report["errors"] == []
+    assert "Slow or no compression: PACKBITS" in report["warnings"]
+    assert any("missing overview" in w for w in report["warnings"])
+
+
+def test_inspect_cog_invalid():
+    """Should report files the tile server refuses."""
+    report = inspect_cog(raster_strips_path)
+    assert report["errors"] == [
+        "Raster is not tiled (strips)",
+        "Raster has no overviews",
+    ]
+    assert report["zooms"] == []
+    assert "Errors:" in format_report(report)
+
+
+def test_estimate_zoom():
+    """Should pick the coarsest finer level and count the blocks read."""
+    levels = [
+        dict(
+            decimation=1,
+            block_width=256,
+            block_height=256,
+            cols=8,
+            rows=8,
+            block_bytes=100,
+        ),
+        dict(
+            decimation=4,
+            block_width=256,
+            block_height=256,
+            cols=2,
+            rows=2,
+            block_bytes=50,
+        ),
+    ]
+    estimate = _estimate_zoom(10, levels, 152.87405657041106 / 2 / 8, 512)
+    assert estimate["level"] == 1
+    assert estimate["oversampling"] == pytest.approx(2.0)
+    assert estimate["blocks"] == 4
+    assert estimate["bytes"] == 200
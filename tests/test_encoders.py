@@ -0,0 +1,155 @@
+"""tests rio_glui.encoders."""
+
+import numpy
+import pytest
+from rasterio.io import MemoryFile
+
+from rio_glui.encoders import (
+    encode_npy,
+    decode_npy,
+    npy_info,
+    encode_indexed_png,
+    encode_terrain_rgb,
+    pack_terrain_rgb,
+    PNGEncoder,
+)
+
+
+def test_npy_roundtrip():
+    """Should encode and decode data and mask."""
+    data = numpy.random.rand(3, 16, 8).astype(numpy.float32)
+    mask = numpy.zeros((16, 8), dtype=numpy.bool_)
+    mask[4:] = True
+
+    tile = encode_npy(data, mask)
+    dtype, shape = npy_info(tile)
+    assert dtype == numpy.float32
+    assert shape == (3, 16, 8)
+
+    out, out_mask = decode_npy(tile)
+    numpy.testing.assert_array_equal(out, data)
+    assert out_mask.dtype == numpy.uint8
+    numpy.testing.assert_array_equal(out_mask, mask.astype(numpy.uint8))
+
+
+@pytest.mark.parametrize("bands", [1, 2, 3, 4])
+def test_png_strips(bands):
+    """Should encode a PNG image strip by strip."""
+    data = numpy.random.RandomState(bands).randint(0, 256, (bands, 37, 53))
+    data = data.astype(numpy.uint8)
+    encoder = PNGEncoder(53, 37, bands)
+    image = encoder.start()
+    for row in range(0, 37, 10):
+        image += encoder.write(data[:, row : row + 10])
+    image += encoder.finish()
+
+    with MemoryFile(image) as mem, mem.open() as src:
+        assert src.driver == "PNG"
+        numpy.testing.assert_array_equal(src.read(), data)
+
+
+def test_png_invalid():
+    """Should raise on invalid bands or rows."""
+    with pytest.raises(ValueError):
+        PNGEncoder(8, 8, 5)
+
+    encoder = PNGEncoder(8, 8, 1)
+    with pytest.raises(ValueError):
+        encoder.write(numpy.zeros((1, 9, 8), dtype=numpy.uint8))
+
+    encoder.write(numpy.zeros((1, 4, 8), dtype=numpy.uint8))
+    with pytest.raises(ValueError):
+        encoder.finish()
+
+
+def _decode_indexed(image):
+    with MemoryFile(image) as mem, mem.open() as src:
+        assert src.count == 1
+        index = src.read(1)
+        cmap = src.colormap(1)
+    palette = numpy.array([cmap[i] for i in range(len(cmap))], numpy.uint8)
+    return palette[index]
+
+
+def test_indexed_png():
+    """Should encode the LUT as palette and masked pixels as transparent."""
+    lut = numpy.zeros((256, 4), dtype=numpy.uint8)
+    lut[:, 0] = numpy.arange(256)
+    lut[:, 3] = 255
+    index = numpy.arange(256, dtype=numpy.uint8).reshape(16, 16)
+    mask = numpy.full((16, 16), 255, dtype=numpy.uint8)
+    mask[0, 0:4] = 0
+    index[0, 0:2] = 5
+
+    image = encode_indexed_png(index, mask, lut)
+    assert image[25:26] == b"\x03"
+    rgba = _decode_indexed(image)
+    assert (rgba[0, 0:4, 3] == 0).all()
+    numpy.testing.assert_array_equal(rgba[1:, :, 0], index[1:])
+    assert (rgba[1:, :, 3] == 255).all()
+
+
+def test_indexed_png_transparent_entry():
+    """Should reuse a transparent LUT entry and give up without free entry."""
+    lut = numpy.full((256, 4), 255, dtype=numpy.uint8)
+    lut[:, 1] = numpy.arange(256)
+    index = numpy.arange(256, dtype=numpy.uint8).reshape(16, 16)
+    mask = numpy.full((16, 16), 255, dtype=numpy.uint8)
+    mask[15, 15] = 0
+    index[15, 15] = 0
+    mask[0, 0] = 0
+    assert encode_indexed_png(index, mask, lut) is not None
+
+    index = numpy.arange(256, dtype=numpy.uint8).reshape(16, 16)
+    index = numpy.hstack([index, index[:, :1]])
+    mask = numpy.full((16, 17), 255, dtype=numpy.uint8)
+    mask[0, 16] = 0
+    assert encode_indexed_png(index, mask, lut) is None
+
+    lut[200, 3] = 0
+    rgba = _decode_indexed(encode_indexed_png(index, mask, lut))
+    assert rgba[0, 16, 3] == 0
+    assert rgba[200 // 16, 200 % 16, 3] == 0
+    assert rgba[1, 1].tolist() == [255, 17, 255, 255]
+
+
+def test_png_palette_invalid():
+    """Should only accept 1 band palette images."""
+    with pytest.raises(ValueError):
+        PNGEncoder(8, 8, 3, palette=numpy.zeros((256, 4)))
+    with pytest.raises(ValueError):
+        PNGEncoder(8, 8, 1, palette=numpy.zeros((257, 4)))
+
+
+def _decode_terrain(rgb):
+    rgb = rgb.astype(numpy.float64)
+    return -10000 + (rgb[0] * 256 * 256 + rgb[1] * 256 + rgb[2]) * 0.1
+
+
+def test_terrain_rgb_pack():
+    """Should pack elevations with a 0.1 meter precision."""
+    data = numpy.array([[-10000, -1.23, 0], [8848.86, 2e6, -20000]])
+    mask = numpy.array([[255, 255, 0], [255, 255, 255]], dtype=numpy.uint8)
+    rgb = pack_terrain_rgb(data, mask)
+    assert rgb.shape == (3, 2, 3)
+    assert rgb.dtype == numpy.uint8
+    numpy.testing.assert_allclose(
+        _decode_terrain(rgb),
+        [[-10000, -1.2, 0], [8848.9, 1667721.5, -10000]],
+        atol=1e-6,
+    )
+
+    # Masked pixels are set to 0 meter
+    mask[:] = 0
+    numpy.testing.assert_allclose(_decode_terrain(pack_terrain_rgb(data, mask)), 0)
+
+
+def test_terrain_rgb_png():
+    """Should encode an opaque RGB PNG."""
+    data = numpy.linspace(-500, 4000, 64 * 32).reshape(64, 32)
+    mask = numpy.full((64, 32), 255, dtype=numpy.uint8)
+    image = encode_terrain_rgb(data, mask, level=1)
+    with MemoryFile(image) as mem, mem.open() as src:
+        assert src.count == 3
+        assert src.shape == (64, 32)
+        numpy.testing.assert_allclose(_decode_terrain(src.read()), data, atol=0.05)
@@ -0,0 +1,245 @@
+"""tests rio_glui.env."""
+
+import os
+import re
+import json
+import logging
+import threading
+
+import pytest
+import mercantile
+
+from tornado.testing import AsyncHTTPTestCase
+
+from rio_glui.env import GDAL_ENV, HTTPRequestCounter, gdal_env, set_cachemax
+from rio_glui.raster import RasterTiles
+from rio_glui.server import TileServer
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:  # pragma: no cover
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+fixtures = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serve fixtures with HTTP range support and record requests."""
+
+    def log_message(self, *args):
+        """Be quiet."""
+
+    def _send(self, body=True):
+        path = os.path.join(fixtures, os.path.basename(self.path.split("?")[0]))
+        if not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        start, end = 0, len(data) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, len(data))
+            )
+        else:
+            self.send_response(200)
+
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if body:
+            self.wfile.write(data[start : end + 1])
+
+    def do_GET(self):
+        """Send file (range)."""
+        self.server.requests.append(self.headers.get("Range"))
+        self._send()
+
+    def do_HEAD(self):
+        """Send file headers."""
+        self.server.requests.append("HEAD")
+        self._send(body=False)
+
+
+class RangeServer(ThreadingMixIn, HTTPServer):
+    """Local HTTP range server."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        """Start server on a random port."""
+        HTTPServer.__init__(self, ("127.0.0.1", 0), RangeRequestHandler)
+        self.requests = []
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def url(self, name, tag):
+        """Get fixture url (tag avoids GDAL's process-wide vsicurl cache)."""
+        return "http://127.0.0.1:{}/{}?tag={}".format(self.server_port, name, tag)
+
+
+@pytest.fixture(scope="module")
+def server():
+    """Local HTTP range server."""
+    server = RangeServer()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_gdal_env():
+    """Should override default options."""
+    assert gdal_env() == GDAL_ENV
+
+    env = gdal_env(
+        merge_ranges=False,
+        multiplex=False,
+        vsi_cache_size=0,
+        allowed_extensions="",
+        ingested_bytes=16384,
+    )
+    assert env["GDAL_HTTP_MERGE_CONSECUTIVE_RANGES"] == "NO"
+    assert env["GDAL_HTTP_MULTIPLEX"] == "NO"
+    assert env["VSI_CACHE"] == "FALSE"
+    assert "CPL_VSIL_CURL_ALLOWED_EXTENSIONS" not in env
+    assert env["GDAL_INGESTED_BYTES_AT_OPEN"] == 16384
+
+
+def test_set_cachemax(monkeypatch):
+    """Should set GDAL_CACHEMAX environment variable."""
+    monkeypatch.delenv("GDAL_CACHEMAX", raising=False)
+    set_cachemax(256)
+    assert os.environ["GDAL_CACHEMAX"] == "256"
+
+
+def test_request_counter_install():
+    """Should attach the counter to the GDAL messages loggers only."""
+    counter = HTTPRequestCounter()
+    rasterio_level = logging.getLogger("rasterio").level
+    counter.install()
+    try:
+        for name in ["rasterio._env", "rasterio._err"]:
+            assert counter in logging.getLogger(name).handlers
+            assert logging.getLogger(name).getEffectiveLevel() == logging.DEBUG
+
+        logging.getLogger("rasterio._err").debug("VSICURL: Got response_code=206")
+        assert counter.count() == 1
+        assert logging.getLogger("rasterio").level == rasterio_level
+    finally:
+        counter.uninstall()
+
+    for name in ["rasterio._env", "rasterio._err"]:
+        assert counter not in logging.getLogger(name).handlers
+
+
+def test_request_counter():
+    """Should count vsicurl responses per thread."""
+    counter = HTTPRequestCounter()
+    logger = logging.getLogger("rio_glui.tests.counter")
+    logger.addHandler(counter)
+    logger.setLevel(logging.DEBUG)
+
+    logger.debug("CPLE_None in VSICURL: Downloading 0-16383 (http://...)...")
+    logger.debug("CPLE_None in VSICURL: Got response_code=206")
+    logger.debug("CPLE_None in VSICURL: Got response_code=206")
+    assert counter.count() == 2
+
+    out = []
+
+    def worker():
+        logger.debug("CPLE_None in VSICURL: Got response_code=206")
+        out.append(counter.count())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert out == [1]
+    assert counter.count() == 2
+
+    counter.reset()
+    assert counter.count() == 0
+
+
+def test_remote_read_tile(server):
+    """Should read remote tiles with few requests and reuse the handle."""
+    url = server.url("ndvi_cogeo.tif", "read")
+    r = RasterTiles(url, tiles_size=256)
+    assert r.meta["dtype"] == "float32"
+
+    tile = mercantile.tile(*r.get_center(), zoom=r.get_max_zoom())
+    del server.requests[:]
+    data, mask = r.read_tile(tile.z, tile.x, tile.y)
+    assert data.shape == (1, 256, 256)
+    assert mask.any()
+    first = len(server.requests)
+    assert first
+
+    # Cached header and blocks: no new request
+    del server.requests[:]
+    r.read_tile(tile.z, tile.x, tile.y)
+    assert len(server.requests) == 0
+    assert len(r._datasets) == 1
+
+    r.close()
+    assert r._datasets == []
+
+
+def test_remote_merge_ranges(server):
+    """Should merge consecutive range requests."""
+    counts = []
+    for merge in [False, True]:
+        url = server.url("ndvi_cogeo.tif", "merge{}".format(merge))
+        r = RasterTiles(url, tiles_size=256, env=gdal_env(merge_ranges=merge))
+        del server.requests[:]
+        tile = mercantile.tile(*r.get_center(), zoom=r.get_min_zoom())
+        r.read_tile(tile.z, tile.x, tile.y)
+        counts.append(len(server.requests))
+        r.close()
+
+    assert counts[1] <= counts[0]
+
+
+class TestHandlersRemote(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.range_server = RangeServer()
+        r = RasterTiles(self.range_server.url("ndvi_cogeo.tif", "server"))
+        self.tile = mercantile.tile(*r.get_center(), zoom=r.get_max_zoom())
+        return TileServer(r, count_requests=True).app
+
+    def tearDown(self):
+        """Stop range server."""
+        super(TestHandlersRemote, self).tearDown()
+        self.range_server.shutdown()
+        self.range_server.server_close()
+
+    def test_tile(self):
+        """Should report HTTP requests per tile."""
+        url = "/tiles/{}/{}/{}.png".format(self.tile.z, self.tile.x, self.tile.y)
+        del self.range_server.requests[:]
+        response = self.fetch(url)
+        self.assertEqual(response.code, 200)
+        requests = int(response.headers["X-HTTP-Requests"])
+        self.assertTrue(requests > 0)
+        self.assertEqual(
+            requests, len([req for req in self.range_server.requests if req])
+        )
+
+        response = self.fetch(url)
+        self.assertTrue(int(response.headers["X-HTTP-Requests"]) <= requests)
+
+        metrics = json.loads(self.fetch("/metrics").body.decode())
+        self.assertTrue(metrics["total"]["http_requests"] >= requests)
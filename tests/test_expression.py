@@ -0,0 +1,131 @@
+"""tests rio_glui.expression."""
+
+import pytest
+import numpy
+from mock import patch
+
+from rio_glui import expression as expr_module
+from rio_glui.expression import Expression, get_expression
+
+
+def _data():
+    return numpy.array(
+        [[[1, 2], [4, 0]], [[3, 2], [0, 0]], [[0, 0], [0, 0]], [[5, 6], [8, 2]]],
+        dtype=numpy.uint8,
+    )
+
+
+def test_expression_ndvi():
+    """Should evaluate an index on the referenced bands only."""
+    expr = Expression("(b4 - b1) / (b4 + b1)")
+    assert expr.bands == [1, 4]
+    assert expr.count == 1
+
+    data = _data()
+    result = expr.evaluate(data[[0, 3]])
+    assert result.dtype == numpy.float32
+    assert result.shape == (1, 2, 2)
+    numpy.testing.assert_allclose(result[0], [[4 / 6.0, 4 / 8.0], [4 / 12.0, 1]])
+
+
+def test_expression_multiband():
+    """Should create one band per comma-separated expression."""
+    expr = Expression("b2, where(b1 > 1, sqrt(b1), -1), (b1 > 0) & ~(b2 > 2)")
+    assert expr.bands == [1, 2]
+    assert expr.count == 3
+
+    result = expr.evaluate(_data()[:2])
+    numpy.testing.assert_allclose(result[0], [[3, 2], [0, 0]])
+    numpy.testing.assert_allclose(result[1], [[-1, numpy.sqrt(2)], [2, -1]])
+    numpy.testing.assert_allclose(result[2], [[0, 1], [1, 0]])
+
+
+@pytest.mark.parametrize("numexpr", [True, False])
+def test_expression_booleans(numexpr):
+    """Should use comparisons as numbers and numbers as conditions."""
+    with patch.object(expr_module, "numexpr", expr_module.numexpr if numexpr else None):
+        expr = Expression(
+            "where(b1, 1, 2), (b1 > 1) + (b2 > 1), -(b1 > 1), (b1 > 0) == (b2 > 0)"
+        )
+        result = expr.evaluate(_data()[:2])
+
+    numpy.testing.assert_allclose(result[0], [[1, 1], [1, 2]])
+    numpy.testing.assert_allclose(result[1], [[1, 2], [1, 0]])
+    numpy.testing.assert_allclose(result[2], [[0, -1], [-1, 0]])
+    numpy.testing.assert_allclose(result[3], [[1, 1], [0, 1]])
+
+
+def test_expression_nonfinite():
+    """Should return non-finite values for invalid operations."""
+    result = Expression("b1 / b2").evaluate(_data()[:2])
+    assert numpy.isinf(result[0, 1, 0])
+    assert numpy.isnan(result[0, 1, 1])
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "",
+        "b1 +",
+        "__import__('os')",
+        "b1.real",
+        "b1[0]",
+        "b0 + 1",
+        "x + b1",
+        "where + b1",
+        "sqrt(b1, b2)",
+        "where(b1, 1)",
+        "sqrt(x=b1)",
+        "lambda: b1",
+        "b1 < b2 < 3",
+        "'a' + b1",
+        "True + b1",
+        "1 + 2",
+        "b1 if b2 else b3",
+        "b1 + 10 ** 400",
+        "b1 + 1 / 0",
+        "b1 & 1",
+        "b1 | b2",
+        "~b1",
+        "(b1 > 0) & b2",
+        "-" * 3000 + "b1",
+        "sqrt(" * 70 + "b1" + ")" * 70,
+        "b1" + " + b1" * 300,
+    ],
+)
+def test_expression_invalid(expr):
+    """Should reject unsupported expressions."""
+    with pytest.raises(ValueError):
+        Expression(expr)
+
+
+@pytest.mark.parametrize("numexpr", [True, False])
+def test_expression_int_constants(numexpr):
+    """Should compute integer constants as floats."""
+    with patch.object(expr_module, "numexpr", expr_module.numexpr if numexpr else None):
+        result = Expression("b1 * 0 + 2 ** 70, b1 % 2").evaluate(_data()[:1])
+        with pytest.raises(ValueError):
+            Expression("b1 + 9 ** 9 ** 9")
+    numpy.testing.assert_allclose(result[0], 2.0 ** 70)
+    numpy.testing.assert_allclose(result[1], _data()[0] % 2)
+
+
+def test_expression_numpy():
+    """Should evaluate expressions with NumPy when numexpr is missing."""
+    with patch.object(expr_module, "numexpr", None):
+        expr = Expression("(b4 - b1) / (b4 + b1), where(b1 > 1, b1 ** 2, 0) % 5")
+        with numpy.errstate(all="raise"):
+            result = expr.evaluate(_data()[[0, 3]])
+
+    expected = Expression("(b4 - b1) / (b4 + b1), where(b1 > 1, b1 ** 2, 0) % 5")
+    numpy.testing.assert_allclose(result, expected.evaluate(_data()[[0, 3]]))
+
+
+def test_get_expression():
+    """Should cache compiled expressions."""
+    expr = get_expression("b1 * 2")
+    assert get_expression("b1 * 2") is expr
+
+    get_expression("b1 * 3", max_size=1)
+    assert get_expression("b1 * 4", cached=True) is None
+    assert get_expression("b1 * 2") is not expr
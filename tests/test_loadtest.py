@@ -0,0 +1,88 @@
+"""tests rio_glui.loadtest."""
+
+import os
+
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from rio_glui.raster import RasterTiles
+from rio_glui.server import TileServer
+from rio_glui import loadtest
+
+raster_path = os.path.join(
+    os.path.dirname(__file__), "fixtures", "16-21560-29773_small_ycbcr.tif"
+)
+bounds = [-61.56738281249997, 16.225223624120076, -61.5618896507246, 16.23049792684362]
+
+
+def test_viewport_tiles():
+    """Should return the tiles covering the viewport, center first."""
+    tiles = loadtest.viewport_tiles(10.5, 20.5, 6, width=1024, height=512)
+    assert tiles[0] == (6, 10, 20)
+    assert len(tiles) == 6
+    assert set(tiles) == {(6, x, y) for x in [9, 10, 11] for y in [20, 21]}
+
+    tiles = loadtest.viewport_tiles(0.2, 0.2, 2, width=1024, height=1024)
+    assert (2, 3, 0) in tiles
+    assert all(y >= 0 for _, _, y in tiles)
+
+
+def test_viewport_tiles_bounds():
+    """Should only return tiles within bounds."""
+    x, y = loadtest._lnglat_to_tile(bounds[0], bounds[3], 18)
+    tiles = loadtest.viewport_tiles(x, y, 18, bounds=bounds)
+    assert tiles
+    assert all(86240 <= x <= 86243 and 119092 <= y <= 119095 for _, x, y in tiles)
+
+
+def test_generate_sessions():
+    """Should generate reproducible sessions."""
+    sessions = loadtest.generate_sessions(bounds, 14, 19, sessions=5, steps=8, seed=3)
+    assert len(sessions) == 5
+    assert all(len(session) == 8 for session in sessions)
+    assert sessions == loadtest.generate_sessions(
+        bounds, 14, 19, sessions=5, steps=8, seed=3
+    )
+
+    requests = [req for session in sessions for step in session for req in step]
+    assert all(14 <= z <= 19 for z, _, _, _ in requests)
+    assert any(color for _, _, _, color in requests)
+
+    sessions = loadtest.generate_sessions(bounds, 14, 19, seed=3, color_ops=[])
+    requests = [req for session in sessions for step in session for req in step]
+    assert not any(color for _, _, _, color in requests)
+
+
+def test_summarize():
+    """Should compute latency percentiles, throughput and error rate."""
+    results = [(200, 0.01 * i) for i in range(1, 100)] + [(404, 1.0)]
+    report = loadtest.summarize(results, 10.0)
+    assert report["requests"] == 100
+    assert report["errors"] == 1
+    assert report["error_rate"] == 0.01
+    assert report["throughput"] == 10.0
+    assert report["p50"] < report["p95"] < report["p99"] <= report["max"] == 1000.0
+
+    assert loadtest.summarize([], 0)["requests"] == 0
+
+
+class TestLoadTest(AsyncHTTPTestCase):
+    """Test load test runner."""
+
+    def get_app(self):
+        """Initialize app."""
+        r = RasterTiles(raster_path, tiles_size=64)
+        return TileServer(r).app
+
+    @gen_test(timeout=60)
+    def test_run_loadtest(self):
+        """Should replay sessions and report."""
+        sessions = loadtest.generate_sessions(
+            bounds, 17, 19, sessions=3, steps=3, tilesize=512, seed=1
+        )
+        report = yield loadtest.run_loadtest(
+            self.get_url("/tiles/{z}/{x}/{y}.png"), sessions, concurrency=2
+        )
+        nrequests = sum(len(step) for session in sessions for step in session)
+        self.assertEqual(report["requests"], nrequests)
+        self.assertEqual(report["errors"], 0)
+        self.assertTrue(report["p99"] > 0)
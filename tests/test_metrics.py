@@ -0,0 +1,127 @@
+"""tests rio_glui.metrics."""
+
+import time
+import threading
+import multiprocessing
+
+from mock import patch
+
+import pytest
+
+from rio_glui.metrics import TileMetrics, StageTimer, SlowTiles, LoadMonitor
+
+
+def test_metrics_record():
+    """Should record and summarize tile requests."""
+    metrics = TileMetrics()
+    metrics.record(200, 100, 0.5, cache_hit=True)
+    metrics.record(404, 0, 0.1)
+
+    summary = metrics.summary()
+    assert summary["total"]["requests"] == 2
+    assert summary["total"]["errors"] == 1
+    assert summary["total"]["cache_hits"] == 1
+    assert summary["total"]["bytes"] == 100
+    assert summary["total"]["mean_seconds"] == 0.3
+    assert summary["workers"] == [summary["total"]]
+
+
+def _record(metrics, worker):
+    with patch("rio_glui.metrics.worker_id", return_value=worker):
+        for _ in range(10):
+            metrics.record(200, 10, 0.01)
+
+
+def test_metrics_workers():
+    """Should combine metrics recorded by forked workers."""
+    metrics = TileMetrics(workers=3)
+    procs = [
+        multiprocessing.Process(target=_record, args=(metrics, worker))
+        for worker in range(3)
+    ]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+
+    summary = metrics.summary()
+    assert summary["total"]["requests"] == 30
+    assert summary["total"]["bytes"] == 300
+    assert [w["requests"] for w in summary["workers"]] == [10, 10, 10]
+
+
+def test_stage_timer():
+    """Should time consecutive stages."""
+    timer = StageTimer()
+    time.sleep(0.01)
+    timer.mark("read")
+    timer.mark("render")
+    timer.mark("read")
+    assert list(timer.stages) == ["read", "render"]
+    assert timer.stages["read"] >= 0.01
+    assert timer.stages["render"] < 0.01
+
+
+def test_slow_tiles():
+    """Should keep the slowest of the last tiles."""
+    slow = SlowTiles(size=10)
+    for i in range(20):
+        slow.record(i % 12, tile=[1, 0, i])
+
+    tiles = slow.slowest(limit=3)
+    assert [t["seconds"] for t in tiles] == [11, 10, 7]
+    assert tiles[0]["tile"] == [1, 0, 11]
+    assert len(slow.slowest(limit=100)) == 10
+
+
+def test_slow_tiles_threads():
+    """Should record tiles from many threads."""
+    slow = SlowTiles(size=1000)
+    threads = [
+        threading.Thread(target=lambda: [slow.record(0.1) for _ in range(100)])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(slow.slowest(limit=1000)) == 400
+
+
+def test_load_monitor_pending():
+    """Should degrade tiles over the pending threshold, with hysteresis."""
+    load = LoadMonitor(max_pending=4)
+    assert [load.submit() for _ in range(4)] == [()] * 4
+    assert load.submit() == ("overview", "encoder", "color")
+    assert load.degraded
+
+    load.done(0.1)
+    load.done(0.1)
+    assert load.submit() == ("overview", "encoder", "color")
+    load.done(0.1)
+    assert load.degraded
+    load.done(0.1)
+    assert not load.degraded
+    load.done(0.1)
+    load.done(0.1)
+    assert load.pending == 0
+    assert not load.degraded
+    assert load.submit() == ()
+
+
+def test_load_monitor_latency():
+    """Should degrade tiles over the median latency threshold."""
+    load = LoadMonitor(max_latency=1.0, modes=["encoder"], window=3)
+    for seconds in [0.1, 2.0, 3.0]:
+        load.submit()
+        load.done(seconds)
+    assert load.submit() == ("encoder",)
+    for seconds in [0.8, 0.6, 0.1]:
+        load.done(seconds)
+        assert load.degraded
+        load.submit()
+    load.done(0.1)
+    assert not load.degraded
+
+    with pytest.raises(ValueError):
+        LoadMonitor(max_pending=1, modes=["nearest"])
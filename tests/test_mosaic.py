@@ -0,0 +1,295 @@
+"""tests rio_glui.mosaic."""
+
+import os
+import shutil
+import weakref
+import threading
+
+import pytest
+import numpy
+import mercantile
+import rasterio
+from rasterio.windows import Window
+from rasterio.enums import Resampling
+from mock import patch
+
+from rio_glui.raster import RasterTiles
+from rio_glui.mosaic import MosaicTiles
+from rio_glui.server import TileServer
+
+raster_path = os.path.join(
+    os.path.dirname(__file__), "fixtures", "16-21560-29773_small_ycbcr.tif"
+)
+raster_ndvi_path = os.path.join(os.path.dirname(__file__), "fixtures", "ndvi_cogeo.tif")
+
+
+def _write_cog(path, window, value=None):
+    """Write part of the fixture as a (small) COG."""
+    path = str(path)
+    with rasterio.open(raster_path) as src:
+        data = src.read(window=window)
+        profile = dict(
+            driver="GTiff",
+            width=int(window.width),
+            height=int(window.height),
+            count=src.count,
+            dtype=src.dtypes[0],
+            crs=src.crs,
+            transform=src.window_transform(window),
+            tiled=True,
+            blockxsize=256,
+            blockysize=256,
+        )
+
+    if value is not None:
+        data[:] = value
+
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+        dst.build_overviews([2, 4], Resampling.nearest)
+
+    return path
+
+
+@pytest.fixture(scope="module")
+def cogs(tmpdir_factory):
+    """Left and right halves, and constant value versions."""
+    tmpdir = tmpdir_factory.mktemp("mosaic")
+    return dict(
+        left=_write_cog(tmpdir.join("left.tif"), Window(0, 0, 768, 2048)),
+        right=_write_cog(tmpdir.join("right.tif"), Window(768, 0, 1280, 2048)),
+        full=_write_cog(tmpdir.join("full.tif"), Window(0, 0, 2048, 2048)),
+        ones=_write_cog(tmpdir.join("ones.tif"), Window(0, 0, 2048, 2048), 1),
+        left_ones=_write_cog(tmpdir.join("lones.tif"), Window(0, 0, 768, 2048), 1),
+    )
+
+
+def _seam_tile():
+    """Zoom 18 tile over the left/right seam (source columns 512-1024)."""
+    bounds = RasterTiles(raster_path).get_bounds()
+    lng = bounds[0] + (bounds[2] - bounds[0]) * 700 / 2048.0
+    lat = (bounds[1] + bounds[3]) / 2
+    return mercantile.tile(lng, lat, 18)
+
+
+def test_mosaic_valid(cogs):
+    """Should work as expected (create mosaic object)."""
+    r = MosaicTiles([cogs["left"], cogs["right"]], tiles_size=256)
+    full = RasterTiles(raster_path)
+    numpy.testing.assert_allclose(r.get_bounds(), full.get_bounds())
+    assert r.meta["dtype"] == "uint8"
+    assert list(r.indexes) == [1, 2, 3]
+    assert r.get_min_zoom() == 16
+    assert r.get_max_zoom() == full.get_max_zoom()
+    assert r.get_source_id().startswith("mosaic:")
+    r.close()
+
+
+def test_mosaic_invalid(cogs):
+    """Should raise for empty or inconsistent mosaics."""
+    with pytest.raises(Exception):
+        MosaicTiles([])
+
+    with pytest.raises(Exception):
+        MosaicTiles([cogs["left"], raster_ndvi_path])
+
+
+def test_mosaic_get_sources(cogs):
+    """Should only return the intersecting sources."""
+    r = MosaicTiles([cogs["left"], cogs["right"]])
+    left, right = r.sources
+    bounds = r.get_bounds()
+
+    tile = mercantile.tile(bounds[0] + 1e-5, bounds[3] - 1e-5, 22)
+    assert r.get_sources(tile.z, tile.x, tile.y) == [left]
+
+    tile = mercantile.tile(bounds[2] - 1e-5, bounds[3] - 1e-5, 22)
+    assert r.get_sources(tile.z, tile.x, tile.y) == [right]
+
+    # Tiles above the index zoom
+    assert r.get_sources(0, 0, 0) == [left, right]
+    tile = mercantile.tile(*r.get_center(), zoom=10)
+    assert r.get_sources(tile.z, tile.x, tile.y) == [left, right]
+
+    assert r.tile_exists(tile.z, tile.x, tile.y)
+    assert not r.tile_exists(10, 0, 0)
+    assert not r.get_sources(22, 0, 0)
+
+
+def test_mosaic_get_sources_parent(cogs):
+    """Should only look up the index keys of the tile children."""
+    r = MosaicTiles([cogs["left"], cogs["right"]], index_zoom=21)
+    left, right = r.sources
+    bounds = r.get_bounds()
+
+    tile = mercantile.tile(bounds[0] + 1e-5, bounds[3] - 1e-5, 19)
+    assert r.get_sources(tile.z, tile.x, tile.y) == [left]
+    tile = mercantile.tile(bounds[2] - 1e-5, bounds[3] - 1e-5, 19)
+    assert r.get_sources(tile.z, tile.x, tile.y) == [right]
+    assert not r.get_sources(19, 0, 0)
+
+
+def test_mosaic_readers(cogs):
+    """Should size the source reads pool for concurrent tiles."""
+    r = MosaicTiles([cogs["left"], cogs["right"]], max_workers=2, readers=3)
+    assert r._get_executor()._max_workers == 6
+    r.close()
+
+    r = MosaicTiles([cogs["left"], cogs["right"]], max_workers=2)
+    TileServer(r, max_workers=5)
+    assert r.readers == 5
+    assert r._get_executor()._max_workers == 10
+    r.close()
+
+
+@patch("rio_glui.raster.MAX_DATASETS", 2)
+@patch("rio_glui.raster._all_handles", weakref.WeakValueDictionary())
+@patch("rio_glui.raster._handles", threading.local())
+def test_mosaic_datasets(cogs):
+    """Should bound the open dataset handles of all reader threads."""
+    # NOTE: Left half sources never fill the seam tile, all sources are read
+    paths = [cogs["left"], cogs["left_ones"]] * 4 + [cogs["right"]]
+    r = MosaicTiles(paths, tiles_size=256, max_workers=2, readers=2)
+    tile = _seam_tile()
+    for t in [tile, mercantile.parent(tile)]:
+        r.read_tile(t.z, t.x, t.y)
+
+    handles = [d for src in r.sources for _, d in src._datasets if not d.closed]
+    assert len(handles) <= 2 + r.max_workers * r.readers
+    r.close()
+
+
+def test_mosaic_read_tile(cogs):
+    """Should composite a seamless tile across sources."""
+    r = MosaicTiles([cogs["left"], cogs["right"]], tiles_size=256)
+    full = RasterTiles(cogs["full"], tiles_size=256)
+    tile = _seam_tile()
+    assert r.get_sources(tile.z, tile.x, tile.y) == r.sources
+
+    data, mask = r.read_tile(tile.z, tile.x, tile.y)
+    assert data.shape == (3, 256, 256)
+    assert mask.shape == (256, 256)
+    assert mask.all()
+
+    expected, _ = full.read_tile(tile.z, tile.x, tile.y)
+    # Bilinear resampling differs along the seam only
+    assert (data == expected).mean() > 0.98
+
+    out = numpy.full((3, 256, 256), 7, dtype=numpy.uint8)
+    data, mask = r.read_tile(tile.z, tile.x, tile.y, out=out)
+    assert data is out
+    assert (out == expected).mean() > 0.98
+    r.close()
+
+
+def test_mosaic_read_tile_outside(cogs):
+    """Should return an empty tile."""
+    r = MosaicTiles([cogs["left"]], tiles_size=256)
+    data, mask = r.read_tile(22, 0, 0)
+    assert data.shape == (3, 256, 256)
+    assert not mask.any()
+    assert not data.any()
+
+
+def test_mosaic_priority(cogs):
+    """Should select pixels from the first valid source."""
+    tile = _seam_tile()
+
+    r = MosaicTiles([cogs["ones"], cogs["full"]], tiles_size=256)
+    data, mask = r.read_tile(tile.z, tile.x, tile.y)
+    assert mask.all()
+    assert (data == 1).all()
+
+    r = MosaicTiles([cogs["left_ones"], cogs["full"]], tiles_size=256)
+    data, mask = r.read_tile(tile.z, tile.x, tile.y)
+    expected, _ = r.sources[1].read_tile(tile.z, tile.x, tile.y)
+    assert mask.all()
+    assert (data[:, :, :100] == 1).all()
+    numpy.testing.assert_array_equal(data[:, :, -100:], expected[:, :, -100:])
+
+
+def test_mosaic_early_stop(cogs):
+    """Should not read lower priority sources once the mask is full."""
+    r = MosaicTiles([cogs["full"], cogs["ones"], cogs["left"]], max_workers=1)
+    tile = _seam_tile()
+    with patch.object(r.sources[1], "read_tile") as read_ones, patch.object(
+        r.sources[2], "read_tile"
+    ) as read_left:
+        data, mask = r.read_tile(tile.z, tile.x, tile.y)
+        assert mask.all()
+        assert not read_ones.called
+        assert not read_left.called
+    r.close()
+
+
+def test_mosaic_get_stats(cogs):
+    """Should merge source statistics."""
+    r = MosaicTiles([cogs["left"], cogs["right"]])
+    stats = r.get_stats()
+    assert sorted(stats) == [1, 2, 3]
+    for band in [1, 2, 3]:
+        assert len(stats[band]["pc"]) == 2
+        assert stats[band]["min"] <= stats[band]["pc"][0] <= stats[band]["pc"][1]
+        assert stats[band]["pc"][1] <= stats[band]["max"]
+        assert len(stats[band]["histogram"][0]) == 1000
+
+    assert r.get_stats() is stats
+
+
+def test_mosaic_sample(cogs):
+    """Should sample the first valid source of each point."""
+    r = MosaicTiles([cogs["left_ones"], cogs["right"]])
+    full = RasterTiles(cogs["full"])
+    bounds = r.get_bounds()
+    coords = numpy.random.RandomState(0).uniform(
+        [bounds[0], bounds[1]], [bounds[2] + 0.001, bounds[3]], (500, 2)
+    )
+    data, mask = r.sample(coords)
+    expected, expected_mask = full.sample(coords)
+    numpy.testing.assert_array_equal(mask, expected_mask)
+
+    _, in_left = r.sources[0].sample(coords)
+    assert in_left.any() and (mask & ~in_left).any()
+    assert (data[:, in_left] == 1).all()
+    numpy.testing.assert_array_equal(
+        data[:, mask & ~in_left], expected[:, mask & ~in_left]
+    )
+
+
+def test_mosaic_read_bbox(cogs):
+    """Should composite an extent across sources."""
+    r = MosaicTiles([cogs["left_ones"], cogs["right"]])
+    full = RasterTiles(cogs["full"])
+    bounds = r.get_bounds()
+    data, mask = r.read_bbox(bounds, 256, 256)
+    expected, _ = full.read_bbox(bounds, 256, 256)
+    assert mask.all()
+    assert (data[:, :, :90] == 1).all()
+    # Sources have different overviews
+    diff = data[:, :, 100:].astype(int) - expected[:, :, 100:]
+    assert numpy.abs(diff).mean() < 10
+
+    data, mask = r.read_bbox(bounds, 256, 256, window=Window(0, 0, 256, 10))
+    assert data.shape == (3, 10, 256)
+
+
+def test_mosaic_listener_error(cogs, tmpdir):
+    """Should change the mosaic identity when a listener fails."""
+    path = str(tmpdir.join("left.tif"))
+    shutil.copy(cogs["left"], path)
+    r = MosaicTiles([path, cogs["right"]])
+
+    def listener(source, bounds):
+        raise Exception("database is locked")
+
+    r.add_listener(listener)
+    source = r.get_source_id()
+    with rasterio.open(path, "r+") as dst:
+        dst.write(
+            numpy.zeros((3, 256, 256), dtype=numpy.uint8), window=Window(0, 0, 256, 256)
+        )
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+    assert r.get_source_id() != source
+    r.close()
@@ -0,0 +1,49 @@
+"""tests rio_glui.profiler."""
+
+import time
+import threading
+
+from rio_glui.profiler import SamplingProfiler
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler():
+    """Should sample the stacks of the profiled threads."""
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy, args=(stop,), name="busy")
+    thread.start()
+
+    profiler = SamplingProfiler(threads=lambda: set([thread.ident]), interval=0.001)
+    profiler.start()
+    time.sleep(0.2)
+    profiler.stop()
+    stop.set()
+    thread.join()
+
+    assert profiler.samples > 0
+    stacks = profiler.collapsed().splitlines()
+    assert stacks
+    for line in stacks:
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("busy;")
+        assert int(count) > 0
+    assert any("_busy (test_profiler.py:" in line for line in stacks)
+
+    top = profiler.top(limit=5)
+    assert "_busy (test_profiler.py)" in top
+    assert len(top.splitlines()) <= 3 + 5
+
+
+def test_profiler_all_threads():
+    """Should sample all threads but its own by default."""
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    time.sleep(0.05)
+    profiler.stop()
+
+    assert "MainThread;" in profiler.collapsed()
+    assert "rio-glui-profiler" not in profiler.collapsed()
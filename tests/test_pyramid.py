@@ -0,0 +1,62 @@
+"""tests rio_glui.pyramid."""
+
+import numpy
+import pytest
+
+from rio_glui.pyramid import downsample, children, merge_children
+
+
+def test_downsample():
+    """Should average valid pixels of each block."""
+    data = numpy.array(
+        [[[0, 2, 10, 10], [4, 6, 10, 10], [1, 1, 7, 7], [1, 1, 7, 7]]],
+        dtype=numpy.uint8,
+    )
+    mask = numpy.full((4, 4), 255, dtype=numpy.uint8)
+    mask[2:, 2:] = 0
+    mask[0, 1] = 0
+
+    out, out_mask = downsample(data, mask, 2)
+    assert out.dtype == numpy.uint8
+    assert out.tolist() == [[[3, 10], [1, 0]]]
+    assert out_mask.tolist() == [[255, 255], [255, 0]]
+
+
+def test_downsample_float():
+    """Should ignore masked nan values."""
+    data = numpy.array([[[numpy.nan, 1.0], [2.0, 3.0]]], dtype=numpy.float32)
+    mask = numpy.array([[0, 255], [255, 255]], dtype=numpy.uint8)
+
+    out, out_mask = downsample(data, mask, 2)
+    assert out.dtype == numpy.float32
+    assert out.tolist() == [[[2.0]]]
+    assert out_mask.tolist() == [[255]]
+
+
+def test_children():
+    """Should return children in row major order."""
+    assert children(1, 1, 0) == [(2, 2, 0), (2, 3, 0), (2, 2, 1), (2, 3, 1)]
+
+
+def test_merge_children():
+    """Should downsample each child into its quadrant."""
+    mask = numpy.full((4, 4), 255, dtype=numpy.uint8)
+    tiles = [(numpy.full((2, 4, 4), idx, dtype=numpy.uint16), mask) for idx in range(4)]
+    tiles[3] = (tiles[3][0], numpy.zeros((4, 4), dtype=numpy.uint8))
+
+    data, out_mask = merge_children(tiles)
+    assert data.shape == (2, 4, 4)
+    assert data.dtype == numpy.uint16
+    assert data[0].tolist() == [[0, 0, 1, 1], [0, 0, 1, 1], [2, 2, 0, 0], [2, 2, 0, 0]]
+    assert out_mask[2:, 2:].sum() == 0
+    assert (out_mask[:2] == 255).all()
+
+
+def test_merge_children_odd():
+    """Should reject odd size children and sizes not divisible by the factor."""
+    mask = numpy.full((5, 5), 255, dtype=numpy.uint8)
+    tiles = [(numpy.zeros((1, 5, 5), dtype=numpy.uint8), mask)] * 4
+    with pytest.raises(ValueError):
+        merge_children(tiles)
+    with pytest.raises(ValueError):
+        downsample(tiles[0][0], mask, 2)
@@ -1,8 +1,20 @@
 """tests rio_glui.raster."""
 
 import os
+import shutil
+import weakref
+import threading
 import pytest
 
+import numpy
+import mercantile
+import rasterio
+from rasterio import windows
+from rasterio.warp import transform, transform_bounds
+from rasterio.windows import Window
+
+from mock import patch
+
 from rio_glui.raster import RasterTiles, _meters_per_pixel
 
 raster_path = os.path.join(
@@ -14,6 +26,7 @@ invalid_raster_path = os.path.join(
 raster_nodata_path = os.path.join(
     os.path.dirname(__file__), "fixtures", "internal_nodata.tif"
 )
+raster_ndvi_path = os.path.join(os.path.dirname(__file__), "fixtures", "ndvi_cogeo.tif")
 
 
 def test_meters_per_pixel_valid():
@@ -133,6 +146,30 @@ def test_rastertiles_read_tile():
     assert mask.shape == (512, 512)
 
 
+@patch("rio_glui.raster.MAX_DATASETS", 2)
+@patch("rio_glui.raster._all_handles", weakref.WeakValueDictionary())
+@patch("rio_glui.raster._handles", threading.local())
+def test_rastertiles_datasets_lru():
+    """Should close the least recently used dataset handles of the thread."""
+    rasters = [RasterTiles(raster_path) for _ in range(3)]
+    for r in rasters:
+        r.read_tile(18, 86240, 119094)
+    assert rasters[0]._datasets == []
+    assert [len(r._datasets) for r in rasters[1:]] == [1, 1]
+
+    # Closed handles are reopened
+    rasters[0].read_tile(18, 86240, 119094)
+    assert len(rasters[0]._datasets) == 1
+    assert rasters[1]._datasets == []
+
+    for r in rasters:
+        r.close()
+        assert r._datasets == []
+    rasters[2].read_tile(18, 86240, 119094)
+    assert len(rasters[2]._datasets) == 1
+    rasters[2].close()
+
+
 def test_rastertiles_read_tile_small():
     """Should work as expected (create rastertiles object and read tile)."""
     r = RasterTiles(raster_path, tiles_size=256)
@@ -142,3 +179,271 @@ def test_rastertiles_read_tile_small():
     data, mask = r.read_tile(z, x, y)
     assert data.shape == (3, 256, 256)
     assert mask.shape == (256, 256)
+
+
+def test_rastertiles_read_tile_out():
+    """Should read tile data into the output array."""
+    for path in [raster_path, raster_ndvi_path]:
+        r = RasterTiles(path, tiles_size=256)
+        tile = mercantile.tile(*r.get_center(), zoom=r.get_max_zoom())
+        expected, expected_mask = r.read_tile(tile.z, tile.x, tile.y)
+
+        out = numpy.zeros(expected.shape, dtype=r.meta["dtype"])
+        data, mask = r.read_tile(tile.z, tile.x, tile.y, out=out)
+        assert data is out
+        numpy.testing.assert_array_equal(data, expected)
+        numpy.testing.assert_array_equal(mask, expected_mask)
+
+
+def test_rastertiles_read_tile_indexes():
+    """Should read the requested band indexes."""
+    r = RasterTiles(raster_path, tiles_size=256)
+    expected, _ = r.read_tile(18, 86240, 119094)
+
+    data, mask = r.read_tile(18, 86240, 119094, indexes=[3, 1])
+    assert data.shape == (2, 256, 256)
+    numpy.testing.assert_array_equal(data, expected[[2, 0]])
+
+    out = numpy.zeros((1, 256, 256), dtype=numpy.uint8)
+    data, mask = r.read_tile(18, 86240, 119094, out=out, indexes=[2])
+    numpy.testing.assert_array_equal(out, expected[[1]])
+
+
+class _CountingDataset(object):
+    """Dataset proxy counting reads."""
+
+    def __init__(self, src_dst):
+        self.src_dst = src_dst
+        self.reads = 0
+
+    def __getattr__(self, name):
+        return getattr(self.src_dst, name)
+
+    def read(self, *args, **kwargs):
+        self.reads += 1
+        return self.src_dst.read(*args, **kwargs)
+
+
+def test_rastertiles_sample():
+    """Should read point values, one read per block."""
+    r = RasterTiles(raster_path)
+    bounds = r.get_bounds()
+    coords = numpy.random.RandomState(0).uniform(
+        [bounds[0] - 0.001, bounds[1]], [bounds[2], bounds[3]], (1000, 2)
+    )
+    with rasterio.open(raster_path) as src:
+        xs, ys = transform("epsg:4326", src.crs, coords[:, 0], coords[:, 1])
+        expected = numpy.array(list(src.sample(zip(xs, ys)))).T
+
+    src_dst = _CountingDataset(r._get_dataset())
+    with patch.object(r, "_get_dataset", return_value=src_dst):
+        data, mask = r.sample(coords)
+    # 2048x2048 raster with 512x512 blocks
+    assert src_dst.reads == 16
+
+    assert data.shape == (3, 1000)
+    assert mask.shape == (1000,)
+    assert 0 < mask.sum() < 1000
+    numpy.testing.assert_array_equal(data[:, mask], expected[:, mask])
+    assert not data[:, ~mask].any()
+
+    data, mask = r.sample([])
+    assert data.shape == (3, 0)
+
+
+def test_rastertiles_sample_nodata():
+    """Should mask nodata values."""
+    r = RasterTiles(raster_nodata_path)
+    bounds = r.get_bounds()
+    coords = [(bounds[0] + 1e-6, bounds[3] - 1e-6), r.get_center()]
+    data, mask = r.sample(coords)
+    assert mask.tolist() == [False, True]
+
+
+def test_rastertiles_read_bbox():
+    """Should read an extent from the matching overview, in strips."""
+    r = RasterTiles(raster_path)
+    bounds = r.get_bounds()
+    data, mask = r.read_bbox(bounds, 256, 256)
+    assert data.shape == (3, 256, 256)
+    assert mask.shape == (256, 256)
+    assert mask.all()
+
+    # 2048 pixels read at 256: an overview finer than x8
+    level = r._get_overview_level(
+        list(mercantile.xy(*bounds[:2])) + list(mercantile.xy(*bounds[2:])), 256
+    )
+    assert 2 <= r.overiew_levels[level] <= 8
+
+    strip, strip_mask = r.read_bbox(bounds, 256, 256, window=Window(0, 100, 256, 50))
+    numpy.testing.assert_array_equal(strip, data[:, 100:150])
+    numpy.testing.assert_array_equal(strip_mask, mask[100:150])
+
+    data, mask = r.read_bbox(bounds, 64, 32, indexes=[2])
+    assert data.shape == (1, 32, 64)
+
+
+def test_rastertiles_get_stats(tmpdir):
+    """Should compute statistics from overview and cache them in a sidecar."""
+    path = str(tmpdir.join("ndvi.tif"))
+    shutil.copy(raster_ndvi_path, path)
+
+    r = RasterTiles(path)
+    stats = r.get_stats()
+    assert list(stats.keys()) == [1]
+    assert len(stats[1]["pc"]) == 2
+    assert stats[1]["min"] <= stats[1]["pc"][0] <= stats[1]["pc"][1] <= stats[1]["max"]
+    assert os.path.exists(path + ".stats.json")
+
+    with patch.object(RasterTiles, "_compute_stats") as compute:
+        assert RasterTiles(path).get_stats() == stats
+        compute.assert_not_called()
+
+
+def test_rastertiles_get_stats_indexes(tmpdir):
+    """Should compute statistics for the selected bands only."""
+    path = str(tmpdir.join("rgb.tif"))
+    shutil.copy(raster_path, path)
+
+    stats = RasterTiles(path, indexes=[1, 3]).get_stats(percentiles=(0, 100))
+    assert sorted(stats.keys()) == [1, 3]
+    assert stats[3]["pc"] == [stats[3]["min"], stats[3]["max"]]
+    assert sum(stats[1]["histogram"][0]) == 32 * 32
+
+
+def test_rastertiles_get_source_id(tmpdir):
+    """Should change source identity when the file is rewritten."""
+    path = str(tmpdir.join("rgb.tif"))
+    shutil.copy(raster_path, path)
+    r = RasterTiles(path)
+    source = r.get_source_id()
+    assert source.startswith(path)
+    assert r.get_source_id() == source
+
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    assert r.get_source_id() != source
+
+
+def _write_deflate_cog(path):
+    """Write the fixture as a deflate compressed COG."""
+    with rasterio.open(raster_path) as src:
+        profile = dict(
+            src.profile,
+            compress="deflate",
+            photometric="rgb",
+            tiled=True,
+            blockxsize=512,
+            blockysize=512,
+        )
+        data = src.read()
+
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+        dst.build_overviews([2, 4])
+
+
+def _touch(path, seconds):
+    """Set a file modification time from now."""
+    mtime = os.stat(path).st_mtime + seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_rastertiles_block_index_lazy(tmpdir):
+    """Should only read the block index for listeners locating changes."""
+    path = str(tmpdir.join("cog.tif"))
+    _write_deflate_cog(path)
+    with patch("rio_glui.raster._block_index") as block_index:
+        r = RasterTiles(path)
+        r.add_listener(lambda source, bounds: None, blocks=False)
+        block_index.assert_not_called()
+        assert r._fingerprint is None
+
+        r.add_listener(lambda source, bounds: None)
+        block_index.assert_called_once()
+        assert r._fingerprint is not None
+
+
+def test_rastertiles_check_source(tmpdir):
+    """Should detect changed blocks and reload the source."""
+    path = str(tmpdir.join("cog.tif"))
+    _write_deflate_cog(path)
+    r = RasterTiles(path)
+    changes = []
+
+    def listener(source, bounds):
+        changes.append((source, bounds))
+
+    r.add_listener(listener)
+    source = r.get_source_id()
+    assert not r.check_source()
+
+    with rasterio.open(path) as src:
+        window = Window(512, 1024, 512, 512)
+        block_bounds = transform_bounds(
+            src.crs, "epsg:4326", *windows.bounds(window, src.transform)
+        )
+        inside = transform(
+            src.crs,
+            "epsg:4326",
+            [src.xy(1200, 700)[0], src.xy(100, 100)[0]],
+            [src.xy(1200, 700)[1], src.xy(100, 100)[1]],
+        )
+    coords = list(zip(*inside))
+    before, _ = r.sample(coords)
+    assert before[:, 0].any()
+
+    with rasterio.open(path, "r+") as dst:
+        dst.write(numpy.zeros((3, 512, 512), dtype=numpy.uint8), window=window)
+    _touch(path, 10)
+
+    # Block level change: same identity, changed extent reported
+    assert r.get_source_id() == source
+    assert r.generation == 1
+    assert len(changes) == 1
+    assert changes[0][0] == source
+    numpy.testing.assert_allclose(changes[0][1], [block_bounds])
+
+    # Handles are reopened
+    after, _ = r.sample(coords)
+    assert not after[:, 0].any()
+    numpy.testing.assert_array_equal(after[:, 1], before[:, 1])
+
+    # Unlocated change: new identity, whole raster reported
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    _touch(path, 20)
+    assert r.get_source_id() != source
+    assert r.generation == 2
+    assert changes[1] == (source, [r.bounds, r.bounds])
+
+    r.remove_listener(listener)
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    _touch(path, 30)
+    assert r.check_source()
+    assert len(changes) == 2
+    r.close()
+
+
+def test_rastertiles_check_source_listener_error(tmpdir):
+    """Should change the source identity when a listener fails."""
+    path = str(tmpdir.join("cog.tif"))
+    _write_deflate_cog(path)
+    r = RasterTiles(path)
+
+    def listener(source, bounds):
+        raise Exception("database is locked")
+
+    r.add_listener(listener)
+    source = r.get_source_id()
+    with rasterio.open(path, "r+") as dst:
+        dst.write(
+            numpy.zeros((3, 512, 512), dtype=numpy.uint8),
+            window=Window(512, 1024, 512, 512),
+        )
+    _touch(path, 10)
+
+    assert r.check_source()
+    assert r.get_source_id() not in [source, r._make_source_id()]
+    r.close()
@@ -0,0 +1,66 @@
+"""tests rio_glui.render."""
+
+import numpy
+
+from rio_glui.colormap import get_lut
+from rio_glui.render import render_tile, render_index
+
+
+def test_render_tile_scale():
+    """Should rescale, mask and add an alpha band."""
+    data = numpy.array([[[0, 500, 1000, 2000]], [[0, 0, 1000, 1000]]], numpy.uint16)
+    mask = numpy.array([[255, 255, 255, 0]], numpy.uint8)
+
+    rgba = render_tile(data, mask, scale=[(0, 1000), (0, 2000)])
+    assert rgba.dtype == numpy.uint8
+    assert rgba.shape == (3, 1, 4)
+    assert rgba[0].tolist() == [[0, 127, 255, 0]]
+    assert rgba[1].tolist() == [[0, 0, 127, 0]]
+    assert rgba[2].tolist() == [[255, 255, 255, 0]]
+
+
+def test_render_tile_scale_equal_bounds():
+    """Should render a zero-width scale as a step."""
+    data = numpy.array([[[0, 4, 5, 9]]], numpy.uint16)
+    mask = numpy.full((1, 4), 255, numpy.uint8)
+
+    rgba = render_tile(data, mask, scale=((5, 5),))
+    assert rgba[0].tolist() == [[0, 0, 255, 255]]
+
+    index, _ = render_index(data, mask, scale=((5, 5),), color_ops="gamma r 2")
+    assert index.tolist() == [[0, 0, 255, 255]]
+
+
+def test_render_tile_color_ops():
+    """Should apply color operations in float space."""
+    data = numpy.full((3, 2, 2), 64, numpy.uint8)
+    mask = numpy.full((2, 2), 255, numpy.uint8)
+
+    rgba = render_tile(data, mask, color_ops="gamma rgb 2")
+    expected = int((64 / 255.0) ** 0.5 * 255)
+    assert (rgba[:3] == expected).all()
+    assert (rgba[3] == 255).all()
+
+
+def test_render_tile_colormap():
+    """Should apply the colormap to the first band."""
+    lut = get_lut("cfastie")
+    data = numpy.array([[[-1.0, 0.0, 1.0]], [[5.0, 5.0, 5.0]]], numpy.float32)
+    mask = numpy.array([[255, 255, 0]], numpy.uint8)
+
+    rgba = render_tile(data, mask, scale=[(-1, 1)], colormap=lut)
+    assert rgba.shape == (4, 1, 3)
+    assert rgba[:3, 0, 0].tolist() == lut[0, :3].tolist()
+    assert rgba[:3, 0, 1].tolist() == lut[127, :3].tolist()
+    assert rgba[3].tolist() == [[255, 255, 0]]
+
+
+def test_render_index():
+    """Should render the first band to LUT indexes."""
+    data = numpy.array([[[-1.0, 0.0, 1.0, 1.0]]], numpy.float32)
+    mask = numpy.array([[255, 255, 255, 0]], numpy.uint8)
+
+    index, valid = render_index(data, mask, scale=[(-1, 1)])
+    assert index.dtype == numpy.uint8
+    assert index.tolist() == [[0, 127, 255, 0]]
+    assert valid.tolist() == [[True, True, True, False]]
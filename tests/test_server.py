@@ -1,15 +1,39 @@
 """tests rio_glui.server."""
 
 import os
+import json
+import socket
+import sqlite3
+import logging
+import zlib
+import shutil
+import tempfile
 
 import numpy
-from tornado.testing import AsyncHTTPTestCase
+import pytest
+from mock import patch
+from tornado.ioloop import IOLoop
+from tornado.testing import AsyncHTTPTestCase, gen_test
 
 import mercantile
+import rasterio
+from rasterio.io import MemoryFile
+from rasterio.warp import transform
+from rasterio.windows import Window
 from rio_tiler.utils import tile_read
 
 from rio_glui.raster import RasterTiles
-from rio_glui.server import TileServer
+from rio_glui.server import TileServer, BATCH_FRAME, _default_scale, _read_options
+from rio_glui.cache import TileCache, ArrayCache
+from rio_glui.metrics import LoadMonitor
+from rio_glui.encoders import decode_npy
+from rio_glui.render import render_tile
+from rio_glui.colormap import get_lut
+
+try:
+    from urllib.request import urlopen
+except ImportError:  # pragma: no cover
+    from urllib2 import urlopen
 
 raster_path = os.path.join(
     os.path.dirname(__file__), "fixtures", "16-21560-29773_small_ycbcr.tif"
@@ -108,6 +132,15 @@ def test_TileServer_get_tiles_url():
     assert app.get_tiles_url() == "http://127.0.0.1:8080/tiles/{z}/{x}/{y}.png"
 
 
+def test_TileServer_get_terrain_url():
+    """Should work as expected (create TileServer object and get terrain url)."""
+    r = RasterTiles(raster_path)
+    app = TileServer(r)
+    assert (
+        app.get_terrain_url() == "http://127.0.0.1:8080/tiles/{z}/{x}/{y}.terrain-rgb"
+    )
+
+
 def test_TileServer_get_template_url():
     """Should work as expected (create TileServer object and get template url)."""
     r = RasterTiles(raster_path)
@@ -115,6 +148,219 @@ def test_TileServer_get_template_url():
     assert app.get_template_url() == "http://127.0.0.1:8080/index.html"
 
 
+def test_TileServer_get_stats_url():
+    """Should work as expected (create TileServer object and get stats url)."""
+    r = RasterTiles(raster_path)
+    app = TileServer(r)
+    assert app.get_stats_url() == "http://127.0.0.1:8080/stats"
+
+
+def test_TileServer_default_scale(tmpdir):
+    """Should use the raster statistics as default scale for non-uint8 data."""
+    path = str(tmpdir.join("ndvi.tif"))
+    shutil.copy(raster_ndvi_path, path)
+    r = RasterTiles(path)
+    app = TileServer(r)
+    assert app.scale == (tuple(r.get_stats()[1]["pc"]),)
+
+    app = TileServer(r, scale=((-1, 1),))
+    assert app.scale == ((-1, 1),)
+
+    r = RasterTiles(raster_path)
+    assert not TileServer(r).scale
+
+
+def test_TileServer_default_scale_nodata_band(tmpdir):
+    """Should use the data type range for bands without valid data."""
+    path = str(tmpdir.join("nodata.tif"))
+    with rasterio.open(raster_ndvi_path) as src:
+        profile = dict(
+            driver="GTiff",
+            width=512,
+            height=512,
+            count=2,
+            dtype="uint16",
+            nodata=0,
+            crs=src.crs,
+            transform=src.transform,
+            tiled=True,
+            blockxsize=256,
+            blockysize=256,
+        )
+    data = numpy.zeros((2, 512, 512), dtype=numpy.uint16)
+    data[0] = numpy.arange(512, dtype=numpy.uint16) + 1
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+        dst.build_overviews([2, 4])
+
+    r = RasterTiles(path)
+    assert r.get_stats()[2]["pc"] is None
+    app = TileServer(r)
+    assert app.scale[0] == tuple(r.get_stats()[1]["pc"])
+    assert app.scale[1] == (0, 65535)
+
+
+def test_TileServer_default_scale_constant_band(tmpdir):
+    """Should not use an empty range as default scale."""
+    path = str(tmpdir.join("constant.tif"))
+    with rasterio.open(raster_ndvi_path) as src:
+        profile = dict(
+            driver="GTiff",
+            width=512,
+            height=512,
+            count=2,
+            dtype="float32",
+            crs=src.crs,
+            transform=src.transform,
+            tiled=True,
+            blockxsize=256,
+            blockysize=256,
+        )
+    data = numpy.full((2, 512, 512), 7.0, dtype=numpy.float32)
+    data[1, :8, :8] = 9.0
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data)
+        dst.build_overviews([2, 4])
+
+    r = RasterTiles(path)
+    stats = r.get_stats()
+    assert stats[1]["pc"][0] == stats[1]["pc"][1]
+    app = TileServer(r)
+    assert app.scale[0] == (0, 1)
+    assert app.scale[1] == tuple(stats[2]["pc"])
+
+    stats = dict(pc=[7.0, 7.0], min=7.0, max=9.0)
+    assert _default_scale(stats, "float32") == (7.0, 9.0)
+    stats = dict(pc=[7, 7], min=7, max=7)
+    assert _default_scale(stats, "int16") == (-32768, 32767)
+
+
+def test_TileServer_get_metrics_url():
+    """Should work as expected (create TileServer object and get metrics url)."""
+    r = RasterTiles(raster_path)
+    app = TileServer(r)
+    assert app.get_metrics_url() == "http://127.0.0.1:8080/metrics"
+
+
+def test_TileServer_processes():
+    """Should create one metrics row per worker process."""
+    r = RasterTiles(raster_path)
+    app = TileServer(r, processes=4)
+    assert app.processes == 4
+    assert app.metrics.workers == 4
+
+
+@patch("rio_glui.server.IOLoop")
+@patch("rio_glui.server.HTTPServer")
+def test_TileServer_start_processes(HTTPServer, IOLoop):
+    """Should bind and fork worker processes."""
+    IOLoop.initialized.return_value = False
+    r = RasterTiles(raster_path)
+    app = TileServer(r, processes=4, port=5000)
+    app.start()
+    HTTPServer.return_value.bind.assert_called_once_with(5000)
+    HTTPServer.return_value.start.assert_called_once_with(4)
+    HTTPServer.return_value.listen.assert_not_called()
+    IOLoop.current.return_value.start.assert_called_once()
+
+    IOLoop.initialized.return_value = True
+    with pytest.raises(Exception):
+        app.start()
+
+
+@patch("rio_glui.server.IOLoop")
+@patch("rio_glui.server.HTTPServer")
+def test_TileServer_start_keepalive(HTTPServer, IOLoop):
+    """Should pass connection settings to the HTTP server."""
+    IOLoop.initialized.return_value = True
+    r = RasterTiles(raster_path)
+    app = TileServer(r, keep_alive=False, idle_timeout=30)
+    app.start()
+    HTTPServer.assert_called_once_with(
+        app.app, no_keep_alive=True, idle_connection_timeout=30
+    )
+    HTTPServer.return_value.listen.assert_called_once_with(8080)
+    IOLoop.current.return_value.start.assert_not_called()
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_TileServer_background(tmpdir):
+    """Should serve from a background thread and stop cleanly."""
+    path = str(tmpdir.join("rgb.tif"))
+    shutil.copy(raster_path, path)
+    r = RasterTiles(path, tiles_size=64)
+    app = TileServer(r, port=_free_port(), count_requests=True)
+    app.start(background=True)
+    assert app.thread.is_alive()
+    assert app.loop is not IOLoop.current(instance=False)
+
+    response = urlopen(app.get_tiles_url().format(z=18, x=86240, y=119094))
+    assert response.getcode() == 200
+    assert response.info()["Content-Type"] == "image/png"
+    assert json.loads(urlopen(app.get_stats_url()).read().decode())["bounds"]
+    assert r._datasets
+
+    with pytest.raises(Exception):
+        app.start(background=True)
+
+    thread = app.thread
+    app.stop()
+    assert not thread.is_alive()
+    assert r._datasets == []
+    assert app.counter not in logging.getLogger("rasterio._env").handlers
+    assert app.counter not in logging.getLogger("rasterio._err").handlers
+    with pytest.raises(RuntimeError):
+        app.executor.submit(len, [])
+    with pytest.raises(IOError):
+        urlopen(app.get_template_url(), timeout=1)
+
+
+def test_TileServer_background_errors():
+    """Should raise startup errors in the calling thread."""
+    r = RasterTiles(raster_path)
+    with pytest.raises(Exception):
+        TileServer(r, processes=2).start(background=True)
+
+    sock = socket.socket()
+    sock.bind(("", 0))
+    sock.listen(1)
+    app = TileServer(r, port=sock.getsockname()[1])
+    with pytest.raises(socket.error):
+        app.start(background=True)
+    assert app.thread is None
+    sock.close()
+
+
+@patch("rio_glui.server.IOLoop")
+@patch("rio_glui.server.HTTPServer")
+def test_TileServer_stop(HTTPServer, IOLoop):
+    """Should stop the server, reader threads and dataset handles."""
+    IOLoop.initialized.return_value = True
+    r = RasterTiles(raster_path)
+    app = TileServer(r)
+    app.start()
+    with patch.object(r, "close") as close:
+        app.stop()
+        close.assert_called_once()
+    HTTPServer.return_value.stop.assert_called_once()
+    with pytest.raises(RuntimeError):
+        app.executor.submit(len, [])
+
+
+def test_TileServer_get_client_url():
+    """Should work as expected (create TileServer object and get client url)."""
+    r = RasterTiles(raster_path)
+    app = TileServer(r)
+    assert app.get_client_url() == "http://127.0.0.1:8080/client.html"
+
+
 def test_TileServer_get_playground_url():
     """Should work as expected (create TileServer object and get playground url)."""
     r = RasterTiles(raster_path)
@@ -161,16 +407,446 @@ class TestHandlers(AsyncHTTPTestCase):
         response = self.fetch("/tiles/18/8624/119094.png")
         self.assertEqual(response.code, 404)
 
+    def test_tilejson(self):
+        """Should return TileJSON document."""
+        response = self.fetch("/tilejson.json")
+        self.assertEqual(response.code, 200)
+        res = json.loads(response.body.decode())
+        self.assertEqual(res["tiles"], ["http://127.0.0.1:8080/tiles/{z}/{x}/{y}.png"])
+        self.assertEqual(res["minzoom"], 0)
+        self.assertEqual(res["maxzoom"], 22)
+        self.assertEqual(res["tileSize"], 512)
+        self.assertEqual(len(res["bounds"]), 4)
+
+    def test_metrics(self):
+        """Should return tile requests metrics."""
+        self.fetch("/tiles/18/86240/119094.png")
+        self.fetch("/tiles/18/8624/119094.png")
+        response = self.fetch("/metrics")
+        self.assertEqual(response.code, 200)
+        res = json.loads(response.body.decode())
+        self.assertEqual(res["total"]["requests"], 2)
+        self.assertEqual(res["total"]["errors"], 1)
+        self.assertTrue(res["total"]["bytes"] > 0)
+        self.assertEqual(len(res["workers"]), 1)
+
+    def test_debug_disabled(self):
+        """Should not serve debug endpoints by default."""
+        self.assertEqual(self.fetch("/debug/profile?seconds=1").code, 404)
+        self.assertEqual(self.fetch("/debug/slow").code, 404)
+
     def test_TemplateSimple(self):
         """Should find the template."""
         response = self.fetch("/index.html")
         self.assertEqual(response.code, 200)
+        self.assertIn(b"{z}/{x}/{y}.terrain-rgb", response.body)
+        self.assertIn(b"'type': 'raster-dem'", response.body)
 
     def test_TemplatePlayground(self):
         """Should find the template."""
         response = self.fetch("/playground.html")
         self.assertEqual(response.code, 200)
 
+    def test_TemplateClient(self):
+        """Should find the template."""
+        response = self.fetch("/client.html")
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"const colormap = null;", response.body)
+
+    def test_tileNpy(self):
+        """Should return raw tile data and mask."""
+        response = self.fetch("/tiles/18/86240/119094.npy?color=gamma%20b%201.8")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "application/octet-stream")
+        self.assertEqual(response.headers["Content-Encoding"], "deflate")
+        self.assertEqual(response.headers["X-Tile-Dtype"], "uint8")
+        self.assertEqual(response.headers["X-Tile-Shape"], "3,512,512")
+        data, mask = decode_npy(response.body)
+        self.assertEqual(data.shape, (3, 512, 512))
+        self.assertEqual(mask.shape, (512, 512))
+
+        expected, expected_mask = RasterTiles(raster_path).read_tile(18, 86240, 119094)
+        numpy.testing.assert_array_equal(data, expected)
+        numpy.testing.assert_array_equal(mask, expected_mask)
+
+    def test_tileTerrainRGB(self):
+        """Should return the first band as Terrain-RGB elevations."""
+        response = self.fetch(
+            "/tiles/18/86240/119094.terrain-rgb?color=gamma%20b%201.8&rescale=0,10"
+        )
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+        with MemoryFile(response.body) as mem, mem.open() as src:
+            self.assertEqual(src.count, 3)
+            rgb = src.read().astype(numpy.float64)
+        height = -10000 + (rgb[0] * 256 * 256 + rgb[1] * 256 + rgb[2]) * 0.1
+
+        expected, mask = RasterTiles(raster_path).read_tile(18, 86240, 119094)
+        expected = numpy.where(mask != 0, expected[0], 0)
+        numpy.testing.assert_allclose(height, expected, atol=1e-6)
+
+    def test_tileNpyNotFound(self):
+        """Should error with tile doesn't exits."""
+        response = self.fetch("/tiles/18/8624/119094.npy")
+        self.assertEqual(response.code, 404)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+class TestHandlersStats(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, "ndvi.tif")
+        shutil.copy(raster_ndvi_path, path)
+        r = RasterTiles(path)
+        return TileServer(r).app
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        super(TestHandlersStats, self).tearDown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_stats(self):
+        """Should return raster statistics."""
+        response = self.fetch("/stats")
+        self.assertEqual(response.code, 200)
+        res = json.loads(response.body.decode())
+        self.assertEqual(list(res["statistics"].keys()), ["1"])
+        self.assertEqual(len(res["statistics"]["1"]["pc"]), 2)
+        self.assertEqual(len(res["bounds"]), 4)
+
+    def test_tile(self):
+        """Should rescale with the default scale and return tile buffer."""
+        response = self.fetch("/tiles/9/142/205.png")
+        self.assertEqual(response.code, 200)
+        self.assertTrue(response.buffer)
+
+
+class TestHandlersCache(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = TileCache(os.path.join(self.tmpdir, "tiles.db"))
+        r = RasterTiles(raster_path)
+        return TileServer(r, cache=self.cache).app
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        super(TestHandlersCache, self).tearDown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_tile(self):
+        """Should cache tile buffer."""
+        response = self.fetch("/tiles/18/86240/119094.png")
+        self.assertEqual(response.code, 200)
+        self.assertTrue(self.cache.size() > 0)
+
+        with patch.object(RasterTiles, "read_tile") as read_tile:
+            cached = self.fetch("/tiles/18/86240/119094.png")
+            read_tile.assert_not_called()
+        self.assertEqual(cached.code, 200)
+        self.assertEqual(cached.body, response.body)
+
+        response = self.fetch("/tiles/18/86240/119094.png?color=gamma%20b%201.8")
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(cached.body, response.body)
+
+
+class TestHandlersDegraded(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = TileCache(os.path.join(self.tmpdir, "tiles.db"))
+        self.arrays = ArrayCache()
+        # NOTE: Any tile in flight is over the threshold
+        self.load = LoadMonitor(max_pending=0)
+        r = RasterTiles(raster_path, tiles_size=64)
+        return TileServer(r, cache=self.cache, arrays=self.arrays, load=self.load).app
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        super(TestHandlersDegraded, self).tearDown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_tile(self):
+        """Should degrade tiles under load and not cache them."""
+        response = self.fetch("/tiles/18/86240/119094.png?color=gamma%20b%201.8")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Degraded"], "overview,encoder,color")
+        with MemoryFile(response.body) as mem, mem.open() as src:
+            image = src.read()
+        self.assertEqual(image.shape, (4, 64, 64))
+        numpy.testing.assert_array_equal(image[:, ::2], image[:, 1::2])
+        numpy.testing.assert_array_equal(image[:, :, ::2], image[:, :, 1::2])
+
+        self.assertEqual(self.cache.size(), 0)
+        self.assertEqual(self.arrays.size(), 0)
+        self.assertEqual(self.load.pending, 0)
+
+        response = self.fetch("/tiles/18/86240/119094.jpg?tilesize=63")
+        self.assertEqual(response.code, 200)
+        self.assertNotIn("X-Tile-Degraded", response.headers)
+
+    def test_tile_recovered(self):
+        """Should serve and cache full quality tiles once load drops."""
+        self.load.max_pending = 10
+        response = self.fetch("/tiles/18/86240/119094.npy")
+        self.assertEqual(response.code, 200)
+        self.assertNotIn("X-Tile-Degraded", response.headers)
+        self.assertTrue(self.cache.size() > 0)
+
+        self.load.max_pending = 0
+        degraded = self.fetch("/tiles/18/86240/119094.npy")
+        self.assertNotIn("X-Tile-Degraded", degraded.headers)
+        self.assertEqual(degraded.body, response.body)
+
+        degraded = self.fetch("/tiles/18/86241/119094.npy")
+        self.assertEqual(degraded.headers["X-Tile-Degraded"], "overview,encoder")
+        data, mask = decode_npy(degraded.body)
+        self.assertEqual(data.shape, (3, 64, 64))
+        numpy.testing.assert_array_equal(mask[::2], mask[1::2])
+
+    def test_batch(self):
+        """Should mark degraded batch tiles with a 203 status."""
+        tiles = [[18, 86240, 119094], [18, 86240, 119095]]
+        response = self.fetch(
+            "/tiles/batch", method="POST", body=json.dumps(dict(tiles=tiles))
+        )
+        self.assertEqual(response.code, 200)
+        for status, tile in _parse_batch(response.body).values():
+            self.assertEqual(status, 203)
+            self.assertTrue(tile)
+        self.assertEqual(self.cache.size(), 0)
+        self.assertEqual(self.load.pending, 0)
+
+
+class TestHandlersSourceChange(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "cog.tif")
+        with rasterio.open(raster_path) as src:
+            profile = dict(src.profile, compress="deflate", photometric="rgb")
+            data = src.read()
+        with rasterio.open(self.path, "w", **profile) as dst:
+            dst.write(data)
+            dst.build_overviews([2, 4])
+
+        self.cache = TileCache(os.path.join(self.tmpdir, "tiles.db"))
+        self.arrays = ArrayCache()
+        self.raster = RasterTiles(self.path)
+        return TileServer(self.raster, cache=self.cache, arrays=self.arrays).app
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        super(TestHandlersSourceChange, self).tearDown()
+        shutil.rmtree(self.tmpdir)
+
+    def _tile_url(self, row, col):
+        with rasterio.open(self.path) as src:
+            x, y = src.xy(row, col)
+            lng, lat = transform(src.crs, "epsg:4326", [x], [y])
+        tile = mercantile.tile(lng[0], lat[0], 21)
+        return "/tiles/{}/{}/{}.png".format(tile.z, tile.x, tile.y)
+
+    def test_invalidate(self):
+        """Should only drop cached tiles of changed blocks."""
+        changed_url = self._tile_url(1200, 700)
+        unchanged_url = self._tile_url(100, 100)
+        changed = self.fetch(changed_url).body
+        unchanged = self.fetch(unchanged_url).body
+        self.fetch("/preview.png?max_size=64")
+        self.assertEqual(len(self.arrays._tiles), 2)
+
+        with rasterio.open(self.path, "r+") as dst:
+            dst.write(
+                numpy.zeros((3, 512, 512), dtype=numpy.uint8),
+                window=Window(512, 1024, 512, 512),
+            )
+        mtime = os.stat(self.path).st_mtime + 10
+        os.utime(self.path, (mtime, mtime))
+
+        with patch.object(RasterTiles, "read_tile") as read_tile:
+            cached = self.fetch(unchanged_url)
+            read_tile.assert_not_called()
+        self.assertEqual(cached.body, unchanged)
+        self.assertEqual(self.raster.generation, 1)
+        self.assertEqual(len(self.arrays._tiles), 1)
+        rows = self.cache._connect().execute("SELECT z FROM tiles").fetchall()
+        self.assertEqual(rows, [(21,)])
+
+        response = self.fetch(changed_url)
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.body, changed)
+
+    def test_invalidate_locked(self):
+        """Should not serve stale tiles when the tile cache is locked."""
+        changed_url = self._tile_url(1200, 700)
+        changed = self.fetch(changed_url).body
+        source = self.raster.get_source_id()
+
+        with rasterio.open(self.path, "r+") as dst:
+            dst.write(
+                numpy.zeros((3, 512, 512), dtype=numpy.uint8),
+                window=Window(512, 1024, 512, 512),
+            )
+        mtime = os.stat(self.path).st_mtime + 10
+        os.utime(self.path, (mtime, mtime))
+
+        error = sqlite3.OperationalError("database is locked")
+        with patch.object(TileCache, "invalidate", side_effect=error):
+            response = self.fetch(changed_url)
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.body, changed)
+        self.assertNotEqual(self.raster.get_source_id(), source)
+        self.assertEqual(len(self.arrays._tiles), 1)
+
+
+class TestHandlersTileSize(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        r = RasterTiles(raster_path, tiles_size=256)
+        return TileServer(r, arrays=ArrayCache()).app
+
+    def test_tile2x(self):
+        """Should return @2x and smaller tiles from the cached tile."""
+        response = self.fetch("/tiles/18/86240/119094@2x.npy")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Shape"], "3,512,512")
+        data, _ = decode_npy(response.body)
+
+        with patch.object(RasterTiles, "read_tile") as read_tile:
+            response = self.fetch("/tiles/18/86240/119094.npy")
+            read_tile.assert_not_called()
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Shape"], "3,256,256")
+
+        with patch.object(RasterTiles, "read_tile") as read_tile:
+            response = self.fetch("/tiles/18/86240/119094.png?tilesize=128")
+            read_tile.assert_not_called()
+        self.assertEqual(response.code, 200)
+
+    def test_tilesize(self):
+        """Should read tiles at the requested size."""
+        response = self.fetch("/tiles/18/86240/119094.npy?tilesize=64")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Shape"], "3,64,64")
+
+        response = self.fetch("/tiles/18/86240/119094@2x.npy?tilesize=64")
+        self.assertEqual(response.headers["X-Tile-Shape"], "3,128,128")
+
+    def test_invalid_tilesize(self):
+        """Should return 400 for invalid tile sizes."""
+        response = self.fetch("/tiles/18/86240/119094.png?tilesize=8")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?tilesize=large")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094@9x.png?tilesize=1024")
+        self.assertEqual(response.code, 400)
+
+
+class TestHandlersPyramid(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        r = RasterTiles(raster_path, tiles_size=64)
+        return TileServer(r, arrays=ArrayCache(), pyramid=True).app
+
+    def test_tile(self):
+        """Should build tiles from cached children."""
+        for tile in mercantile.children(mercantile.Tile(86240, 119094, 18)):
+            response = self.fetch("/tiles/{}/{}/{}.npy".format(tile.z, tile.x, tile.y))
+            self.assertEqual(response.code, 200)
+
+        with patch.object(RasterTiles, "read_tile") as read_tile:
+            response = self.fetch("/tiles/18/86240/119094.npy")
+            read_tile.assert_not_called()
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Shape"], "3,64,64")
+
+    def test_tile_missing_child(self):
+        """Should read tiles when a child is missing."""
+        for tile in mercantile.children(mercantile.Tile(86241, 119094, 18))[:3]:
+            response = self.fetch("/tiles/{}/{}/{}.npy".format(tile.z, tile.x, tile.y))
+            self.assertEqual(response.code, 200)
+
+        with patch.object(
+            RasterTiles, "read_tile", autospec=True, side_effect=RasterTiles.read_tile
+        ) as read_tile:
+            response = self.fetch("/tiles/18/86241/119094.npy")
+            self.assertEqual(read_tile.call_count, 1)
+        self.assertEqual(response.code, 200)
+
+    def test_tile_odd_size(self):
+        """Should read odd size tiles (children can't be downsampled by 2)."""
+        for tile in mercantile.children(mercantile.Tile(86242, 119094, 18)):
+            response = self.fetch(
+                "/tiles/{}/{}/{}.npy?tilesize=257".format(tile.z, tile.x, tile.y)
+            )
+            self.assertEqual(response.code, 200)
+
+        response = self.fetch("/tiles/18/86242/119094.npy?tilesize=257")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Shape"], "3,257,257")
+
+
+class TestHandlersChunked(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, "rgb.tif")
+        shutil.copy(raster_path, path)
+        r = RasterTiles(path)
+        return TileServer(r, chunk_size=1024, compress=True).app
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        super(TestHandlersChunked, self).tearDown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_tile(self):
+        """Should send large tiles in chunks."""
+        response = self.fetch("/tiles/18/86240/119094.png")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Transfer-Encoding"], "chunked")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertTrue(len(response.body) > 1024)
+        self.assertEqual(response.body[1:4], b"PNG")
+
+    def test_compress(self):
+        """Should gzip uncompressed responses."""
+        response = self.fetch(
+            "/stats",
+            headers={"Accept-Encoding": "gzip"},
+            decompress_response=False,
+        )
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+        # Tiles (and batches of tiles) are already compressed
+        response = self.fetch(
+            "/tiles/batch",
+            method="POST",
+            body=json.dumps(dict(tiles=[[18, 86240, 119094]])),
+            headers={"Accept-Encoding": "gzip"},
+            decompress_response=False,
+        )
+        self.assertEqual(response.code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+
 
 class TestHandlersRescale(AsyncHTTPTestCase):
     """Test tornado handlers."""
@@ -203,6 +879,424 @@ class TestHandlers1B(AsyncHTTPTestCase):
         self.assertTrue(response.buffer)
         self.assertEqual(response.headers["Content-Type"], "image/png")
 
+    def test_tile_indexed(self):
+        """Should write colormapped tiles as indexed PNG."""
+        response = self.fetch("/tiles/9/142/205.png")
+        self.assertEqual(response.body[25:26], b"\x03")  # IHDR color type
+        with MemoryFile(response.body) as mem, mem.open() as src:
+            index = src.read(1)
+            cmap = src.colormap(1)
+        palette = numpy.array([cmap[i] for i in range(len(cmap))], numpy.uint8)
+        rgba = palette[index].transpose(2, 0, 1)
+
+        data, mask = decode_npy(self.fetch("/tiles/9/142/205.npy").body)
+        expected = render_tile(data, mask, scale=[(-1, 1)], colormap=get_lut("cfastie"))
+        numpy.testing.assert_array_equal(rgba[3], expected[3])
+        valid = expected[3] != 0
+        numpy.testing.assert_array_equal(rgba[:3, valid], expected[:3, valid])
+
+    def test_tileNpy(self):
+        """Should return raw float tile."""
+        response = self.fetch("/tiles/9/142/205.npy")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Dtype"], "float32")
+        self.assertEqual(response.headers["X-Tile-Shape"], "1,32,32")
+        self.assertTrue(len(zlib.decompress(response.body)) > 32 * 32 * 4)
+
+    def test_TemplateClient(self):
+        """Should pass colormap and scale to the template."""
+        response = self.fetch("/client.html")
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"const scale = [[-1, 1]];", response.body)
+        self.assertNotIn(b"const colormap = null;", response.body)
+
+
+class TestHandlersLUT(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        path = os.path.join(tempfile.mkdtemp(), "lut.txt")
+        with open(path, "w") as f:
+            f.write("0 255 0 0\n255 0 0 255\n")
+        r = RasterTiles(raster_ndvi_path, tiles_size=32)
+        return TileServer(r, scale=((-1, 1),), colormap=path).app
+
+    def test_tile(self):
+        """Should render tiles with a LUT file."""
+        response = self.fetch("/tiles/9/142/205.png")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+
+
+class TestHandlersExpression(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        r = RasterTiles(raster_path, tiles_size=64)
+        return TileServer(r, arrays=ArrayCache()).app
+
+    def test_tile_npy(self):
+        """Should evaluate band math on the referenced bands."""
+        with patch.object(
+            RasterTiles, "read_tile", side_effect=RasterTiles.read_tile, autospec=True
+        ) as read_tile:
+            response = self.fetch("/tiles/18/86240/119094.npy?expr=b3-b1,b2")
+            self.assertEqual(read_tile.call_args[1]["indexes"], [1, 2, 3])
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["X-Tile-Dtype"], "float32")
+        self.assertEqual(response.headers["X-Tile-Shape"], "2,64,64")
+        data, mask = decode_npy(response.body)
+
+        response = self.fetch("/tiles/18/86240/119094.npy")
+        raw, _ = decode_npy(response.body)
+        numpy.testing.assert_array_equal(data[0], raw[2].astype(numpy.float32) - raw[0])
+        numpy.testing.assert_array_equal(data[1], raw[1])
+
+    def test_tile_png(self):
+        """Should rescale band math results."""
+        url = "/tiles/18/86240/119094.png?expr=(b1-b2)/(b1%2Bb2)&rescale=-1,1"
+        response = self.fetch(url)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+
+        response = self.fetch(url + "&color=gamma%20r%201.5")
+        self.assertEqual(response.code, 200)
+
+    def test_tile_png_default_scale(self):
+        """Should rescale band math results from the expression range."""
+        url = "/tiles/18/86240/119094.png?expr=(b1-b2)/(b1%2Bb2)"
+        response = self.fetch(url)
+        self.assertEqual(response.code, 200)
+        with MemoryFile(response.body) as mem, mem.open() as src:
+            data = src.read(1)
+            alpha = src.read(2)
+        values = data[alpha != 0]
+        self.assertTrue(values.max() > values.min())
+
+        with patch.object(
+            RasterTiles, "read_bbox", side_effect=RasterTiles.read_bbox, autospec=True
+        ) as read_bbox:
+            response = self.fetch(url.replace("png", "webp"))
+            self.assertEqual(response.code, 200)
+            self.assertEqual(read_bbox.call_count, 0)
+
+        bbox = "/bbox/-61.566,16.226,-61.563,16.229.png?max_size=64&expr=b1/b2"
+        self.assertEqual(self.fetch(bbox).code, 200)
+
+    def test_invalid(self):
+        """Should return 400 for invalid expressions."""
+        response = self.fetch("/tiles/18/86240/119094.png?expr=b1.real")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=b4%2Bb1")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=b1&rescale=1")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=b1&rescale=1,0")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=b1%2B9.0%2A%2A9%2A%2A7")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=b1%7Cb2")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=b1%20%26%201")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=" + "-" * 3000 + "b1")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094.png?expr=" + "%2Bb1" * 400)
+        self.assertEqual(response.code, 400)
+
+    def test_booleans(self):
+        """Should evaluate comparisons, bitwise operators and conditions."""
+        response = self.fetch("/tiles/18/86240/119094.png?expr=where(b1,1,2)")
+        self.assertEqual(response.code, 200)
+        url = "/tiles/18/86240/119094.png?expr=(b1>0)%26~(b2>0)&rescale=0,1"
+        self.assertEqual(self.fetch(url).code, 200)
+
+
+def _parse_batch(body):
+    """Parse a batch response into {(z, x, y): (status, tile)}."""
+    tiles = {}
+    offset = 0
+    while offset < len(body):
+        z, x, y, status, size = BATCH_FRAME.unpack_from(body, offset)
+        offset += BATCH_FRAME.size
+        tiles[(z, x, y)] = (status, body[offset : offset + size])
+        offset += size
+    return tiles
+
+
+class TestHandlersBatch(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        r = RasterTiles(raster_path, tiles_size=64)
+        return TileServer(r).app
+
+    def _post(self, body, query=""):
+        return self.fetch(
+            "/tiles/batch" + query,
+            method="POST",
+            body=body if isinstance(body, str) else json.dumps(body),
+        )
+
+    def test_batch(self):
+        """Should stream tiles and errors."""
+        tiles = [[18, 86240, 119094], [18, 86241, 119094], [18, 86240, 119095]]
+        response = self._post(dict(tiles=tiles + [[18, 0, 0]]))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "application/octet-stream")
+        batch = _parse_batch(response.body)
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(batch[(18, 0, 0)], (404, b""))
+        for z, x, y in tiles:
+            status, tile = batch[(z, x, y)]
+            self.assertEqual(status, 200)
+            expected = self.fetch("/tiles/{}/{}/{}.png".format(z, x, y)).body
+            self.assertEqual(tile, expected)
+
+        metrics = json.loads(self.fetch("/metrics").body.decode())
+        self.assertEqual(metrics["total"]["requests"], 7)
+
+    def test_batch_npy(self):
+        """Should apply tile parameters to all tiles."""
+        tiles = [[18, 86240, 119094], [18, 86241, 119094]]
+        response = self._post(
+            dict(tiles=tiles, format="npy", scale=2), query="?expr=b1*2"
+        )
+        self.assertEqual(response.code, 200)
+        for status, tile in _parse_batch(response.body).values():
+            self.assertEqual(status, 200)
+            data, mask = decode_npy(tile)
+            self.assertEqual(data.shape, (1, 128, 128))
+            self.assertEqual(data.dtype, numpy.float32)
+
+    def test_batch_invalid(self):
+        """Should return 400 for invalid batches."""
+        self.assertEqual(self._post("tiles").code, 400)
+        self.assertEqual(self._post(dict(tiles=[])).code, 400)
+        self.assertEqual(self._post(dict(tiles=[[18, 1]])).code, 400)
+        self.assertEqual(self._post(dict(tiles=[[2, 4, 0]])).code, 400)
+        self.assertEqual(self._post(dict(tiles=[[18, 1, 1]], format="gif")).code, 400)
+        self.assertEqual(self._post(dict(tiles=[[18, 1, 1]] * 257)).code, 400)
+        self.assertEqual(
+            self._post(dict(tiles=[[18, 1, 1]]), query="?expr=b9").code, 400
+        )
+
+        response = self.fetch("/tiles/batch", method="OPTIONS")
+        self.assertEqual(response.code, 204)
+        self.assertEqual(response.headers["Access-Control-Allow-Methods"], "POST")
+
+
+class TestHandlersDebug(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        r = RasterTiles(raster_path, tiles_size=64)
+        return TileServer(r, debug=True).app
+
+    def test_slow(self):
+        """Should list the slowest tiles with their stage timings."""
+        self.fetch("/tiles/18/86240/119094.png?tilesize=128")
+        self.fetch("/tiles/18/0/0.png")
+        response = self.fetch(
+            "/tiles/batch",
+            method="POST",
+            body=json.dumps(dict(tiles=[[18, 86241, 119094]], format="npy")),
+        )
+        self.assertEqual(response.code, 200)
+
+        response = self.fetch("/debug/slow")
+        self.assertEqual(response.code, 200)
+        tiles = json.loads(response.body.decode())
+        self.assertEqual(len(tiles), 3)
+        self.assertEqual(
+            [t["seconds"] for t in tiles],
+            sorted([t["seconds"] for t in tiles], reverse=True),
+        )
+        tiles = dict((tuple(t["tile"]), t) for t in tiles)
+        tile = tiles[(18, 86240, 119094)]
+        self.assertEqual(tile["status"], 200)
+        self.assertEqual(tile["tilesize"], 128)
+        self.assertEqual(tile["format"], "png")
+        self.assertEqual(list(tile["stages"]), ["queue", "read", "render"])
+        self.assertEqual(tiles[(18, 0, 0)]["status"], 404)
+        self.assertEqual(tiles[(18, 86241, 119094)]["format"], "npy")
+        self.assertTrue(tiles[(18, 86241, 119094)]["batch"])
+
+        tiles = json.loads(self.fetch("/debug/slow?limit=1").body.decode())
+        self.assertEqual(len(tiles), 1)
+        self.assertEqual(self.fetch("/debug/slow?limit=a").code, 400)
+
+    @gen_test(timeout=30)
+    def test_profile(self):
+        """Should profile the IOLoop and reader threads."""
+        profile = self.http_client.fetch(
+            self.get_url("/debug/profile?seconds=1&format=top")
+        )
+        busy = yield self.http_client.fetch(
+            self.get_url("/debug/profile?seconds=1"), raise_error=False
+        )
+        self.assertEqual(busy.code, 409)
+        for x in range(86240, 86244):
+            yield self.http_client.fetch(
+                self.get_url("/tiles/18/{}/119094.png?tilesize=512".format(x))
+            )
+
+        response = yield profile
+        self.assertEqual(response.code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        self.assertIn("samples", response.body.decode())
+        self.assertIn("self%", response.body.decode())
+
+        response = yield self.http_client.fetch(
+            self.get_url("/debug/profile?seconds=1")
+        )
+        self.assertEqual(response.code, 200)
+        stacks = response.body.decode().splitlines()
+        self.assertTrue(stacks)
+        self.assertTrue(all(int(line.rsplit(" ", 1)[1]) > 0 for line in stacks))
+        self.assertFalse(any("rio-glui-profiler" in line for line in stacks))
+
+    def test_profile_invalid(self):
+        """Should return 400 for invalid profiles."""
+        self.assertEqual(self.fetch("/debug/profile?seconds=0").code, 400)
+        self.assertEqual(self.fetch("/debug/profile?seconds=61").code, 400)
+        self.assertEqual(self.fetch("/debug/profile?seconds=a").code, 400)
+        self.assertEqual(self.fetch("/debug/profile?format=svg").code, 400)
+
+
+class TestHandlersPoints(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.raster = RasterTiles(raster_path)
+        return TileServer(self.raster).app
+
+    def test_point(self):
+        """Should return point values."""
+        lon, lat = self.raster.get_center()
+        response = self.fetch("/point?lon={}&lat={}".format(lon, lat))
+        self.assertEqual(response.code, 200)
+        res = json.loads(response.body.decode())
+        data, _ = self.raster.sample([(lon, lat)])
+        self.assertEqual(res["coordinates"], [lon, lat])
+        self.assertEqual(res["bands"], [1, 2, 3])
+        self.assertEqual(res["values"], data[:, 0].tolist())
+
+        res = json.loads(self.fetch("/point?lon=0&lat=0").body.decode())
+        self.assertIsNone(res["values"])
+
+        self.assertEqual(self.fetch("/point?lon=0").code, 400)
+        self.assertEqual(self.fetch("/point?lon=a&lat=0").code, 400)
+
+    def test_points(self):
+        """Should return values of many points, in order."""
+        bounds = self.raster.get_bounds()
+        coords = numpy.random.RandomState(0).uniform(
+            [bounds[0], bounds[1]], [bounds[2], bounds[3]], (5000, 2)
+        )
+        coords = coords.tolist() + [[0, 0]]
+        response = self.fetch(
+            "/points", method="POST", body=json.dumps(dict(coordinates=coords))
+        )
+        self.assertEqual(response.code, 200)
+        res = json.loads(response.body.decode())
+        data, mask = self.raster.sample(coords)
+        self.assertEqual(len(res["values"]), 5001)
+        self.assertIsNone(res["values"][-1])
+        self.assertEqual(res["values"][:-1], data[:, :-1].T.tolist())
+
+        for body in [
+            "points",
+            json.dumps(dict(coordinates=[])),
+            '{"coordinates": [[1]]}',
+        ]:
+            response = self.fetch("/points", method="POST", body=body)
+            self.assertEqual(response.code, 400)
+
+        response = self.fetch("/points", method="OPTIONS")
+        self.assertEqual(response.code, 204)
+
+
+class TestHandlersImages(AsyncHTTPTestCase):
+    """Test tornado handlers."""
+
+    def get_app(self):
+        """Initialize app."""
+        self.raster = RasterTiles(raster_path)
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = TileCache(os.path.join(self.cache_dir, "tiles.db"))
+        return TileServer(self.raster, cache=self.cache).app
+
+    def tearDown(self):
+        """Remove cache directory."""
+        super(TestHandlersImages, self).tearDown()
+        shutil.rmtree(self.cache_dir)
+
+    def _bbox_url(self, bounds, fmt="png", query=""):
+        return "/bbox/{},{},{},{}.{}{}".format(*(list(bounds) + [fmt, query]))
+
+    def test_preview(self):
+        """Should return a cached preview image."""
+        response = self.fetch("/preview.png?max_size=300")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+        with MemoryFile(response.body) as mem, mem.open() as src:
+            self.assertEqual(max(src.width, src.height), 300)
+            self.assertEqual(src.count, 4)
+        self.assertTrue(self.cache.size())
+
+        with patch.object(self.raster, "read_bbox") as read_bbox:
+            cached = self.fetch("/preview.png?max_size=300")
+            self.assertFalse(read_bbox.called)
+        self.assertEqual(cached.body, response.body)
+
+        response = self.fetch("/preview.jpg?max_size=100")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/jpeg")
+
+        self.assertEqual(self.fetch("/preview.png?max_size=1").code, 400)
+        self.assertEqual(self.fetch("/preview.gif").code, 400)
+
+    def test_bbox(self):
+        """Should stream an extent image read in strips."""
+        bounds = self.raster.get_bounds()
+        with patch.object(
+            self.raster, "read_bbox", side_effect=self.raster.read_bbox
+        ) as read_bbox:
+            response = self.fetch(self._bbox_url(bounds, query="?max_size=600"))
+            self.assertEqual(read_bbox.call_count, 3)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Transfer-Encoding"], "chunked")
+        with MemoryFile(response.body) as mem, mem.open() as src:
+            self.assertEqual((src.width, src.height), (600, 600))
+            data = src.read()
+
+        expected, _ = self.raster.read_bbox(bounds, 600, 600)
+        numpy.testing.assert_array_equal(data[:3], expected)
+        self.assertTrue((data[3] == 255).all())
+
+        response = self.fetch(
+            self._bbox_url(bounds, "webp", "?max_size=100&expr=b1/b2&rescale=0,2")
+        )
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/webp")
+
+    def test_bbox_invalid(self):
+        """Should return 400 for invalid extents, 404 outside the raster."""
+        bounds = self.raster.get_bounds()
+        self.assertEqual(self.fetch(self._bbox_url([0, 0, 1, 1])).code, 404)
+        self.assertEqual(self.fetch(self._bbox_url([1, 0, 0, 1])).code, 400)
+        self.assertEqual(self.fetch(self._bbox_url([0, 0, 1, 90])).code, 400)
+        self.assertEqual(self.fetch("/bbox/a,0,1,1.png").code, 400)
+        self.assertEqual(
+            self.fetch(self._bbox_url(bounds, query="?expr=b1,b2")).code, 400
+        )
+
 
 class CustomRaster(RasterTiles):
     """Custom RasterTiles."""
@@ -223,6 +1317,13 @@ class CustomRaster(RasterTiles):
         return data.astype(numpy.uint8), mask
 
 
+def test_read_options():
+    """Should only pass the read_tile options readers accept."""
+    assert _read_options(RasterTiles(raster_path).read_tile) == set(["tilesize", "out"])
+    assert _read_options(CustomRaster(raster_path).read_tile) == set()
+    assert _read_options(lambda z, x, y, **kwargs: None) == set(["tilesize", "out"])
+
+
 class TestHandlersCustom(AsyncHTTPTestCase):
     """Test tornado handlers."""
 
@@ -237,3 +1338,12 @@ class TestHandlersCustom(AsyncHTTPTestCase):
         self.assertEqual(response.code, 200)
         self.assertTrue(response.buffer)
         self.assertEqual(response.headers["Content-Type"], "image/png")
+
+    def test_tile_size(self):
+        """Should only serve the tile size of readers without tilesize."""
+        response = self.fetch("/tiles/18/86240/119094.png?tilesize=512")
+        self.assertEqual(response.code, 200)
+        response = self.fetch("/tiles/18/86240/119094.png?tilesize=256")
+        self.assertEqual(response.code, 400)
+        response = self.fetch("/tiles/18/86240/119094@2x.png")
+        self.assertEqual(response.code, 400)